@@ -2,223 +2,127 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import json
+import os
 import plotly.express as px
 import plotly.graph_objects as go
+import pyarrow as pa
 from collections import defaultdict
 import matplotlib.pyplot as plt
 import seaborn as sns
+from utils.language_detector import ROMANISED_HINDI_URDU, detect_languages, detect_scripts
+from utils.report_store import load_summary, load_table, read_arrow_report, report_paths, report_table, report_from_table, table_frames, table_summary
 
-def load_data(file_path):
-    """Load JSON data from the given file path"""
-    try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        return data
-    except Exception as e:
-        st.error(f"Error loading data: {str(e)}")
-        return None
+QUERY_COLUMNS = [
+    'query', 'language', 'query_weighted_total', 'query_device_score', 'query_task_type_score',
+    'query_mode_score', 'query_args_score', 'device_count'
+]
+DEVICE_COLUMNS = [
+    'actual_device', 'actual_task_type', 'actual_mode', 'actual_args', 'predicted_args',
+    'weighted_total', 'device_score', 'task_type_score', 'mode_score', 'args_score'
+]
+COMPONENT_SCORES = ['device_score', 'task_type_score', 'mode_score', 'args_score']
 
-def extract_device_metrics(data):
-    """Extract device-specific metrics from the data"""
-    device_metrics = defaultdict(lambda: {
-        'total': 0,
-        'device_score': 0,
-        'task_type_score': 0,
-        'mode_score': 0, 
-        'args_score': 0,
-        'weighted_total': 0,
-        'success_rate': 0,
-        'failure_count': 0
-    })
-    
-    for query in data['query_scores']:
-        for device in query['devices']:
-            device_name = device['actual']['device']
-            metrics = device_metrics[device_name]
-            metrics['total'] += 1
-            metrics['device_score'] += device['score']['device_score']
-            metrics['task_type_score'] += device['score']['task_type_score']
-            metrics['mode_score'] += device['score']['mode_score']
-            metrics['args_score'] += device['score']['args_score']
-            metrics['weighted_total'] += device['score']['weighted_total']
-            
-            # Track success/failure
-            if device['score']['weighted_total'] == 1.0:
-                metrics['success_rate'] += 1
-            else:
-                metrics['failure_count'] += 1
-    
-    # Convert to averages and percentages
-    for device in device_metrics:
-        total = device_metrics[device]['total']
-        for metric in ['device_score', 'task_type_score', 'mode_score', 'args_score', 'weighted_total']:
-            device_metrics[device][metric] /= total
-        
-        device_metrics[device]['success_rate'] = (device_metrics[device]['success_rate'] / total) * 100
-            
-    return dict(device_metrics)
+def load_frames(table):
+    """Query and device DataFrames of a report table, converting only the columns the dashboard uses"""
+    return table_frames(table, QUERY_COLUMNS, DEVICE_COLUMNS)
+
+def extract_device_metrics(devices):
+    """Extract device-specific metrics from the device table"""
+    grouped = devices.groupby('actual_device', sort=False)
+    metrics = grouped[COMPONENT_SCORES + ['weighted_total']].mean()
+    metrics.insert(0, 'total', grouped.size())
+    perfect = (devices['weighted_total'] == 1.0).groupby(devices['actual_device'], sort=False)
+    metrics['success_rate'] = perfect.mean() * 100
+    metrics['failure_count'] = metrics['total'] - perfect.sum()
+    return metrics.to_dict(orient='index')
+
+def devanagari_mask(queries):
+    """Flag queries written in Devanagari script, scanning all queries in one vectorised pass"""
+    return np.asarray(detect_scripts(queries['query'].tolist()) == 'Devanagari')
+
+def query_languages(queries):
+    """Language label for every query, detecting it where the report does not record one"""
+    labels = queries['language'].astype(object).where(queries['language'].astype(bool), None)
+    missing = labels.isna()
+    if missing.any():
+        labels[missing] = detect_languages(queries['query'][missing])
+    return labels
 
-def analyze_language_performance(data):
+def split_performance(queries, devices, mask):
+    """Query averages, counts and device component averages for the queries in and out of a mask"""
+    device_mask = mask[devices['query_index'].to_numpy()]
+    result = {}
+    for side, query_rows, device_rows in ((True, mask, device_mask), (False, ~mask, ~device_mask)):
+        scores = queries['query_weighted_total'][query_rows]
+        components = devices.loc[device_rows, COMPONENT_SCORES]
+        result[side] = (
+            scores.mean() if len(scores) else 0,
+            len(scores),
+            {k: components[k].mean() if len(components) else 0 for k in COMPONENT_SCORES},
+        )
+    return result
+
+def analyze_language_performance(queries, devices):
     """Analyze performance based on language (Hindi vs English)"""
-    hindi_queries = []
-    english_queries = []
-    
-    hindi_components = {
-        'device_score': [],
-        'task_type_score': [],
-        'mode_score': [],
-        'args_score': []
-    }
-    
-    english_components = {
-        'device_score': [],
-        'task_type_score': [],
-        'mode_score': [],
-        'args_score': []
-    }
-    
-    for query in data['query_scores']:
-        # Check if Hindi query
-        is_hindi = any(ord('\u0900') <= ord(c) <= ord('\u097F') for c in query['query'])
-        
-        # Add the query's weighted score to the appropriate list
-        if is_hindi:
-            hindi_queries.append(query['query_score']['query_weighted_total'])
-        else:
-            english_queries.append(query['query_score']['query_weighted_total'])
-        
-        # Process device components
-        for device in query['devices']:
-            if is_hindi:
-                hindi_components['device_score'].append(device['score']['device_score'])
-                hindi_components['task_type_score'].append(device['score']['task_type_score'])
-                hindi_components['mode_score'].append(device['score']['mode_score'])
-                hindi_components['args_score'].append(device['score']['args_score'])
-            else:
-                english_components['device_score'].append(device['score']['device_score'])
-                english_components['task_type_score'].append(device['score']['task_type_score'])
-                english_components['mode_score'].append(device['score']['mode_score'])
-                english_components['args_score'].append(device['score']['args_score'])
-                
+    split = split_performance(queries, devices, devanagari_mask(queries))
     return {
-        'hindi_avg': sum(hindi_queries)/len(hindi_queries) if hindi_queries else 0,
-        'english_avg': sum(english_queries)/len(english_queries) if english_queries else 0,
-        'hindi_count': len(hindi_queries),
-        'english_count': len(english_queries),
-        'hindi_components': {k: sum(v)/len(v) if v else 0 for k, v in hindi_components.items()},
-        'english_components': {k: sum(v)/len(v) if v else 0 for k, v in english_components.items()}
+        'hindi_avg': split[True][0],
+        'english_avg': split[False][0],
+        'hindi_count': split[True][1],
+        'english_count': split[False][1],
+        'hindi_components': split[True][2],
+        'english_components': split[False][2]
     }
 
-def analyze_complexity(data):
+def analyze_complexity(queries, devices):
     """Analyze performance based on query complexity"""
-    simple_queries = []  # Queries with 1 device
-    complex_queries = []  # Queries with multiple devices
-    
-    simple_components = {
-        'device_score': [],
-        'task_type_score': [],
-        'mode_score': [],
-        'args_score': []
-    }
-    
-    complex_components = {
-        'device_score': [],
-        'task_type_score': [],
-        'mode_score': [],
-        'args_score': []
-    }
-    
-    for query in data['query_scores']:
-        complexity = 'simple' if len(query['devices']) == 1 else 'complex'
-        
-        # Add the query's weighted score to the appropriate list
-        if complexity == 'simple':
-            simple_queries.append(query['query_score']['query_weighted_total'])
-        else:
-            complex_queries.append(query['query_score']['query_weighted_total'])
-        
-        # Process device components
-        for device in query['devices']:
-            if complexity == 'simple':
-                simple_components['device_score'].append(device['score']['device_score'])
-                simple_components['task_type_score'].append(device['score']['task_type_score'])
-                simple_components['mode_score'].append(device['score']['mode_score'])
-                simple_components['args_score'].append(device['score']['args_score'])
-            else:
-                complex_components['device_score'].append(device['score']['device_score'])
-                complex_components['task_type_score'].append(device['score']['task_type_score'])
-                complex_components['mode_score'].append(device['score']['mode_score'])
-                complex_components['args_score'].append(device['score']['args_score'])
-                
+    split = split_performance(queries, devices, (queries['device_count'] == 1).to_numpy())
     return {
-        'simple_avg': sum(simple_queries)/len(simple_queries) if simple_queries else 0,
-        'complex_avg': sum(complex_queries)/len(complex_queries) if complex_queries else 0,
-        'simple_count': len(simple_queries),
-        'complex_count': len(complex_queries),
-        'simple_components': {k: sum(v)/len(v) if v else 0 for k, v in simple_components.items()},
-        'complex_components': {k: sum(v)/len(v) if v else 0 for k, v in complex_components.items()}
+        'simple_avg': split[True][0],
+        'complex_avg': split[False][0],
+        'simple_count': split[True][1],
+        'complex_count': split[False][1],
+        'simple_components': split[True][2],
+        'complex_components': split[False][2]
     }
 
-def analyze_task_types(data):
+def analyze_task_types(devices):
     """Analyze performance based on task types (concurrent vs sequential)"""
-    concurrent_tasks = []
-    sequential_tasks = []
-    
-    for query in data['query_scores']:
-        for device in query['devices']:
-            task_type = device['actual']['task_type']
-            if task_type == 'concurrent':
-                concurrent_tasks.append(device['score']['weighted_total'])
-            elif task_type == 'sequential':
-                sequential_tasks.append(device['score']['weighted_total'])
-    
+    concurrent_tasks = devices['weighted_total'][devices['actual_task_type'] == 'concurrent']
+    sequential_tasks = devices['weighted_total'][devices['actual_task_type'] == 'sequential']
     return {
-        'concurrent_avg': sum(concurrent_tasks)/len(concurrent_tasks) if concurrent_tasks else 0,
-        'sequential_avg': sum(sequential_tasks)/len(sequential_tasks) if sequential_tasks else 0,
+        'concurrent_avg': concurrent_tasks.mean() if len(concurrent_tasks) else 0,
+        'sequential_avg': sequential_tasks.mean() if len(sequential_tasks) else 0,
         'concurrent_count': len(concurrent_tasks),
         'sequential_count': len(sequential_tasks)
     }
 
-def analyze_mode_performance(data):
+def analyze_mode_performance(devices):
     """Analyze performance based on device modes"""
-    mode_metrics = defaultdict(lambda: {
-        'total': 0, 
-        'score': 0,
-        'device': None
-    })
-    
-    for query in data['query_scores']:
-        for device in query['devices']:
-            if device['actual']['mode']:
-                mode = device['actual']['mode']
-                mode_metrics[mode]['total'] += 1
-                mode_metrics[mode]['score'] += device['score']['mode_score']
-                mode_metrics[mode]['device'] = device['actual']['device']
-    
-    # Convert to averages
-    for mode in mode_metrics:
-        total = mode_metrics[mode]['total']
-        mode_metrics[mode]['score'] /= total
-            
-    return dict(mode_metrics)
+    with_mode = devices[devices['actual_mode'].fillna('').astype(bool)]
+    metrics = with_mode.groupby('actual_mode', sort=False).agg(
+        total=('mode_score', 'size'), score=('mode_score', 'mean'), device=('actual_device', 'last')
+    )
+    return metrics.to_dict(orient='index')
 
-def analyze_args_performance(data):
+def analyze_args_performance(devices):
     """Analyze performance based on argument types"""
     args_metrics = defaultdict(lambda: {
         'total': 0,
         'score': 0
     })
     
-    for query in data['query_scores']:
-        for device in query['devices']:
-            if device['actual']['args']:
-                for arg_key in device['actual']['args']:
-                    args_metrics[arg_key]['total'] += 1
-                    
-                    # Check if this arg was correctly predicted
-                    predicted_args = device['predicted'].get('args', {})
-                    if arg_key in predicted_args and predicted_args[arg_key] == device['actual']['args'][arg_key]:
-                        args_metrics[arg_key]['score'] += 1
+    # Args are stored as JSON text; only devices that expect args are parsed
+    with_args = devices[~devices['actual_args'].isin(['{}', 'null'])]
+    for actual_json, predicted_json in zip(with_args['actual_args'], with_args['predicted_args']):
+        actual_args = json.loads(actual_json)
+        predicted_args = json.loads(predicted_json) or {}
+        for arg_key in actual_args:
+            args_metrics[arg_key]['total'] += 1
+            
+            # Check if this arg was correctly predicted
+            if arg_key in predicted_args and predicted_args[arg_key] == actual_args[arg_key]:
+                args_metrics[arg_key]['score'] += 1
     
     # Convert to percentages
     for arg in args_metrics:
@@ -227,26 +131,19 @@ def analyze_args_performance(data):
             
     return dict(args_metrics)
 
-def extract_query_data(data):
+def extract_query_data(queries):
     """Extract query-level data for individual analysis"""
-    query_data = []
-    
-    for query in data['query_scores']:
-        is_hindi = any(ord('\u0900') <= ord(c) <= ord('\u097F') for c in query['query'])
-        
-        query_data.append({
-            'query': query['query'],
-            'language': 'Hindi' if is_hindi else 'English',
-            'complexity': 'Complex' if len(query['devices']) > 1 else 'Simple',
-            'device_count': len(query['devices']),
-            'weighted_total': query['query_score']['query_weighted_total'],
-            'device_score': query['query_score']['query_device_score'],
-            'task_type_score': query['query_score']['query_task_type_score'],
-            'mode_score': query['query_score']['query_mode_score'],
-            'args_score': query['query_score']['query_args_score']
-        })
-    
-    return query_data
+    return pd.DataFrame({
+        'query': queries['query'],
+        'language': query_languages(queries),
+        'complexity': np.where(queries['device_count'] > 1, 'Complex', 'Simple'),
+        'device_count': queries['device_count'],
+        'weighted_total': queries['query_weighted_total'],
+        'device_score': queries['query_device_score'],
+        'task_type_score': queries['query_task_type_score'],
+        'mode_score': queries['query_mode_score'],
+        'args_score': queries['query_args_score']
+    })
 
 def create_dashboard():
     st.set_page_config(layout="wide", page_title="IoT Agent Evaluation Dashboard")
@@ -254,19 +151,30 @@ def create_dashboard():
     st.title("IoT Agent Evaluation Analysis Dashboard")
     st.markdown("""
     This comprehensive dashboard provides detailed analysis of your IoT agent's performance in understanding and executing user commands.
-    Upload your evaluation JSON file to begin analysis.
+    Upload your evaluation report (.arrow or .json), or pick a stored one, to begin analysis.
     """)
     
     # File uploader
-    uploaded_file = st.file_uploader("Upload JSON evaluation file", type=['json'])
-    
-    if uploaded_file is not None:
-        # Load the data
-        global data
-        data = json.load(uploaded_file)
+    uploaded_file = st.file_uploader("Upload evaluation report", type=['arrow', 'json'])
+    stored_path = None
+    if uploaded_file is None:
+        stored_path = st.selectbox("Or open a stored report", [None] + report_paths("dataset_and_results"),
+                                   format_func=lambda path: path or "-")
+    
+    if uploaded_file is not None or stored_path is not None:
+        # Load the report as columns: stored .arrow reports are memory-mapped, uploads read in place
+        global table, summary, queries, devices
+        if stored_path is not None:
+            table = load_table(stored_path)
+        elif uploaded_file.name.endswith('.arrow'):
+            table = read_arrow_report(pa.py_buffer(uploaded_file.getvalue()))
+        else:
+            table = report_table(json.load(uploaded_file))
+        summary = table_summary(table)
+        queries, devices = load_frames(table)
         
         # Dashboard tabs
-        tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8 = st.tabs([
+        tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8, tab9 = st.tabs([
             "Overall Performance", 
             "Device Analysis", 
             "Language Analysis", 
@@ -274,7 +182,8 @@ def create_dashboard():
             "Component Analysis",
             "Individual Queries",
             "Custom Insights",
-            "Export"
+            "Export",
+            "Speed vs Accuracy"
         ])
         
         # Overall metrics
@@ -282,14 +191,14 @@ def create_dashboard():
             st.header("Overall Performance Metrics")
             
             # Calculate metrics
-            total_queries = len(data['query_scores'])
-            total_devices = sum(len(query['devices']) for query in data['query_scores'])
+            total_queries = len(queries)
+            total_devices = len(devices)
             
             # Create metrics
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
-                st.metric("Overall Average Score", f"{data['overall_average']:.3f}")
+                st.metric("Overall Average Score", f"{summary['overall_average']:.3f}")
             with col2:
                 st.metric("Total Queries", total_queries)
             with col3:
@@ -298,24 +207,10 @@ def create_dashboard():
                 avg_devices = total_devices / total_queries if total_queries > 0 else 0
                 st.metric("Avg Devices per Query", f"{avg_devices:.2f}")
             
-            component_scores = {
-                'Device Recognition': 0,
-                'Task Type Recognition': 0,
-                'Mode Recognition': 0,
-                'Args Parsing': 0
-            }
-            total_devices = sum(len(query['devices']) for query in data['query_scores'])
-
-            for query in data['query_scores']:
-                for device in query['devices']:
-                    component_scores['Device Recognition'] += device['score']['device_score']
-                    component_scores['Task Type Recognition'] += device['score']['task_type_score']
-                    component_scores['Mode Recognition'] += device['score']['mode_score']
-                    component_scores['Args Parsing'] += device['score']['args_score']
-
-            # Convert to averages
-            for component in component_scores:
-                component_scores[component] /= total_devices
+            component_scores = dict(zip(
+                ['Device Recognition', 'Task Type Recognition', 'Mode Recognition', 'Args Parsing'],
+                devices[COMPONENT_SCORES].mean()
+            ))
             # Plot component scores
             fig = px.bar(
                 x=list(component_scores.keys()),
@@ -332,16 +227,7 @@ def create_dashboard():
             st.subheader("Success Rate by Threshold")
 
             thresholds = [0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
-            success_rates = []
-            total_devices = sum(len(query['devices']) for query in data['query_scores'])
-
-            for threshold in thresholds:
-                success_count = 0
-                for query in data['query_scores']:
-                    for device in query['devices']:
-                        if device['score']['weighted_total'] >= threshold:
-                            success_count += 1
-                success_rates.append((success_count / total_devices) * 100)
+            success_rates = [(devices['weighted_total'] >= threshold).mean() * 100 for threshold in thresholds]
             
             # Plot success rates
             fig = px.line(
@@ -358,7 +244,7 @@ def create_dashboard():
         with tab2:
             st.header("Device-wise Performance Analysis")
             
-            device_metrics = extract_device_metrics(data)
+            device_metrics = extract_device_metrics(devices)
             
             # Convert to DataFrame for easier plotting
             df_devices = pd.DataFrame.from_dict(device_metrics, orient='index')
@@ -430,7 +316,7 @@ def create_dashboard():
         # Language analysis
         with tab3:
             st.header("Language Performance Analysis")
-            lang_metrics = analyze_language_performance(data)
+            lang_metrics = analyze_language_performance(queries, devices)
             
             col1, col2 = st.columns(2)
             with col1:
@@ -477,28 +363,53 @@ def create_dashboard():
             )
             st.plotly_chart(fig, use_container_width=True)
             
+            # Breakdown across every language/script variant in the report
+            st.subheader("Performance by Language Variant")
+            variant_df = pd.DataFrame({
+                'Language': query_languages(queries),
+                'Average Score': queries['query_weighted_total']
+            })
+            variant_df = variant_df.groupby('Language')['Average Score'].agg(['mean', 'count']).reset_index()
+            variant_df.columns = ['Language', 'Average Score', 'Queries']
+            fig = px.bar(
+                variant_df.sort_values('Average Score'),
+                x='Average Score',
+                y='Language',
+                orientation='h',
+                hover_data=['Queries'],
+                title="Average Score by Language Variant",
+                color='Average Score',
+                color_continuous_scale=px.colors.sequential.Viridis
+            )
+            fig.update_layout(height=300 + len(variant_df) * 25)
+            st.plotly_chart(fig, use_container_width=True)
+            if ROMANISED_HINDI_URDU in variant_df['Language'].values:
+                st.caption(
+                    f"Queries without a stored language are labelled by script and marker words; "
+                    f"Romanised Hindi and Romanised Urdu cannot be told apart that way and are shown as {ROMANISED_HINDI_URDU}."
+                )
+            
             # Example queries by language
             st.subheader("Sample Queries by Language")
             
+            is_hindi = devanagari_mask(queries)
             col1, col2 = st.columns(2)
             with col1:
                 st.markdown("**Hindi Queries**")
-                hindi_queries = [q['query'] for q in data['query_scores'] 
-                               if any(ord('\u0900') <= ord(c) <= ord('\u097F') for c in q['query'])]
+                hindi_queries = queries['query'][is_hindi]
                 for query in hindi_queries[:5]:  # Show top 5 Hindi queries
                     st.info(query)
             
             with col2:
                 st.markdown("**English Queries**")
-                english_queries = [q['query'] for q in data['query_scores'] 
-                                 if not any(ord('\u0900') <= ord(c) <= ord('\u097F') for c in q['query'])]
+                english_queries = queries['query'][~is_hindi]
                 for query in english_queries[:5]:  # Show top 5 English queries
                     st.info(query)
         
         # Complexity analysis
         with tab4:
             st.header("Query Complexity Analysis")
-            complexity_metrics = analyze_complexity(data)
+            complexity_metrics = analyze_complexity(queries, devices)
             
             col1, col2 = st.columns(2)
             with col1:
@@ -545,7 +456,7 @@ def create_dashboard():
             
             # Task type analysis
             st.subheader("Task Type Analysis")
-            task_metrics = analyze_task_types(data)
+            task_metrics = analyze_task_types(devices)
             
             col1, col2 = st.columns(2)
             with col1:
@@ -577,7 +488,7 @@ def create_dashboard():
             
             # Mode performance analysis
             st.subheader("Mode Recognition Performance")
-            mode_metrics = analyze_mode_performance(data)
+            mode_metrics = analyze_mode_performance(devices)
             
             # Convert to DataFrame for easier plotting
             mode_df = pd.DataFrame.from_dict(mode_metrics, orient='index')
@@ -605,7 +516,7 @@ def create_dashboard():
             
             # Args performance analysis
             st.subheader("Arguments Parsing Performance")
-            args_metrics = analyze_args_performance(data)
+            args_metrics = analyze_args_performance(devices)
             
             if args_metrics:
                 # Convert to DataFrame for easier plotting
@@ -638,29 +549,10 @@ def create_dashboard():
             st.subheader("Failure Analysis")
             
             # Calculate failure rates for each component
-            failure_metrics = {
-                'Device Recognition': 0,
-                'Task Type Recognition': 0,
-                'Mode Recognition': 0,
-                'Args Parsing': 0
-            }
-            
-            total_interactions = 0
-            for query in data['query_scores']:
-                for device in query['devices']:
-                    total_interactions += 1
-                    if device['score']['device_score'] == 0:
-                        failure_metrics['Device Recognition'] += 1
-                    if device['score']['task_type_score'] == 0:
-                        failure_metrics['Task Type Recognition'] += 1
-                    if device['score']['mode_score'] == 0:
-                        failure_metrics['Mode Recognition'] += 1
-                    if device['score']['args_score'] == 0:
-                        failure_metrics['Args Parsing'] += 1
-            
-            # Convert to percentages
-            for metric in failure_metrics:
-                failure_metrics[metric] = (failure_metrics[metric] / total_interactions) * 100 if total_interactions > 0 else 0
+            failure_metrics = dict(zip(
+                ['Device Recognition', 'Task Type Recognition', 'Mode Recognition', 'Args Parsing'],
+                (devices[COMPONENT_SCORES] == 0).mean() * 100 if len(devices) else [0] * len(COMPONENT_SCORES)
+            ))
                 
             # Plot failure rates
             fig = px.bar(
@@ -678,8 +570,7 @@ def create_dashboard():
         with tab6:
             st.header("Individual Query Analysis")
             
-            query_data = extract_query_data(data)
-            query_df = pd.DataFrame(query_data)
+            query_df = extract_query_data(queries)
             
             # Add success/failure classification
             threshold = st.slider("Success Threshold", 0.0, 1.0, 0.7, 0.1)
@@ -690,7 +581,8 @@ def create_dashboard():
             col1, col2, col3 = st.columns(3)
             
             with col1:
-                language_filter = st.multiselect("Language", ['Hindi', 'English'], default=['Hindi', 'English'])
+                language_options = sorted(query_df['language'].unique())
+                language_filter = st.multiselect("Language", language_options, default=language_options)
             with col2:
                 complexity_filter = st.multiselect("Complexity", ['Simple', 'Complex'], default=['Simple', 'Complex'])
             with col3:
@@ -815,82 +707,125 @@ def create_dashboard():
         # New export tab (tab8)
         with tab8:
             export_tab()
+
+        with tab9:
+            latency_accuracy_tab()
         
         # Advanced filters in sidebar
         advanced_filters_tab()
+    else:
+        # Comparing stored reports needs no upload
+        latency_accuracy_tab()
+
+def stored_report_latencies(directory, percentile='p95', language=None):
+    """One row per stored report in directory: accuracy, latency percentiles and throughput"""
+    rows = []
+    for path in report_paths(directory):
+        # Only the summary is needed; for .arrow reports that is read from the file footer
+        report = load_summary(path)
+        model = os.path.splitext(os.path.basename(path))[0][len('evaluation_report_'):]
+        latency = report.get('latency')
+        if language is None:
+            accuracy = report['overall_average']
+            latency = latency['overall'] if latency else None
+        else:
+            by_language = report.get('language_breakdown', {}).get('by_language', {})
+            accuracy = by_language.get(language, {}).get('average')
+            latency = latency['by_language'].get(language) if latency else None
+        wall_time = latency['wall_time'] if latency else None
+        throughput = report.get('throughput', {})
+        rows.append({
+            'model': model,
+            'accuracy': accuracy,
+            'latency_s': wall_time[percentile] if wall_time else None,
+            'p50_s': wall_time['p50'] if wall_time else None,
+            'p95_s': wall_time['p95'] if wall_time else None,
+            'p99_s': wall_time['p99'] if wall_time else None,
+            'queries_per_second': throughput.get('queries_per_second'),
+            'tokens_per_second': throughput.get('completion_tokens_per_second'),
+        })
+    return pd.DataFrame(rows)
+
+def pareto_frontier(df):
+    """Models no other model beats on both latency and accuracy"""
+    frontier = []
+    best_accuracy = -1.0
+    for idx, row in df.sort_values(['latency_s', 'accuracy'], ascending=[True, False]).iterrows():
+        if row['accuracy'] > best_accuracy:
+            frontier.append(idx)
+            best_accuracy = row['accuracy']
+    return df.index.isin(frontier)
 
-def analyze_error_patterns(data):
-    """Identify common error patterns in the data"""
-    error_patterns = defaultdict(int)
-    device_errors = defaultdict(lambda: defaultdict(int))
+def latency_accuracy_tab():
+    """Latency versus accuracy of every stored evaluation report"""
+    st.header("Speed vs Accuracy")
+    directory = st.text_input("Reports directory", value="dataset_and_results")
+    col1, col2 = st.columns(2)
+    with col1:
+        percentile = st.selectbox("Latency percentile", ['p50', 'p95', 'p99'], index=1)
+    with col2:
+        languages = set()
+        for path in report_paths(directory):
+            report = load_summary(path)
+            languages.update(report.get('language_breakdown', {}).get('by_language', {}))
+        scope = st.selectbox("Scope", ['All languages'] + sorted(languages))
+
+    df = stored_report_latencies(directory, percentile, None if scope == 'All languages' else scope)
+    if df.empty:
+        st.info(f"No evaluation_report_* files found in {directory}")
+        return
+    timed = df.dropna(subset=['latency_s', 'accuracy']).copy()
+    untimed = df[df['latency_s'].isna()]['model'].tolist()
+    if untimed:
+        st.caption(f"Without timing (evaluated before latency was recorded): {', '.join(untimed)}")
+    if timed.empty:
+        st.info("None of the reports has latency data yet; rerun the evaluator to record it.")
+        return
+
+    timed['frontier'] = pareto_frontier(timed)
+    fig = px.scatter(
+        timed, x='latency_s', y='accuracy', text='model', color='frontier',
+        hover_data=['p50_s', 'p95_s', 'p99_s', 'queries_per_second', 'tokens_per_second'],
+        title=f"Accuracy vs {percentile} query latency ({scope})",
+        labels={'latency_s': f'{percentile} query wall time (s)', 'accuracy': 'Average weighted score',
+                'frontier': 'On speed/accuracy frontier'},
+        color_discrete_map={True: '#2ca02c', False: '#7f7f7f'}
+    )
+    fig.update_traces(textposition='top center')
+    frontier = timed[timed['frontier']].sort_values('latency_s')
+    fig.add_trace(go.Scatter(x=frontier['latency_s'], y=frontier['accuracy'], mode='lines',
+                             line=dict(color='#2ca02c', dash='dash'), showlegend=False))
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(df.sort_values('accuracy', ascending=False), use_container_width=True)
+
+def analyze_error_patterns(devices):
+    """Identify common error patterns in the device table"""
+    total_devices = len(devices)
+    components = {'device': 'device_recognition', 'task': 'task_type_recognition',
+                  'mode': 'mode_recognition', 'args': 'args_parsing'}
+    failed = pd.DataFrame({
+        component: (devices[score] == 0).to_numpy()
+        for component, score in zip(components, COMPONENT_SCORES)
+    })
+    
+    # Only components and devices with at least one failure are listed
+    counts = failed.sum()
+    error_patterns = {components[c]: counts[c] / total_devices * 100 for c in components if counts[c]}
+    per_device = failed.groupby(devices['actual_device'].to_numpy(), sort=False).sum()
+    device_errors = {
+        device: {c: errors[c] / total_devices * 100 for c in components if errors[c]}
+        for device, errors in per_device.iterrows()
+    }
+    device_errors = {device: errors for device, errors in device_errors.items() if errors}
     
     # Track which components fail together
+    pairs = [('device', 'task'), ('device', 'mode'), ('device', 'args'),
+             ('task', 'mode'), ('task', 'args'), ('mode', 'args')]
     component_cooccurrence = {
-        'device_task': 0,
-        'device_mode': 0,
-        'device_args': 0,
-        'task_mode': 0,
-        'task_args': 0,
-        'mode_args': 0,
-        'all_components': 0
+        f"{first}_{second}": (failed[first] & failed[second]).sum() / total_devices * 100
+        for first, second in pairs
     }
-    
-    total_devices = 0
-    
-    for query in data['query_scores']:
-        for device in query['devices']:
-            total_devices += 1
-            device_name = device['actual']['device']
-            
-            # Track individual component errors
-            components_failed = []
-            
-            if device['score']['device_score'] == 0:
-                error_patterns['device_recognition'] += 1
-                device_errors[device_name]['device'] += 1
-                components_failed.append('device')
-                
-            if device['score']['task_type_score'] == 0:
-                error_patterns['task_type_recognition'] += 1
-                device_errors[device_name]['task'] += 1
-                components_failed.append('task')
-                
-            if device['score']['mode_score'] == 0:
-                error_patterns['mode_recognition'] += 1
-                device_errors[device_name]['mode'] += 1
-                components_failed.append('mode')
-                
-            if device['score']['args_score'] == 0:
-                error_patterns['args_parsing'] += 1
-                device_errors[device_name]['args'] += 1
-                components_failed.append('args')
-            
-            # Track co-occurrence of failures
-            if 'device' in components_failed and 'task' in components_failed:
-                component_cooccurrence['device_task'] += 1
-            if 'device' in components_failed and 'mode' in components_failed:
-                component_cooccurrence['device_mode'] += 1
-            if 'device' in components_failed and 'args' in components_failed:
-                component_cooccurrence['device_args'] += 1
-            if 'task' in components_failed and 'mode' in components_failed:
-                component_cooccurrence['task_mode'] += 1
-            if 'task' in components_failed and 'args' in components_failed:
-                component_cooccurrence['task_args'] += 1
-            if 'mode' in components_failed and 'args' in components_failed:
-                component_cooccurrence['mode_args'] += 1
-            if len(components_failed) == 4:
-                component_cooccurrence['all_components'] += 1
-    
-    # Convert to percentages
-    for pattern in error_patterns:
-        error_patterns[pattern] = (error_patterns[pattern] / total_devices) * 100
-        
-    for device in device_errors:
-        for component in device_errors[device]:
-            device_errors[device][component] = (device_errors[device][component] / total_devices) * 100
-            
-    for pattern in component_cooccurrence:
-        component_cooccurrence[pattern] = (component_cooccurrence[pattern] / total_devices) * 100
+    component_cooccurrence['all_components'] = failed.all(axis=1).sum() / total_devices * 100
     
     return {
         'error_patterns': error_patterns,
@@ -904,7 +839,7 @@ def custom_viz_tab():
     
     st.subheader("Error Pattern Analysis")
     
-    error_data = analyze_error_patterns(data)
+    error_data = analyze_error_patterns(devices)
     
     # Error pattern heatmap
     device_error_data = []
@@ -942,10 +877,10 @@ def custom_viz_tab():
     args_error = error_data['error_patterns'].get('args_parsing', 0)
     
     # Get language metrics for correlation insights
-    lang_metrics = analyze_language_performance(data)
+    lang_metrics = analyze_language_performance(queries, devices)
     
     # Get complexity metrics
-    complexity_metrics = analyze_complexity(data)
+    complexity_metrics = analyze_complexity(queries, devices)
     
     # Calculate base flows
     total_flow = 100  # Start with 100% of queries
@@ -1157,18 +1092,10 @@ def advanced_filters_tab():
     """Create advanced filters for deeper analysis"""
     st.header("Advanced Filtering & Analysis")
     
-    # Get all unique devices
-    all_devices = set()
-    for query in data['query_scores']:
-        for device in query['devices']:
-            all_devices.add(device['actual']['device'])
-    
-    # Get all unique modes
-    all_modes = set()
-    for query in data['query_scores']:
-        for device in query['devices']:
-            if device['actual']['mode']:
-                all_modes.add(device['actual']['mode'])
+    # Get all unique devices and modes
+    all_devices = devices['actual_device'].unique().tolist()
+    has_mode = devices['actual_mode'].fillna('').astype(bool)
+    all_modes = devices['actual_mode'][has_mode].unique().tolist()
     
     # Sidebar filters
     st.sidebar.header("Advanced Filters")
@@ -1176,15 +1103,15 @@ def advanced_filters_tab():
     # Device filter
     selected_devices = st.sidebar.multiselect(
         "Filter by Device",
-        list(all_devices),
-        default=list(all_devices)
+        all_devices,
+        default=all_devices
     )
     
     # Mode filter
     selected_modes = st.sidebar.multiselect(
         "Filter by Mode",
-        list(all_modes),
-        default=list(all_modes)
+        all_modes,
+        default=all_modes
     )
     
     # Score range filter
@@ -1193,55 +1120,42 @@ def advanced_filters_tab():
         0.0, 1.0, (0.0, 1.0)
     )
     
-    # Apply filters to get relevant queries
-    filtered_queries = []
-    
-    for query in data['query_scores']:
-        # Check if any device in this query matches our filters
-        devices_match = False
-        
-        for device in query['devices']:
-            device_matches = device['actual']['device'] in selected_devices
-            mode_matches = True  # Default to True if mode is None
-            
-            if device['actual']['mode']:
-                mode_matches = device['actual']['mode'] in selected_modes
-                
-            score_matches = score_range[0] <= query['query_score']['query_weighted_total'] <= score_range[1]
-            
-            if device_matches and mode_matches and score_matches:
-                devices_match = True
-                break
-        
-        if devices_match:
-            filtered_queries.append(query)
+    # Queries with at least one device matching the filters, and a score in range
+    device_matches = devices['actual_device'].isin(selected_devices) & (
+        ~has_mode | devices['actual_mode'].isin(selected_modes)
+    )
+    score_matches = queries['query_weighted_total'].between(*score_range)
+    query_matches = queries.index.isin(devices['query_index'][device_matches]) & score_matches
+    filtered_queries = queries[query_matches]
     
     # Display filtered results
     st.subheader(f"Filtered Results ({len(filtered_queries)} queries)")
     
-    if filtered_queries:
+    if len(filtered_queries):
         # Calculate stats on filtered data
-        avg_score = sum(q['query_score']['query_weighted_total'] for q in filtered_queries) / len(filtered_queries)
+        avg_score = filtered_queries['query_weighted_total'].mean()
         
         # Display metrics
         st.metric("Average Score (Filtered)", f"{avg_score:.3f}")
         
         # Detailed analysis on filtered data
         with st.expander("View Filtered Queries"):
-            for i, query in enumerate(filtered_queries):
+            query_devices = devices[devices['query_index'].isin(filtered_queries.index)].groupby('query_index')
+            for i, (query_index, query) in enumerate(filtered_queries.iterrows()):
                 st.markdown(f"**Query {i+1}:** {query['query']}")
-                st.markdown(f"Score: {query['query_score']['query_weighted_total']:.3f}")
+                st.markdown(f"Score: {query['query_weighted_total']:.3f}")
                 st.markdown("Devices:")
                 
-                for device in query['devices']:
-                    st.markdown(f"- {device['actual']['device']} ({device['score']['weighted_total']:.3f})")
+                if query['device_count']:
+                    for _, device in query_devices.get_group(query_index).iterrows():
+                        st.markdown(f"- {device['actual_device']} ({device['weighted_total']:.3f})")
                 
                 st.markdown("---")
         
         # Compare filtered data with overall
         st.subheader("Comparison with Overall Data")
         
-        overall_avg = data['overall_average']
+        overall_avg = summary['overall_average']
         diff = avg_score - overall_avg
         
         col1, col2, col3 = st.columns(3)
@@ -1266,32 +1180,20 @@ def export_tab():
     
     # Overall metrics
     report['overall'] = {
-        'average_score': data['overall_average'],
-        'total_queries': len(data['query_scores']),
-        'total_devices': sum(len(query['devices']) for query in data['query_scores'])
+        'average_score': summary['overall_average'],
+        'total_queries': len(queries),
+        'total_devices': len(devices)
     }
     
     # Component performance
-    component_scores = {
-        'device_recognition': 0,
-        'task_type_recognition': 0,
-        'mode_recognition': 0,
-        'args_parsing': 0
-    }
-    
-    for query in data['query_scores']:
-        component_scores['device_recognition'] += query['query_score']['query_device_score']
-        component_scores['task_type_recognition'] += query['query_score']['query_task_type_score']
-        component_scores['mode_recognition'] += query['query_score']['query_mode_score']
-        component_scores['args_parsing'] += query['query_score']['query_args_score']
-    
-    for component in component_scores:
-        component_scores[component] /= report['overall']['total_queries']
-    
-    report['components'] = component_scores
+    component_means = queries[['query_' + score for score in COMPONENT_SCORES]].mean()
+    report['components'] = dict(zip(
+        ['device_recognition', 'task_type_recognition', 'mode_recognition', 'args_parsing'],
+        component_means.tolist()
+    ))
     
     # Language analysis
-    lang_metrics = analyze_language_performance(data)
+    lang_metrics = analyze_language_performance(queries, devices)
     report['language'] = {
         'hindi_avg': lang_metrics['hindi_avg'],
         'english_avg': lang_metrics['english_avg'],
@@ -1300,7 +1202,7 @@ def export_tab():
     }
     
     # Complexity analysis
-    complexity_metrics = analyze_complexity(data)
+    complexity_metrics = analyze_complexity(queries, devices)
     report['complexity'] = {
         'simple_avg': complexity_metrics['simple_avg'],
         'complex_avg': complexity_metrics['complex_avg'],
@@ -1309,7 +1211,7 @@ def export_tab():
     }
     
     # Device performance
-    device_metrics = extract_device_metrics(data)
+    device_metrics = extract_device_metrics(devices)
     report['devices'] = device_metrics
     
     # Convert to JSON
@@ -1331,26 +1233,7 @@ def export_tab():
     st.subheader("Export Full Analysis")
     
     # Generate CSV of all query scores
-    query_data = []
-    
-    for query in data['query_scores']:
-        is_hindi = any(ord('\u0900') <= ord(c) <= ord('\u097F') for c in query['query'])
-        
-        query_row = {
-            'query': query['query'],
-            'language': 'Hindi' if is_hindi else 'English',
-            'complexity': 'Complex' if len(query['devices']) > 1 else 'Simple',
-            'device_count': len(query['devices']),
-            'weighted_total': query['query_score']['query_weighted_total'],
-            'device_score': query['query_score']['query_device_score'],
-            'task_type_score': query['query_score']['query_task_type_score'],
-            'mode_score': query['query_score']['query_mode_score'],
-            'args_score': query['query_score']['query_args_score']
-        }
-        
-        query_data.append(query_row)
-    
-    query_df = pd.DataFrame(query_data)
+    query_df = extract_query_data(queries)
     
     st.download_button(
         "Export All Query Data (CSV)",
@@ -1361,29 +1244,19 @@ def export_tab():
     )
     
     # Export device-level analysis
-    device_data = []
-    
-    for query in data['query_scores']:
-        for device in query['devices']:
-            is_hindi = any(ord('\u0900') <= ord(c) <= ord('\u097F') for c in query['query'])
-            
-            device_row = {
-                'query': query['query'],
-                'language': 'Hindi' if is_hindi else 'English',
-                'device': device['actual']['device'],
-                'task_type': device['actual']['task_type'],
-                'mode': device['actual']['mode'],
-                'args': str(device['actual']['args']),
-                'weighted_total': device['score']['weighted_total'],
-                'device_score': device['score']['device_score'],
-                'task_type_score': device['score']['task_type_score'],
-                'mode_score': device['score']['mode_score'],
-                'args_score': device['score']['args_score']
-            }
-            
-            device_data.append(device_row)
-    
-    device_df = pd.DataFrame(device_data)
+    device_df = pd.DataFrame({
+        'query': queries['query'].to_numpy()[devices['query_index']],
+        'language': query_df['language'].to_numpy()[devices['query_index']],
+        'device': devices['actual_device'],
+        'task_type': devices['actual_task_type'],
+        'mode': devices['actual_mode'],
+        'args': devices['actual_args'].map(lambda args: str(json.loads(args))),
+        'weighted_total': devices['weighted_total'],
+        'device_score': devices['device_score'],
+        'task_type_score': devices['task_type_score'],
+        'mode_score': devices['mode_score'],
+        'args_score': devices['args_score']
+    })
     
     st.download_button(
         "Export Device-Level Data (CSV)",
@@ -1392,6 +1265,17 @@ def export_tab():
         "text/csv",
         key='download-device-csv'
     )
+    
+    # The full report in the JSON layout, built only when asked for
+    st.subheader("Export Report (JSON layout)")
+    if st.button("Prepare JSON report"):
+        st.download_button(
+            "Download Report (JSON)",
+            json.dumps(report_from_table(table), indent=2),
+            "evaluation_report.json",
+            "application/json",
+            key='download-report-json'
+        )
 
 if __name__ == "__main__":
     create_dashboard()
\ No newline at end of file
@@ -1,12 +1,19 @@
+import ast
+import csv
 import json
 import logging
-import pandas as pd
 import asyncio
+import os
+from utils.logging_pipeline import setup_logging
 from utils.utils import UTILS
 
 import random
 import utils.agent_prompts as agent_prompts 
 
+DATASET_COLUMNS = ["generated_query", "device_info", "language", "seed", "spec"]
+# Columns a row needs to be usable for evaluation
+REQUIRED_COLUMNS = ["generated_query", "device_info", "language"]
+
 
 class CREATE_DATASET:
     def __init__(self):
@@ -14,7 +21,6 @@ class CREATE_DATASET:
             self.default_config = json.load(f)
         f.close()
         self.logger = logging.getLogger(__name__)
-        logging.basicConfig(level=logging.INFO)
         # In create_dataset.py __init__
         self.llm_provider = self.default_config.get("llm_provider", "gemini")
         self.llm_model = self.default_config.get("llm_model", "gemini-2.0-flash") # Provide a sensible default
@@ -22,114 +28,115 @@ class CREATE_DATASET:
         self.utils_obj = UTILS(provider=self.llm_provider, model_name=self.llm_model)
         self.device_functions_dict = self.default_config["device_functions_dict"]
         self.current_device = None  # Track current device for context-aware value generation
+        self.rng = random.Random()  # Reseeded per row, so a row's spec can be regenerated from its seed
 
     def generate_random_value(self, arg_name):
         """Generate random values based on argument name, covering all subtypes and ranges from config.json."""
         # General on/off, status, state
         if arg_name == "status": # TV, AC, Fridge, DoorAlarm, ChildLock, DisplayLight, BeepSound, Swing
-            return random.choice(["on", "off"])
+            return self.rng.choice(["on", "off"])
         elif arg_name == "state":  # Fan power
-            return random.choice(["on", "off"])
+            return self.rng.choice(["on", "off"])
 
         # Device specific arguments
         if self.current_device == "microwave":
             if arg_name == "temp":
-                return random.randrange(180, 221, 10)
+                return self.rng.randrange(180, 221, 10)
             elif arg_name == "time":
-                return random.randint(1, 61) * 0.5 # 0.5 to 30.5 minutes
+                return self.rng.randint(1, 61) * 0.5 # 0.5 to 30.5 minutes
             elif arg_name == "watts":
-                return random.choice([100, 200, 400, 600, 800, 1000])
+                return self.rng.choice([100, 200, 400, 600, 800, 1000])
 
         elif self.current_device == "tv":
             if arg_name == "level": # Volume
-                return random.randint(0, 100)
+                return self.rng.randint(0, 100)
             elif arg_name == "appName":
-                return random.choice(["Netflix", "YouTube", "Prime", "Disney+", "Hotstar", "Spotify"])
+                return self.rng.choice(["Netflix", "YouTube", "Prime", "Disney+", "Hotstar", "Spotify"])
             elif arg_name == "menu":
-                return random.choice(["picture", "sound", "network", "system"])
+                return self.rng.choice(["picture", "sound", "network", "system"])
             elif arg_name == "source":
-                return random.choice(["HDMI1", "HDMI2", "AV", "TV", "USB"])
+                return self.rng.choice(["HDMI1", "HDMI2", "AV", "TV", "USB"])
             elif arg_name == "input": # Search query
-                return random.choice(["latest movies", "breaking news", "live sports", "local weather", "open Netflix", "search YouTube for cat videos"])
+                return self.rng.choice(["latest movies", "breaking news", "live sports", "local weather", "open Netflix", "search YouTube for cat videos"])
             elif arg_name == "action": # Playback
-                return random.choice(["play", "pause", "stop", "rewind", "fastForward"])
+                return self.rng.choice(["play", "pause", "stop", "rewind", "fastForward"])
             elif arg_name == "direction": # Navigation, Volume/Channel
-                return random.choice(["up", "down", "left", "right", "select", "back", "home"])
+                return self.rng.choice(["up", "down", "left", "right", "select", "back", "home"])
             elif arg_name == "duration": # Record
-                return random.randint(1, 180) # minutes
+                return self.rng.randint(1, 180) # minutes
             elif arg_name == "number": # Channel
-                return random.randint(1, 999)
+                return self.rng.randint(1, 999)
 
         elif self.current_device == "washer":
             if arg_name == "soil_level":
-                return random.choice(["heavy", "normal", "light"])
+                return self.rng.choice(["heavy", "normal", "light"])
             elif arg_name == "load_size":
                 # Prompt allows number or small/medium/large. Generate both types.
-                if random.choice([True, False]):
-                    return random.randint(1, 12) # lbs
+                if self.rng.choice([True, False]):
+                    return self.rng.randint(1, 12) # lbs
                 else:
-                    return random.choice(["small", "medium", "large"])
+                    return self.rng.choice(["small", "medium", "large"])
             elif arg_name == "load_type": # For Normal mode
-                return random.choice(["regular", "mixed", "whites", "colors"])
+                return self.rng.choice(["regular", "mixed", "whites", "colors"])
             elif arg_name == "fabric_type":
                 # Delicates, PermPress modes
-                return random.choice(["cotton", "synthetic", "wool", "performance", "wrinklefree", "delicate"])
+                return self.rng.choice(["cotton", "synthetic", "wool", "performance", "wrinklefree", "delicate"])
             elif arg_name == "item_type": # Bedding mode
-                return random.choice(["bedding", "towel", "shirt", "jeans", "blanket"])
+                return self.rng.choice(["bedding", "towel", "shirt", "jeans", "blanket"])
             elif arg_name == "bleach_option": # SteamWhites mode
-                return random.choice(["yes", "no"])
+                return self.rng.choice(["yes", "no"])
             elif arg_name == "color_shade": # Denim mode
-                return random.choice(["light", "dark", "medium"])
+                return self.rng.choice(["light", "dark", "medium"])
             elif arg_name == "colorfast": # SteamSanitize mode
-                return random.choice([True, False])
+                return self.rng.choice([True, False])
 
         elif self.current_device == "dryer":
             if arg_name == "fabric_type":
                 # Normal, HeavyDuty, SuperSpeed, Wool, PermPress modes
-                return random.choice(["cotton", "wool", "synthetic", "wrinklefree", "delicate"])
+                return self.rng.choice(["cotton", "wool", "synthetic", "wrinklefree", "delicate"])
             elif arg_name == "load_status": # SteamSanitize, SteamRefresh modes
-                return random.choice(["wet", "partial_wet", "dry"])
+                return self.rng.choice(["wet", "partial_wet", "dry"])
             elif arg_name == "duration": # TimeDry, WrinkleAway modes
-                return random.randint(10, 120) # minutes
+                return self.rng.randint(10, 120) # minutes
             elif arg_name == "item_count": # WrinkleAway, SteamRefresh modes
-                return random.randint(1, 10) # Realistic number of items
+                return self.rng.randint(1, 10) # Realistic number of items
             elif arg_name == "machine_washable": # Wool mode
-                return random.choice([True, False])
+                return self.rng.choice([True, False])
 
         elif self.current_device == "ac":
             if arg_name == "temperature":
-                return random.randint(16, 30)
+                return self.rng.randint(16, 30)
             elif arg_name == "duration": # Timer mode
-                return random.randint(1, 24) # hours
+                return self.rng.randint(1, 24) # hours
             elif arg_name == "speed": # FanSpeed mode
-                return random.choice(["low", "medium", "high", "auto"])
+                return self.rng.choice(["low", "medium", "high", "auto"])
             # status handled generically above
 
         elif self.current_device == "fridge":
             if arg_name == "temperature":
-                return random.randint(-4, 24)
+                return self.rng.randint(-4, 24)
             elif arg_name == "duration": # ConvertFreezerToFridge, EnergySavingMode, Deodorize modes
-                return random.randint(1, 48) # hours (Allowing up to 2 days for some modes)
+                return self.rng.randint(1, 48) # hours (Allowing up to 2 days for some modes)
             elif arg_name == "level": # DisplayBrightness mode
-                return random.randint(1, 5)
+                return self.rng.randint(1, 5)
             # status handled generically above
 
         elif self.current_device == "fan":
             if arg_name == "action": # Speed mode
-                return random.choice(["up", "down", "increase by", "decrease by"])
+                return self.rng.choice(["up", "down", "increase by", "decrease by"])
             elif arg_name == "level": # Speed mode (for increase/decrease by)
-                return random.randint(1, 5) # Assuming a smaller range for fans
+                return self.rng.randint(1, 5) # Assuming a smaller range for fans
             # state handled generically above
 
         else: # Fallback for unhandled/generic or error case
             self.logger.warning(f"Unhandled argument name: {arg_name} for device {self.current_device} or device context missing.")
             # Return a plausible generic value if possible, otherwise None
             if arg_name in ["level", "number", "count", "duration", "temperature"]:
-                return random.randint(1, 10)
+                return self.rng.randint(1, 10)
             elif arg_name in ["speed", "mode", "setting"]:
-                return random.choice(["auto", "medium", "default"])
+                return self.rng.choice(["auto", "medium", "default"])
             elif isinstance(arg_name, str): # Catch-all for string types
-                 return random.choice(["default_value", "option1", "settingA"])
+                 return self.rng.choice(["default_value", "option1", "settingA"])
             return None
 
     def randomize_devices(self):
@@ -137,12 +144,12 @@ class CREATE_DATASET:
         list_of_devices = list(self.device_functions_dict.keys())
 
         # Randomly select number of devices (1-5)
-        num_devices = random.randint(1, min(5, len(list_of_devices)))
+        num_devices = self.rng.randint(1, min(5, len(list_of_devices)))
 
         result = {"selections": []}
 
         # Select random devices
-        chosen_devices = random.sample(list_of_devices, num_devices)
+        chosen_devices = self.rng.sample(list_of_devices, num_devices)
 
         for device in chosen_devices:
             # Set current device for context-aware value generation
@@ -152,7 +159,7 @@ class CREATE_DATASET:
             modes = self.device_functions_dict[device]
 
             # Select random mode
-            mode_info = random.choice(modes)
+            mode_info = self.rng.choice(modes)
 
             # Extract mode name and args
             mode_name = mode_info["mode"]
@@ -165,7 +172,7 @@ class CREATE_DATASET:
                 # --- Special handling blocks remain, adjusted to use generate_random_value --- 
                 if device == "fan" and mode_name == "speed":
                     # Fan speed needs action and possibly level based on config ["action", "level"]
-                    action = random.choice(["up", "down", "increase by", "decrease by"])
+                    action = self.rng.choice(["up", "down", "increase by", "decrease by"])
                     args["action"] = action
                     if action in ["increase by", "decrease by"]:
                         # Use generate_random_value for level
@@ -174,7 +181,7 @@ class CREATE_DATASET:
                 elif device == "tv" and mode_name == "volume":
                     # TV volume needs direction and level based on config ["direction", "level"]
                     # Generate direction specific to volume contexts
-                    direction = random.choice(["up", "down", "increase by", "decrease by", "mute", "unmute"])
+                    direction = self.rng.choice(["up", "down", "increase by", "decrease by", "mute", "unmute"])
                     args["direction"] = direction
                     if direction not in ["mute", "unmute"]:
                          # Use generate_random_value for level
@@ -182,16 +189,16 @@ class CREATE_DATASET:
 
                 elif device == "tv" and mode_name == "channel":
                      # TV channel can be up/down or specific number based on config ["direction", "number"]
-                    if random.choice([True, False]):
+                    if self.rng.choice([True, False]):
                         # Generate direction specific to channel contexts
-                        args["direction"] = random.choice(["up", "down"])
+                        args["direction"] = self.rng.choice(["up", "down"])
                     else:
                         args["number"] = self.generate_random_value('number')
 
                 elif device == "tv" and mode_name == "navigate":
                     # TV navigation direction based on config ["direction"]
                     # Generate direction specific to navigation contexts
-                    args["direction"] = random.choice(["up", "down", "left", "right", "select", "back", "home"])
+                    args["direction"] = self.rng.choice(["up", "down", "left", "right", "select", "back", "home"])
 
                 # --- Generic Handling Block --- 
                 else:
@@ -208,20 +215,24 @@ class CREATE_DATASET:
 
         return result
 
-    async def create_dataset_row(self):
+    async def create_dataset_row(self, seed=None):
         """
-        Generate dataset prompts based on device selections and save to CSV.
+        Generate one dataset row: a random device selection and the LLM's command for it.
 
         Args:
-           selections: Dictionary containing device selections from randomize_devices()
-           agent_prompts: Module containing the DATASET_ROW_CREATION_PROMPT
-           output_file: Path to save the CSV file
+           seed (int, optional): Seed of the device selection, language, task type and vagueness.
+
+        Returns:
+            dict with generated_query, device_info, language, seed and spec (the selection sent to
+            the LLM, as JSON).
         """
+        # Everything random is drawn before the first await, so concurrent rows cannot interleave
+        self.rng = random.Random(seed)
         selections = self.randomize_devices()
 
         result = {"generated_query": "", "device_info": [], "language":""}
 
-        language = random.sample(
+        language = self.rng.sample(
             [
                 "Hindi (Devanagari)",
                 "Bengali (Bangla)",
@@ -257,18 +268,18 @@ class CREATE_DATASET:
         else:
             task_types = ["Sequential", "Concurrent", "Sequential and Concurrent"]
             task_weights = [1, 1, 8]
-        task_style = random.choices(task_types, weights=task_weights, k=1)[0]
+        task_style = self.rng.choices(task_types, weights=task_weights, k=1)[0]
         
         # Add vagueness parameter
-        vagueness = random.choices([True, False], weights=[0.7, 0.3], k=1)[0]
+        vagueness = self.rng.choices([True, False], weights=[0.7, 0.3], k=1)[0]
 
         # Assign execution_type to each device
         devices = selections["selections"]
         if task_style == "Sequential and Concurrent" and num_devices > 1:
             # Randomly split devices into sequential and concurrent groups
-            split_point = random.randint(1, num_devices - 1)
+            split_point = self.rng.randint(1, num_devices - 1)
             indices = list(range(num_devices))
-            random.shuffle(indices)
+            self.rng.shuffle(indices)
             seq_indices = set(indices[:split_point])
             for i, device in enumerate(devices):
                 if i in seq_indices:
@@ -288,11 +299,12 @@ class CREATE_DATASET:
             "vagueness": vagueness
         }
 
+        spec = json.dumps(details, ensure_ascii=False)
         formatted_prompt = agent_prompts.DATASET_CREATION_PROMPT.format(details=details).replace("{{", "{").replace("}}", "}")
         message = self.utils_obj.create_message(role="user", content=formatted_prompt)
 
         response = await self.utils_obj.chat([message])
-        self.logger.info(response)
+        self.logger.info("Dataset row generated", extra={"role": "dataset", "payload": response})
         try:
             if self.llm_provider == "gemini":
                 generated_query = json.loads(response["message"]["content"])
@@ -309,7 +321,11 @@ class CREATE_DATASET:
                 )
             self.logger.warning(f"Error Occurred: {e}")
         result["generated_query"] = generated_query["generated_query"].replace("\"", "")
+        if not result["generated_query"].strip():
+            raise ValueError("LLM returned an empty generated_query")
         result['language'] = language
+        result['seed'] = seed
+        result['spec'] = spec
         
         # Add task_type, vagueness, and execution_type to each device info
         for device in devices:
@@ -319,18 +335,157 @@ class CREATE_DATASET:
 
         return result
 
-    async def create_dataset(self, output_file="dataset.csv"):
-        semaphore = asyncio.Semaphore(self.default_config["max_concurrency"])
-        rows_of_dataset = []
-        for _ in range(self.default_config["num_of_data_points"]):
-            async with semaphore:
-                row_dataset = asyncio.create_task(self.create_dataset_row())
-                rows_of_dataset.append(row_dataset)
-        dataset = await asyncio.gather(*rows_of_dataset)
-        df = pd.DataFrame(dataset)
-        df.to_csv(output_file, index=False)
+    @staticmethod
+    def is_valid_row(row, columns=DATASET_COLUMNS):
+        """
+        Whether a row read back from the CSV is complete. A row cut short by a killed process
+        lacks its last columns or ends inside one, which leaves its seed or spec unparseable.
+        Rows from before the seed and spec columns have neither and are kept without them.
+
+        Args:
+            row (dict): Row from csv.DictReader.
+            columns (list): Columns of the file.
+        """
+        # DictReader fills columns missing from a short row with None and files extra fields under None
+        if None in row or any(row.get(column) is None for column in columns):
+            return False
+        if any(not row.get(column, "").strip() for column in REQUIRED_COLUMNS):
+            return False
+        try:
+            devices = ast.literal_eval(row["device_info"])
+        except (ValueError, SyntaxError):
+            return False
+        if not isinstance(devices, list) or not devices:
+            return False
+        seed, spec = row.get("seed") or "", row.get("spec") or ""
+        if not seed and not spec:
+            return True
+        if not seed.lstrip("-").isdigit():
+            return False
+        try:
+            return isinstance(json.loads(spec), dict)
+        except ValueError:
+            return False
+
+    def load_existing_rows(self, output_file):
+        """
+        Valid rows already in `output_file`, which is rewritten with only those rows if it holds a
+        row cut short by a killed process, an invalid row, an older set of columns or a last line
+        without its newline (the next row would be appended to it).
+        """
+        if not os.path.exists(output_file) or not os.path.getsize(output_file):
+            return []
+        with open(output_file, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            terminated = f.read(1) == b"\n"
+        with open(output_file, "r", encoding="utf-8", newline="") as f:
+            reader = csv.DictReader(f)
+            rows = list(reader)
+            columns = reader.fieldnames or []
+        # In the current columns, empty where an older file had none
+        valid = [
+            {column: row.get(column) or "" for column in DATASET_COLUMNS}
+            for row in rows if self.is_valid_row(row, columns)
+        ]
+        if len(valid) < len(rows) or columns != DATASET_COLUMNS or not terminated:
+            self.logger.warning(f"Rewriting {output_file}: keeping {len(valid)} of {len(rows)} rows")
+            with open(output_file + ".tmp", "w", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=DATASET_COLUMNS, lineterminator="\n")
+                writer.writeheader()
+                writer.writerows(valid)
+            os.replace(output_file + ".tmp", output_file)
+        return valid
+
+    async def create_dataset(self, output_file="dataset.csv", num_rows=None, max_concurrency=None, seed=None,
+                             max_failures=None):
+        """
+        Generate rows with at most `max_concurrency` LLM calls in flight until `output_file`
+        holds `num_rows` valid rows, streaming each row to the CSV as it completes.
 
+        Each row is appended and synced to disk as soon as it is ready, with the seed it was
+        generated from and its spec (the device selection, language, task type and vagueness
+        sent to the LLM). A row whose LLM call fails or returns unusable JSON is logged and
+        replaced by a new attempt. Rerunning with the same output file keeps its valid rows and
+        only generates the missing ones, so large datasets can be built over several runs.
 
-dataset_creation = CREATE_DATASET()
+        Rows are seeded seed, seed + 1, ...; a resumed run continues after the highest seed in
+        the file. Use seeds far apart for independent datasets.
 
-asyncio.run(dataset_creation.create_dataset())
+        Args:
+            output_file (str): CSV to write (columns generated_query, device_info, language, seed, spec).
+            num_rows (int, optional): Valid rows wanted; defaults to num_of_data_points in config.json.
+            max_concurrency (int, optional): Rows generated at once; defaults to max_concurrency in config.json.
+            seed (int, optional): Seed of the first row; defaults to dataset_seed in config.json, else 0.
+            max_failures (int, optional): Failed rows after which the run stops (a rerun resumes it);
+                defaults to the number of rows still missing, at least 10.
+
+        Returns:
+            dict with the rows that existed, were written and failed, and the rows now in the file.
+        """
+        num_rows = self.default_config["num_of_data_points"] if num_rows is None else num_rows
+        max_concurrency = max_concurrency or self.default_config["max_concurrency"]
+        seed = self.default_config.get("dataset_seed", 0) if seed is None else seed
+        existing = self.load_existing_rows(output_file)
+        seeds = [int(row["seed"]) for row in existing if str(row.get("seed", "")).lstrip("-").isdigit()]
+        next_seed = max(max(seeds) + 1, seed) if seeds else seed
+        missing = max(0, num_rows - len(existing))
+        max_failures = max(missing, 10) if max_failures is None else max_failures
+        stats = {"existing": len(existing), "written": 0, "failed": 0}
+        if existing:
+            self.logger.info(f"Resuming {output_file}: {len(existing)}/{num_rows} rows already generated")
+        # Rows written or in progress; a failed row frees its place for a new attempt
+        state = {"claimed": 0, "next_seed": next_seed}
+        finished = asyncio.Queue(maxsize=max_concurrency)
+
+        async def worker():
+            while state["claimed"] < missing and stats["failed"] < max_failures:
+                state["claimed"] += 1
+                row_seed = state["next_seed"]
+                state["next_seed"] += 1
+                try:
+                    row = await self.create_dataset_row(row_seed)
+                except Exception as e:
+                    self.logger.error(f"Dataset row with seed {row_seed} failed: {e}")
+                    state["claimed"] -= 1
+                    stats["failed"] += 1
+                    continue
+                await finished.put(row)
+
+        async def writer(f):
+            csv_writer = csv.DictWriter(f, fieldnames=DATASET_COLUMNS, lineterminator="\n")
+            # A file holding only its header has no rows but must not get a second header
+            if f.tell() == 0:
+                csv_writer.writeheader()
+            while True:
+                row = await finished.get()
+                if row is None:
+                    return
+                csv_writer.writerow(row)
+                f.flush()
+                os.fsync(f.fileno())
+                stats["written"] += 1
+
+        with open(output_file, "a", encoding="utf-8", newline="") as f:
+            writer_task = asyncio.create_task(writer(f))
+            workers = [asyncio.create_task(worker()) for _ in range(max(1, min(max_concurrency, missing)))]
+            try:
+                await asyncio.gather(*workers)
+                await finished.put(None)
+                await writer_task
+            except BaseException:
+                for task in [writer_task, *workers]:
+                    task.cancel()
+                raise
+        stats["rows"] = stats["existing"] + stats["written"]
+        if stats["rows"] < num_rows:
+            self.logger.error(
+                f"Stopped after {stats['failed']} failed rows with {stats['rows']}/{num_rows} rows; rerun to resume"
+            )
+        self.logger.info(f"Wrote {stats['written']} rows to {output_file} ({stats['rows']}/{num_rows}), {stats['failed']} failed")
+        return stats
+
+if __name__ == "__main__":
+    setup_logging()
+    dataset_creation = CREATE_DATASET()
+
+    asyncio.run(dataset_creation.create_dataset())
@@ -1,13 +1,198 @@
+import argparse
 import asyncio
 import csv
+import hashlib
 import json
 import ast
+import contextvars
+import os
+import sys
+import time
+from collections import deque
 from typing import List, Dict
-from main import ASYNC_HOME_AGENT
+import pandas as pd
+from tqdm import tqdm
+from ollama import AsyncClient
+from main import ASYNC_HOME_AGENT, current_llm_role
+import utils.agent_prompts as agent_prompts
+from utils.language_detector import detect_languages, detect_scripts
+from utils.comparison import PAIRED_COMPARISON
+from utils.coreset import CORESET_SELECTOR, held_out_fit, random_baseline, row_features, subset_fit
+from utils.logging_pipeline import setup_logging
+from utils.report_store import convert_report, load_report, report_paths, save_report
+from utils.sampling import SEQUENTIAL_SAMPLER, collapse_strata
+from utils.scheduler import LLM_SCHEDULER, current_command, set_command_context
+from utils.scoring import score_frame, score_results
+from utils.utils import UTILS
 
-class SmartHomeEvaluator:
+# LLM calls made for the query (or device subtask) being evaluated; CALL_RECORDER appends to it
+current_calls = contextvars.ContextVar("current_calls", default=None)
+
+LATENCY_PERCENTILES = (50, 95, 99)
+
+# How _full_agent_workflow runs a query: "production" serves it like server.py (LLM_SCHEDULER,
+# concurrent device agents); "serial" calls each device agent in turn, as reports before it did
+PIPELINES = ("production", "serial")
+
+# Stages whose output is never scored, so --skip-unscored can leave them out
+UNSCORED_STAGES = ("completion",)
+
+def seconds(nanoseconds):
+    return nanoseconds / 1e9 if nanoseconds else None
+
+class CALL_RECORDER:
+    def __init__(self, utils_obj):
+        """
+        Times every chat call of the wrapped UTILS and reads its token counts.
+
+        Queue wait is the part of the wall time Ollama did not spend on the request (wall time
+        minus its total_duration): time waiting for a free model slot, plus the network.
+        Providers or cache hits without server timings leave it and the token rate as None.
+        """
+        self.utils_obj = utils_obj
+
+    def __getattr__(self, name):
+        return getattr(self.utils_obj, name)
+
+    async def chat(self, messages):
+        started = time.perf_counter()
+        response = await self.utils_obj.chat(messages)
+        wall_time = time.perf_counter() - started
+        calls = current_calls.get()
+        if calls is not None:
+            get = response.get if response is not None else (lambda key: None)
+            server_time = seconds(get('total_duration'))
+            generation_time = seconds(get('eval_duration'))
+            completion_tokens = get('eval_count')
+            calls.append({
+                'role': current_llm_role.get(),
+                'wall_time': round(wall_time, 4),
+                'queue_wait': round(max(wall_time - server_time, 0.0), 4) if server_time else None,
+                'prompt_tokens': get('prompt_eval_count'),
+                'completion_tokens': completion_tokens,
+                'generation_time': round(generation_time, 4) if generation_time else None,
+                'tokens_per_second': round(completion_tokens / generation_time, 2)
+                if completion_tokens and generation_time else None,
+                'failed': response is None,
+            })
+        return response
+
+def query_timing(wall_time: float, calls: List[Dict]) -> Dict:
+    """Totals of one query's LLM calls, kept with the calls themselves."""
+    def total(key):
+        values = [call[key] for call in calls if call[key] is not None]
+        return sum(values) if values else None
+    completion_tokens, generation_time = total('completion_tokens'), total('generation_time')
+    queue_wait = total('queue_wait')
+    return {
+        'wall_time': round(wall_time, 4),
+        'queue_wait': round(queue_wait, 4) if queue_wait is not None else None,
+        'prompt_tokens': total('prompt_tokens'),
+        'completion_tokens': completion_tokens,
+        'tokens_per_second': round(completion_tokens / generation_time, 2)
+        if completion_tokens and generation_time else None,
+        'llm_calls': len(calls),
+        'calls': calls,
+    }
+
+def normalise_subtask(text) -> str:
+    """'  Turn ON the fan. ' -> 'turn on the fan'"""
+    return " ".join(str(text).lower().split()).rstrip(".!?। ")
+
+class SUBTASK_MEMO:
     def __init__(self):
-        self.agent = ASYNC_HOME_AGENT()
+        """
+        Device-agent responses of one evaluation run, keyed by (model, device, device name, normalised subtask).
+
+        Different queries are often decomposed into the same subtask ("turn on fan"); the first
+        one calls the device agent and the others reuse its response. Rows asking for a subtask
+        that is still in flight wait for that call instead of making their own. Failed calls
+        are not kept, so the next row asking retries them.
+        """
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key, call):
+        """Response for `key`, running `call()` only if no row has asked for it yet."""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            entry = asyncio.ensure_future(call())
+            self.entries[key] = entry
+            entry.add_done_callback(lambda future: self.forget_failed(key, future))
+        else:
+            self.hits += 1
+        # Shielded so a cancelled row does not cancel a call other rows are waiting on
+        return await asyncio.shield(entry)
+
+    def forget_failed(self, key, future):
+        if future.cancelled() or future.exception() is not None or future.result() is None:
+            if self.entries.get(key) is future:
+                del self.entries[key]
+
+    def metrics(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'enabled': True,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'entries': len(self.entries),
+        }
+
+class EVALUATION_AGENT(ASYNC_HOME_AGENT):
+    def __init__(self, model_name, memo: SUBTASK_MEMO = None, **kwargs):
+        """
+        ASYNC_HOME_AGENT whose device-agent calls are shared through the run's SUBTASK_MEMO
+        and recorded under the query being evaluated, tagged with the device name.
+        """
+        super().__init__(**kwargs)
+        self.model_name = model_name
+        # Shared by all evaluators of a run; None calls the device agent for every subtask
+        self.memo = memo
+
+    async def get_agent_response(self, user_query, separated_query):
+        calls = []
+        token = current_calls.set(calls)
+        try:
+            if self.memo is None:
+                return await super().get_agent_response(user_query, separated_query)
+            key = (
+                self.model_name, separated_query.get("device"), separated_query.get("device_name"),
+                normalise_subtask(separated_query.get("Input", ""))
+            )
+            agent_response = super().get_agent_response
+            return await self.memo.get(key, lambda: agent_response(user_query, separated_query))
+        finally:
+            current_calls.reset(token)
+            query_calls = current_calls.get()
+            if query_calls is not None:
+                query_calls.extend({**call, 'device_name': separated_query.get("device_name")} for call in calls)
+
+class SmartHomeEvaluator:
+    def __init__(self, provider='ollama', model_name='qwen2.5:32b', host=None, memo: SUBTASK_MEMO = None,
+                 pipeline='production', skip_stages=(), llm_concurrency=4):
+        """
+        Args:
+            pipeline: "production" or "serial" (see PIPELINES).
+            skip_stages: Unscored stages to leave out (see UNSCORED_STAGES); latency is then no
+                         longer what users see.
+            llm_concurrency: LLM calls in flight through the scheduler, as server.py's --llm-concurrency.
+        """
+        self.host = host
+        self.provider = provider
+        self.model_name = model_name
+        self.pipeline = pipeline
+        utils_obj = UTILS(provider=provider, model_name=model_name, host=host)
+        if pipeline == "production":
+            utils_obj = LLM_SCHEDULER(utils_obj, max_inflight=llm_concurrency)
+        # Recorder outermost, so a call's queue wait includes the time it waited in the scheduler
+        self.agent = EVALUATION_AGENT(
+            model_name, memo, utils_obj=CALL_RECORDER(utils_obj), skip_stages=skip_stages
+        )
+        # Work done through this evaluator's endpoint, filled in by evaluate_rows
+        self.stats = {'rows': 0, 'shards': 0, 'stolen_rows': 0, 'started': None, 'finished': None}
         self.device_map = {
             "refrigerator": "fridge",
             "fridge": "fridge",
@@ -21,9 +206,32 @@ class SmartHomeEvaluator:
         for device_name, device_type in self.agent.dict_devices.items():
             self.device_map[device_name] = device_type
 
+    @property
+    def memo(self):
+        return self.agent.memo
+
+    @memo.setter
+    def memo(self, memo):
+        self.agent.memo = memo
+
+    def throughput(self) -> Dict:
+        """Rows evaluated through this endpoint and its queries per second while it was working."""
+        stats = self.stats
+        seconds = stats['finished'] - stats['started'] if stats['started'] is not None else 0.0
+        return {
+            'rows': stats['rows'],
+            'shards': stats['shards'],
+            'stolen_rows': stats['stolen_rows'],
+            'seconds': round(seconds, 3),
+            'queries_per_second': round(stats['rows'] / seconds, 3) if seconds > 0 else 0.0,
+        }
+
     async def _full_agent_workflow(self, query: str) -> Dict:
+        if self.pipeline == "production":
+            return await self._production_workflow(query)
         try:
-            user_query, classification_response, start_time = await self.agent.task_by_user(eval=True, user_query=query)
+            user_query, classification_response, start_time = await self.agent.task_by_user(query)
+            classification_content = None
             if hasattr(classification_response, 'message'):
                 classification_content = classification_response.message.content
                 parsed_classification = await self.agent.parse_json_response(classification_content)
@@ -65,6 +273,7 @@ class SmartHomeEvaluator:
                     })
             return {
                 "query": query,
+                "raw_classification": classification_content,
                 "classification": parsed_classification,
                 "concurrent_results": concurrent_results,
                 "sequential_results": sequential_results
@@ -73,176 +282,796 @@ class SmartHomeEvaluator:
             print(f"Error in _full_agent_workflow: {e}")
             raise
 
-# --- Simple Evaluation Functions ---
-def device_score(expected, predicted):
-    # Device name match
-    device_match = int(expected['device'].lower() == predicted.get('device_type', '').lower())
-    # Task type match
-    expected_type = expected.get('execution_type', 'concurrent').lower()
-    predicted_type = predicted.get('task_type', 'concurrent').lower() if 'task_type' in predicted else (
-        'sequential' if predicted.get('from') == 'sequential_results' else 'concurrent')
-    task_type_match = int(expected_type == predicted_type)
-    # Mode match
-    expected_mode = str(expected.get('mode', '')).lower()
-    actual_mode = ''
-    parsed = predicted.get('parsed_response', {})
-    if isinstance(parsed, dict):
-        if 'mode' in parsed:
-            actual_mode = str(parsed['mode']).lower()
-        else:
-            for v in parsed.values():
-                if isinstance(v, dict) and 'mode' in v:
-                    actual_mode = str(v['mode']).lower()
-    mode_match = int(expected_mode == actual_mode)
-    # Args match
-    expected_args = expected.get('args', {})
-    actual_args = {}
-    if isinstance(parsed, dict):
-        if 'mode' in parsed:
-            actual_args = {k: v for k, v in parsed.items() if k != 'mode'}
+    async def _production_workflow(self, query: str) -> Dict:
+        """
+        Run the query the way server.py serves a command (task_by_user, then run_command) and
+        put the device responses in the same form as the serial workflow.
+
+        Each query is its own home, so the scheduler shares LLM slots between in-flight
+        queries as it would between homes.
+        """
+        token = set_command_context(f"eval-{hashlib.sha1(query.encode('utf-8')).hexdigest()[:12]}")
+        try:
+            user_query, classification_response, start_time = await self.agent.task_by_user(query)
+            outcome = await self.agent.run_command(user_query, classification_response, start_time)
+        finally:
+            current_command.reset(token)
+        classification_content = self.agent.response_content(classification_response) \
+            if hasattr(classification_response, 'message') else None
+        if classification_content is not None:
+            parsed_classification = await self.agent.parse_json_response(classification_content)
         else:
-            for v in parsed.values():
-                if isinstance(v, dict) and 'mode' in v:
-                    actual_args = {k: v for k, v in v.items() if k != 'mode'}
-    if not expected_args and not actual_args:
-        args_match = 1
-    elif expected_args and actual_args:
-        match = True
-        for k, v in expected_args.items():
-            if k not in actual_args or str(actual_args[k]).lower() != str(v).lower():
-                match = False
-        args_match = int(match)
-    else:
-        args_match = 0
-    # Weighted total
-    weighted = 0.4 * device_match + 0.25 * mode_match + 0.25 * args_match + 0.1 * task_type_match
-    return {
-        'weighted_total': weighted,
-        'device_score': device_match,
-        'task_type_score': task_type_match,
-        'mode_score': mode_match,
-        'args_score': args_match
-    }
+            parsed_classification = {"tasks": {"concurrent": [], "sequential": []}}
+        results = {}
+        for task_type in ("concurrent", "sequential"):
+            tasks = parsed_classification.get("tasks", {}).get(task_type, [])
+            results[task_type] = []
+            # run_command returns one response (None if it failed) per task, in task order
+            for task, raw_response in zip(tasks, outcome.get(task_type, [])):
+                if raw_response:
+                    results[task_type].append({
+                        "device_name": task.get("device_name"),
+                        "device_type": task.get("device"),
+                        "task": task.get("Input"),
+                        "raw_response": raw_response,
+                        "parsed_response": await self.agent.parse_json_response(raw_response)
+                    })
+        return {
+            "query": query,
+            "raw_classification": classification_content,
+            "classification": parsed_classification,
+            "concurrent_results": results["concurrent"],
+            "sequential_results": results["sequential"]
+        }
 
-def find_predicted_device(expected, agent_results):
-    # Try to find the predicted device in both concurrent and sequential results
-    device = expected['device'].lower()
-    for r in agent_results['concurrent_results']:
-        if r['device_type'].lower() == device:
-            r = dict(r)
-            r['task_type'] = 'concurrent'
-            r['from'] = 'concurrent_results'
-            return r
-    for r in agent_results['sequential_results']:
-        if r['device_type'].lower() == device:
-            r = dict(r)
-            r['task_type'] = 'sequential'
-            r['from'] = 'sequential_results'
-            return r
-    # If not found, return an empty prediction
-    return {
-        'device_type': '',
-        'task_type': '',
-        'parsed_response': {},
-        'from': '',
-    }
+async def evaluate_query(evaluator, query: str, language:str, expected_devices: List[Dict]) -> Dict:
+    calls = []
+    token = current_calls.set(calls)
+    started = time.perf_counter()
+    try:
+        agent_results = await evaluator._full_agent_workflow(query)
+    finally:
+        current_calls.reset(token)
+    wall_time = time.perf_counter() - started
+    result = score_query(query, language, expected_devices, agent_results)
+    # Keep what the model said so scoring rules can change later without rerunning it (see rescore_report)
+    result['expected'] = expected_devices
+    result['raw'] = {k: v for k, v in agent_results.items() if k != 'query'}
+    result['timing'] = query_timing(wall_time, calls)
+    return result
 
-def extract_predicted_fields(predicted):
-    # Extract device, task_type, mode, args from predicted result
-    device = predicted.get('device_type', '')
-    task_type = predicted.get('task_type', '')
-    parsed = predicted.get('parsed_response', {})
-    mode = ''
-    args = {}
-    if isinstance(parsed, dict):
-        if 'mode' in parsed:
-            mode = str(parsed['mode'])
-            args = {k: v for k, v in parsed.items() if k != 'mode'}
-        else:
-            for v in parsed.values():
-                if isinstance(v, dict) and 'mode' in v:
-                    mode = str(v['mode'])
-                    args = {k: v for k, v in v.items() if k != 'mode'}
-    return {
-        'device': device,
-        'task_type': task_type,
-        'mode': mode,
-        'args': args
+def score_query(query: str, language: str, expected_devices: List[Dict], agent_results: Dict) -> Dict:
+    """Score one query's agent results against its expected devices; no LLM calls."""
+    return {'query': query, 'language': language, **score_results([(expected_devices, agent_results)])[0]}
+
+def stored_agent_results(result: Dict) -> Dict:
+    """
+    Agent results of a report entry, for rescoring.
+
+    Reports written before raw responses were stored only have the extracted 'predicted'
+    fields; those are turned back into the minimal results the scoring functions read.
+    """
+    if result.get('raw'):
+        return result['raw']
+    rebuilt = {'concurrent_results': [], 'sequential_results': []}
+    for entry in result['devices']:
+        predicted = entry['predicted']
+        if not predicted.get('device'):
+            continue
+        parsed = {'mode': predicted['mode'], **(predicted.get('args') or {})} if predicted.get('mode') else {}
+        key = 'sequential_results' if predicted.get('task_type') == 'sequential' else 'concurrent_results'
+        rebuilt[key].append({'device_type': predicted['device'], 'parsed_response': parsed})
+    return rebuilt
+
+def stored_expected_devices(result: Dict) -> List[Dict]:
+    """Expected devices of a report entry, rebuilt from the 'actual' fields for older reports."""
+    if result.get('expected') is not None:
+        return result['expected']
+    return [
+        {'device': a['device'], 'execution_type': a['task_type'], 'mode': a['mode'], 'args': a['args']}
+        for a in (entry['actual'] for entry in result['devices'])
+    ]
+
+def summarise_results(results: List[Dict]) -> Dict:
+    summary = {
+        'overall_average': sum(r['query_score']['query_weighted_total'] for r in results) / len(results) if results else 0,
+        'language_breakdown': language_breakdown(results),
     }
+    latency = latency_breakdown(results)
+    if latency is not None:
+        summary['latency'] = latency
+    summary['query_scores'] = results
+    return summary
 
-def extract_actual_fields(expected):
+def latency_breakdown(results: List[Dict]) -> Dict:
+    """
+    p50/p95/p99 of query wall time, queue wait and token rate, overall, per language and per
+    number of expected devices. None when no result was timed (reports from before timing).
+    """
+    timed = [r for r in results if r.get('timing')]
+    if not timed:
+        return None
+    df = pd.DataFrame({
+        'language': [r.get('language') or 'Unknown' for r in timed],
+        'device_count': [str(len(r['devices'])) for r in timed],
+        'wall_time': [r['timing']['wall_time'] for r in timed],
+        'queue_wait': [r['timing']['queue_wait'] for r in timed],
+        'tokens_per_second': [r['timing']['tokens_per_second'] for r in timed],
+    }).astype({'wall_time': float, 'queue_wait': float, 'tokens_per_second': float})
+    metrics = ['wall_time', 'queue_wait', 'tokens_per_second']
+    def describe(frame):
+        summary = {'count': len(frame)}
+        for metric in metrics:
+            values = frame[metric].dropna()
+            summary[metric] = {
+                f'p{p}': round(float(values.quantile(p / 100)), 4) for p in LATENCY_PERCENTILES
+            } if len(values) else None
+        return summary
     return {
-        'device': expected.get('device', ''),
-        'task_type': expected.get('execution_type', 'concurrent'),
-        'mode': expected.get('mode', ''),
-        'args': expected.get('args', {})
+        'overall': describe(df),
+        'by_language': {key: describe(group) for key, group in df.groupby('language')},
+        'by_device_count': {key: describe(group) for key, group in df.groupby('device_count')},
     }
 
-async def evaluate_query(evaluator, query: str, language:str, expected_devices: List[Dict]) -> Dict:
-    print(f"\n{'='*60}\nEvaluating Query: {query}\n{'='*60}")
-    agent_results = await evaluator._full_agent_workflow(query)
-    device_entries = []
-    device_scores = []
-    for expected in expected_devices:
-        predicted = find_predicted_device(expected, agent_results)
-        actual_fields = extract_actual_fields(expected)
-        predicted_fields = extract_predicted_fields(predicted)
-        score = device_score(expected, predicted)
-        device_entries.append({
-            'actual': actual_fields,
-            'predicted': predicted_fields,
-            'score': score
-        })
-        device_scores.append(score)
-    # Aggregate per-query scores
-    if device_scores:
-        query_device_score = sum(s['device_score'] for s in device_scores) / len(device_scores)
-        query_task_type_score = sum(s['task_type_score'] for s in device_scores) / len(device_scores)
-        query_mode_score = sum(s['mode_score'] for s in device_scores) / len(device_scores)
-        query_args_score = sum(s['args_score'] for s in device_scores) / len(device_scores)
-        query_weighted_total = sum(s['weighted_total'] for s in device_scores) / len(device_scores)
+def write_report(output_path: str, report: Dict):
+    # .arrow writes the columnar report, anything else the JSON layout (see utils/report_store.py)
+    save_report(output_path, report)
+
+def rescore_report(report_path: str, dry_run: bool = False) -> Dict:
+    """
+    Recompute every score of a stored report with the current scoring functions, in place.
+
+    Returns {'report', 'old_average', 'new_average'}.
+    """
+    report = load_report(report_path)
+    entries = [(stored_expected_devices(result), stored_agent_results(result)) for result in report['query_scores']]
+    if dry_run:
+        # Only the averages are needed, so skip building the per-device report entries
+        _, query_scores = score_frame(entries)
+        totals = query_scores['query_weighted_total'].tolist()
+        new_average = sum(totals) / len(totals) if totals else 0
     else:
-        query_device_score = query_task_type_score = query_mode_score = query_args_score = query_weighted_total = 1.0
-    print(f"{'-'*60}\nEvaluation Complete for Query\n{'-'*60}\n")
+        # All queries are scored in one columnar pass (see utils/scoring.py)
+        rescored = score_results(entries)
+        results = [{**result, **scores} for result, scores in zip(report['query_scores'], rescored)]
+        new_report = {**report, **summarise_results(results)}
+        write_report(report_path, new_report)
+        new_average = new_report['overall_average']
     return {
-        'query': query,
-        'language': language,
-        'devices': device_entries,
-        'query_score': {
-            'query_weighted_total': query_weighted_total,
-            'query_device_score': query_device_score,
-            'query_task_type_score': query_task_type_score,
-            'query_mode_score': query_mode_score,
-            'query_args_score': query_args_score
-        }
+        'report': report_path,
+        'old_average': report.get('overall_average'),
+        'new_average': new_average,
     }
 
-async def evaluate_csv(csv_path: str, output_path: str):
-    evaluator = SmartHomeEvaluator()
+def language_breakdown(results: List[Dict]) -> Dict:
+    """Average query scores per language and per script, detecting languages the CSV left blank."""
+    if not results:
+        return {'by_language': {}, 'by_script': {}}
+    df = pd.DataFrame({
+        'query': [r['query'] for r in results],
+        'language': [r.get('language') or None for r in results],
+        'score': [r['query_score']['query_weighted_total'] for r in results],
+    })
+    missing = df['language'].isna()
+    if missing.any():
+        df.loc[missing, 'language'] = detect_languages(df.loc[missing, 'query'])
+    df['script'] = detect_scripts(df['query'])
+    def summarise(column):
+        grouped = df.groupby(column)['score'].agg(['mean', 'count'])
+        return {
+            key: {'average': float(row['mean']), 'count': int(row['count'])}
+            for key, row in grouped.iterrows()
+        }
+    return {'by_language': summarise('language'), 'by_script': summarise('script')}
+
+def row_id(row: Dict) -> str:
+    """Stable id of a dataset row, independent of its position in the CSV."""
+    key = json.dumps([row['generated_query'], row['device_info'], row['language']], ensure_ascii=False)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+def load_rows(csv_path: str) -> List[Dict]:
+    """Read the dataset CSV into rows with a stable 'row_id' and parsed, lower-cased expected devices."""
     with open(csv_path, 'r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         rows = list(reader)
-    results = []
-    for idx, row in enumerate(rows):
-        print(f"\n{'#'*40}\nEvaluating Query {idx+1}/{len(rows)}\n{'#'*40}")
-        query = row['generated_query']
-        language = row['language']
+    seen = {}
+    for row in rows:
+        base_id = row_id(row)
+        # Identical rows get distinct ids in order of appearance
+        seen[base_id] = seen.get(base_id, 0) + 1
+        row['row_id'] = base_id if seen[base_id] == 1 else f"{base_id}-{seen[base_id]}"
         expected_devices = ast.literal_eval(row['device_info'])
         for device in expected_devices:
             if 'device' in device:
                 device['device'] = device['device'].lower()
-        evaluation = await evaluate_query(evaluator, query, language, expected_devices)
-        results.append(evaluation)
-    with open(output_path.replace('.csv', '.json'), 'w', encoding='utf-8') as f:
-        summary = {
-            'overall_average': sum(r['query_score']['query_weighted_total'] for r in results) / len(results) if results else 0,
-            'query_scores': results
+        row['expected_devices'] = expected_devices
+    return rows
+
+def run_fingerprint(evaluators: List[SmartHomeEvaluator], memo: bool, subset: Dict = None) -> Dict:
+    """
+    Everything besides the row itself that a checkpointed result depends on: the model, the
+    prompts and device list, the pipeline options and the coreset. Row ids only cover the
+    row's content, so a checkpoint is resumed only when its fingerprint matches.
+    """
+    evaluator = evaluators[0]
+    prompts = {
+        name: value for name, value in vars(agent_prompts).items() if isinstance(value, str) and not name.startswith('_')
+    }
+    def digest(value):
+        return hashlib.sha1(json.dumps(value, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+    return {
+        'provider': evaluator.provider,
+        'model': evaluator.model_name,
+        'prompts': digest(prompts),
+        'devices': digest(evaluator.agent.dict_devices),
+        'pipeline': evaluator.pipeline,
+        'skip_stages': sorted(evaluator.agent.skip_stages),
+        'subtask_memo': memo,
+        'subset': subset['coreset'] if subset else None,
+    }
+
+def load_checkpoint(checkpoint_path: str):
+    """
+    Read a JSONL checkpoint as (fingerprint, {row_id: result}); the fingerprint is its first
+    line (see run_fingerprint), None for a checkpoint written without one.
+
+    A line cut short by a killed process is dropped and truncated away, so later appends
+    start on a clean line.
+    """
+    if not os.path.exists(checkpoint_path):
+        return None, {}
+    with open(checkpoint_path, 'rb') as f:
+        data = f.read()
+    complete = data[:data.rfind(b'\n') + 1]
+    if len(complete) < len(data):
+        with open(checkpoint_path, 'r+b') as f:
+            f.truncate(len(complete))
+    fingerprint, done = None, {}
+    for line in complete.decode('utf-8').splitlines():
+        try:
+            entry = json.loads(line)
+            if 'fingerprint' in entry:
+                fingerprint = entry['fingerprint']
+                continue
+            done[entry['row_id']] = entry['result']
+        except (json.JSONDecodeError, KeyError, TypeError):
+            continue
+    return fingerprint, done
+
+def append_checkpoint(f, row: Dict, result: Dict):
+    """Append one finished row as a single line and flush it to disk before moving on."""
+    f.write(json.dumps({'row_id': row['row_id'], 'result': result}, ensure_ascii=False) + '\n')
+    f.flush()
+    os.fsync(f.fileno())
+
+async def evaluate_rows(evaluators, rows: List[Dict], concurrency: int = 4, on_result=None,
+                        shard_size: int = 8, should_stop=None) -> List[Dict]:
+    """
+    Evaluate rows with up to `concurrency` queries in flight per evaluator.
+
+    Pass one evaluator per inference endpoint to spread the dataset over them. Rows are split
+    into shards of `shard_size` that workers take from a shared queue; a worker that finds the
+    queue empty steals the unstarted back half of the fullest shard still in progress, so a
+    slow endpoint never holds up the end of the run.
+
+    Results come back in row order whatever order the queries finish in. If a query fails,
+    the remaining work is cancelled and the error is raised. `on_result(row, result)` is
+    called as each row finishes. Once `should_stop()` returns True no new row is started;
+    rows never started are None in the results.
+    """
+    if isinstance(evaluators, SmartHomeEvaluator):
+        evaluators = [evaluators]
+    results = [None] * len(rows)
+    queue = deque(deque(range(start, min(start + shard_size, len(rows)))) for start in range(0, len(rows), shard_size))
+    in_progress = {}
+    progress = tqdm(total=len(rows), desc="Evaluating", unit="query")
+
+    def take_shard(evaluator):
+        if queue:
+            evaluator.stats['shards'] += 1
+            return queue.popleft()
+        victim = max(in_progress.values(), key=len, default=None)
+        if not victim:
+            return None
+        stolen = deque(victim.pop() for _ in range((len(victim) + 1) // 2))
+        stolen.reverse()
+        evaluator.stats['stolen_rows'] += len(stolen)
+        return stolen
+
+    async def worker(evaluator):
+        while True:
+            shard = take_shard(evaluator)
+            if shard is None:
+                return
+            in_progress[id(shard)] = shard
+            try:
+                while shard:
+                    if should_stop is not None and should_stop():
+                        return
+                    idx = shard.popleft()
+                    row = rows[idx]
+                    if evaluator.stats['started'] is None:
+                        evaluator.stats['started'] = time.perf_counter()
+                    results[idx] = await evaluate_query(evaluator, row['generated_query'], row['language'], row['expected_devices'])
+                    evaluator.stats['rows'] += 1
+                    evaluator.stats['finished'] = time.perf_counter()
+                    if on_result:
+                        on_result(row, results[idx])
+                    progress.update(1)
+            finally:
+                del in_progress[id(shard)]
+
+    workers = [
+        asyncio.create_task(worker(evaluator))
+        for evaluator in evaluators for _ in range(max(1, min(concurrency, len(rows))))
+    ]
+    try:
+        await asyncio.gather(*workers)
+    except BaseException:
+        for task in workers:
+            task.cancel()
+        raise
+    finally:
+        progress.close()
+    return results
+
+async def evaluate_csv(csv_path: str, output_path: str, concurrency: int = 4, checkpoint_path: str = None,
+                       evaluator=None, rows: List[Dict] = None, shard_size: int = 8, memo: bool = True,
+                       sampling: Dict = None, subset: Dict = None, resume: bool = False):
+    """
+    Evaluate every row of a dataset CSV and write the JSON report.
+
+    Each finished row is appended to a JSONL checkpoint (default: '<report>.checkpoint.jsonl'),
+    which starts with the run's fingerprint and is deleted once the report is written. With
+    `resume`, the rows of a checkpoint left by an interrupted run are reused, provided its
+    fingerprint matches this run's; a checkpoint from a different model, prompt or options is
+    refused and nothing is evaluated. Without `resume`, a leftover checkpoint is moved aside to
+    '<checkpoint>.stale' and every row is evaluated afresh. Pass `rows` (from load_rows) to reuse a dataset already in memory
+    and `evaluator` to evaluate a model other than the default, or a list of evaluators (one
+    per endpoint) to shard the rows across them; the report then records each endpoint's
+    throughput under 'endpoints'.
+
+    With `memo`, repeated subtasks share one device-agent call (see SUBTASK_MEMO) and the report
+    records the hits under 'subtask_memo'; turn it off to measure raw latency. The report's
+    'pipeline' entry says how queries were run, how many LLM calls skipped stages saved and
+    whether the recorded latency is what users of server.py would see.
+
+    With `sampling` (options of make_sampler), rows are evaluated in stratified random order
+    until the confidence interval is narrow enough; the report then covers only those rows and
+    records the estimate under 'sampling'.
+
+    `subset` describes the coreset `rows` were restricted to (see load_subset); it is recorded
+    under 'subset'.
+    """
+    output_path = output_path.replace('.csv', '.json')
+    checkpoint_path = checkpoint_path or os.path.splitext(output_path)[0] + '.checkpoint.jsonl'
+    rows = rows if rows is not None else load_rows(csv_path)
+    evaluators = evaluator if isinstance(evaluator, list) else [evaluator or SmartHomeEvaluator()]
+    fingerprint = run_fingerprint(evaluators, memo, subset)
+    saved, done = load_checkpoint(checkpoint_path)
+    if saved is not None or done:
+        if not resume:
+            os.replace(checkpoint_path, checkpoint_path + '.stale')
+            print(f"Ignoring the checkpoint of an earlier run (moved to {checkpoint_path}.stale); "
+                  f"pass --resume to continue it")
+            saved, done = None, {}
+        elif saved != fingerprint:
+            changed = [key for key in fingerprint if (saved or {}).get(key) != fingerprint[key]]
+            print(f"Not resuming {checkpoint_path}: it was written by a run with a different {', '.join(changed)}. "
+                  f"Rerun without --resume to start over.")
+            return None
+    sampler = make_sampler(rows, **sampling) if sampling is not None else None
+    if sampler is not None:
+        position = {row['row_id']: idx for idx, row in enumerate(rows)}
+        rows = [rows[idx] for idx in sampler.order]
+        for row in rows:
+            if row['row_id'] in done:
+                sampler.add(position[row['row_id']], done[row['row_id']]['query_score']['query_weighted_total'])
+    todo = [row for row in rows if row['row_id'] not in done]
+    if done:
+        print(f"Resuming from {checkpoint_path}: {len(rows) - len(todo)}/{len(rows)} rows already evaluated")
+    subtask_memo = SUBTASK_MEMO() if memo else None
+    for e in evaluators:
+        e.memo = subtask_memo
+    ran = bool(todo) and not (sampler and sampler.should_stop())
+    if ran:
+        with open(checkpoint_path, 'a', encoding='utf-8') as checkpoint:
+            if saved is None:
+                checkpoint.write(json.dumps({'fingerprint': fingerprint}, ensure_ascii=False) + '\n')
+                checkpoint.flush()
+            def on_result(row, result):
+                append_checkpoint(checkpoint, row, result)
+                if sampler is not None:
+                    sampler.add(position[row['row_id']], result['query_score']['query_weighted_total'])
+            started = time.perf_counter()
+            new_results = await evaluate_rows(
+                evaluators, todo, concurrency, shard_size=shard_size, on_result=on_result,
+                should_stop=sampler.should_stop if sampler else None
+            )
+            run_seconds = time.perf_counter() - started
+        done.update((row['row_id'], result) for row, result in zip(todo, new_results) if result is not None)
+    if sampler is not None:
+        rows = [row for row in rows if row['row_id'] in done]
+    results = [done[row['row_id']] for row in rows]
+    report = summarise_results(results)
+    if subset is not None:
+        report['subset'] = subset
+    if sampler is not None:
+        report['sampling'] = sampler.summary()
+        estimate = report['sampling']['weighted_total']
+        print(f"Sampled {len(rows)}/{report['sampling']['rows_total']} rows, stopped: {report['sampling']['stopped']}; "
+              f"weighted_total {estimate['mean']:.4f} [{estimate['ci_low']:.4f}, {estimate['ci_high']:.4f}]")
+        if report['sampling'].get('difference_to_baseline'):
+            difference = report['sampling']['difference_to_baseline']
+            print(f"Difference to baseline {difference['mean']:+.4f} [{difference['ci_low']:+.4f}, {difference['ci_high']:+.4f}]")
+    if ran:
+        evaluated = [result for result in new_results if result is not None]
+        completion_tokens = sum(r['timing']['completion_tokens'] or 0 for r in evaluated)
+        report['throughput'] = {
+            'rows': len(evaluated),
+            'seconds': round(run_seconds, 3),
+            'queries_per_second': round(len(evaluated) / run_seconds, 3) if run_seconds > 0 else 0.0,
+            'completion_tokens_per_second': round(completion_tokens / run_seconds, 2) if run_seconds > 0 else 0.0,
         }
-        json.dump(summary, f, indent=2)
-    print(f"\nAll queries evaluated. Results written to {output_path}")
+        report['endpoints'] = {e.host or 'default': e.throughput() for e in evaluators}
+        report['subtask_memo'] = subtask_memo.metrics() if subtask_memo else {'enabled': False}
+        for host, throughput in report['endpoints'].items():
+            print(f"{host}: {throughput['rows']} rows in {throughput['seconds']}s "
+                  f"({throughput['queries_per_second']} queries/s, {throughput['stolen_rows']} stolen)")
+        if subtask_memo:
+            print(f"Subtask memo: {subtask_memo.hits} hits, {subtask_memo.misses} device agent calls")
+        report['pipeline'] = pipeline_summary(evaluators, evaluated, subtask_memo is not None)
+        print(f"Pipeline {report['pipeline']['mode']}: {report['pipeline']['llm_calls']} LLM calls, "
+              f"{report['pipeline']['llm_calls_saved']} saved by skipped stages")
+    write_report(output_path, report)
+    # The report holds every result now; a leftover checkpoint would only be mistaken for this run later
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    finished = "All queries evaluated." if sampler is None else "Sampling finished."
+    print(f"\n{finished} Results written to {output_path}")
+
+def pipeline_summary(evaluators: List[SmartHomeEvaluator], results: List[Dict], memo: bool) -> Dict:
+    """
+    How the run's queries were executed and what leaving stages out saved.
+
+    Latency is production-faithful only when queries went through the production pipeline
+    with every stage and no memoised device-agent responses.
+    """
+    mode = evaluators[0].pipeline
+    skipped = sorted(evaluators[0].agent.skip_stages)
+    saved = {stage: sum(e.agent.skipped_calls.get(stage, 0) for e in evaluators) for stage in skipped}
+    return {
+        'mode': mode,
+        'skipped_stages': skipped,
+        'llm_calls': sum(r['timing']['llm_calls'] for r in results),
+        'llm_calls_saved': sum(saved.values()),
+        'llm_calls_saved_by_stage': saved,
+        'latency_faithful': mode == "production" and not skipped and not memo,
+    }
+
+def make_sampler(rows: List[Dict], target_width: float = 0.05, confidence: float = 0.95, min_rows: int = 30,
+                 baseline: str = None, seed: int = 0, min_stratum: int = 10) -> SEQUENTIAL_SAMPLER:
+    """
+    Sequential sampler over dataset rows, stratified by language and number of expected devices.
+
+    Args:
+        target_width: Width of the weighted_total confidence interval (or of the difference to
+                      the baseline) at which evaluation stops.
+        confidence: Confidence level of the intervals.
+        min_rows: Rows evaluated before stopping is considered.
+        baseline: Report of the model to compare with; its rows are paired by query text.
+        seed: Seed of the stratified row order.
+        min_stratum: Rows a (language, device count) stratum needs before it is merged into a coarser one.
+    """
+    strata = collapse_strata([(row['language'], len(row['expected_devices'])) for row in rows], min_stratum)
+    baseline_scores = paired_scores(rows, load_report(baseline)) if baseline else None
+    return SEQUENTIAL_SAMPLER(strata, target_width, confidence, min_rows, baseline_scores, seed)
+
+def paired_scores(rows: List[Dict], report: Dict) -> List:
+    """A report's weighted_total per dataset row, paired by query text; None for rows it lacks."""
+    by_query = {}
+    for entry in report['query_scores']:
+        by_query.setdefault(entry['query'], []).append(entry['query_score']['query_weighted_total'])
+    # Identical queries pair up in order of appearance, as row ids do
+    return [by_query[row['generated_query']].pop(0) if by_query.get(row['generated_query']) else None for row in rows]
+
+def build_coreset(csv_path: str, reports: List[str], size: int = 40, seed: int = 0, restarts: int = 20,
+                  balance_weight: float = 1.0) -> Dict:
+    """
+    Pick `size` dataset rows whose stored scores track the full dataset's, for quick evaluations.
+
+    Rows are drawn per language in proportion to the dataset and chosen (see CORESET_SELECTOR)
+    so that every stored model's mean score, and the shares of scripts, device counts, task
+    types, devices and modes, stay as close as possible to the full dataset's. Reports that do
+    not cover every row are left out.
+
+    Returns:
+        The coreset: its row ids and queries, how well it reproduces the stored models' scores
+        and ranking, the same for a model left out of the selection, and the typical fit of a
+        plain stratified random subset.
+    """
+    rows = load_rows(csv_path)
+    models, columns = [], []
+    for path in reports:
+        scores = paired_scores(rows, load_report(path))
+        if None in scores:
+            print(f"Skipping {path}: it does not cover every row of {csv_path}")
+            continue
+        models.append(os.path.splitext(os.path.basename(path))[0][len('evaluation_report_'):])
+        columns.append(scores)
+    if not columns:
+        raise ValueError(f"No stored report covers every row of {csv_path}")
+    scores = list(zip(*columns))
+    strata = [row['language'] for row in rows]
+    features = row_features(rows)
+    chosen, _ = CORESET_SELECTOR(strata, features, scores, balance_weight).select(size, seed, restarts)
+    return {
+        'dataset': os.path.basename(csv_path),
+        'size': len(chosen),
+        'rows_total': len(rows),
+        'seed': seed,
+        'stratified_by': 'language',
+        'balanced_over': sorted(features),
+        'models': models,
+        'row_ids': [rows[idx]['row_id'] for idx in chosen],
+        'queries': [rows[idx]['generated_query'] for idx in chosen],
+        'fit': subset_fit(scores, chosen, models),
+        'held_out': held_out_fit(strata, features, scores, size, seed, restarts, balance_weight)
+        if len(models) > 2 else None,
+        'random_baseline': random_baseline(strata, scores, size, models, seed=seed),
+    }
+
+def compare_reports(baseline: str, candidates: List[str], alpha: float = 0.05, margin: float = 0.0,
+                    resamples: int = 10000, seed: int = 0, require_improvement: bool = False) -> Dict:
+    """
+    Paired comparison of candidate reports with a baseline report, with a pass/fail verdict.
+
+    Reports (.arrow or .json) are joined on query text; see PAIRED_COMPARISON for the tests and
+    the gate. The result names each report by its path.
+    """
+    comparison = PAIRED_COMPARISON(resamples, alpha, margin, seed)
+    verdict = comparison.compare(
+        load_report(baseline), [load_report(path) for path in candidates], candidates, require_improvement
+    )
+    return {'baseline': baseline, **verdict}
+
+def load_subset(path: str, rows: List[Dict]):
+    """
+    The rows of a coreset file (see build_coreset) and a description of it for the report.
+
+    Returns:
+        (rows, {'coreset', 'rows', 'rows_total'})
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        coreset = json.load(f)
+    wanted = set(coreset['row_ids'])
+    subset_rows = [row for row in rows if row['row_id'] in wanted]
+    if len(subset_rows) < len(wanted):
+        print(f"Warning: {len(wanted) - len(subset_rows)} row(s) of {path} are not in the dataset")
+    return subset_rows, {'coreset': os.path.basename(path), 'rows': len(subset_rows), 'rows_total': len(rows)}
+
+def report_path(output_dir: str, model_name: str, report_format: str = 'arrow', tag: str = None) -> str:
+    """
+    evaluation_report_<model>[.<tag>].<format>, with ':' in the model tag replaced as in dataset_and_results/.
+    """
+    name = model_name.replace(':', '_') + (f".{tag}" if tag else '')
+    return os.path.join(output_dir, f"evaluation_report_{name}.{report_format}")
+
+def parse_model_spec(spec: str, default_provider: str, default_concurrency: int) -> Dict:
+    """'[provider/]model[@concurrency]', e.g. 'qwen2.5:14b@8' or 'gemini/gemini-2.0-flash@2'."""
+    model, _, concurrency = spec.partition('@')
+    provider, _, model_name = model.rpartition('/')
+    return {
+        'provider': provider or default_provider,
+        'model_name': model_name,
+        'concurrency': int(concurrency) if concurrency else default_concurrency,
+    }
+
+async def evaluate_models(csv_path: str, models: List[Dict], output_dir: str = '.', hosts: List[str] = None,
+                          pull: bool = False, remove_after: bool = False, shard_size: int = 8, memo: bool = True,
+                          sampling: Dict = None, agent_options: Dict = None, report_format: str = 'arrow',
+                          subset: str = None, resume: bool = False):
+    """
+    Evaluate several models on one dataset, loaded once, writing one report per model.
+
+    Args:
+        models: Dicts with 'provider', 'model_name' and 'concurrency' (see parse_model_spec).
+        hosts: Ollama URLs for ollama models; with several, each model's rows are sharded across
+               them and 'concurrency' applies per host. None uses OLLAMA_HOST or the default.
+        pull / remove_after: Pull each Ollama model on every host before its run / delete it afterwards.
+        shard_size: Rows per shard handed to a host at a time.
+        memo: Reuse device-agent responses for repeated subtasks within each model's run.
+        sampling: Options of make_sampler to stop each model's run early; None evaluates every row.
+        agent_options: SmartHomeEvaluator options: pipeline, skip_stages and llm_concurrency.
+        report_format: 'arrow' (columnar, memory-mappable) or 'json'.
+        subset: Coreset file (see build_coreset) to evaluate only its rows; reports are then
+                named evaluation_report_<model>.<coreset>.<format>.
+        resume: Continue each model's interrupted run from its checkpoint (see evaluate_csv).
+    """
+    rows = load_rows(csv_path)
+    subset_info, tag = None, None
+    if subset:
+        rows, subset_info = load_subset(subset, rows)
+        tag = os.path.splitext(os.path.basename(subset))[0]
+        print(f"Evaluating the {len(rows)}-row subset {subset}")
+    hosts = hosts or [None]
+    clients = [AsyncClient(host=host) for host in hosts] if pull or remove_after else []
+    for model in models:
+        model_name = model['model_name']
+        is_ollama = model['provider'] == 'ollama'
+        model_hosts = hosts if is_ollama else [None]
+        print(f"\n========= Evaluating {model['provider']}/{model_name} "
+              f"({model['concurrency']} in flight x {len(model_hosts)} endpoint(s)) =========")
+        if pull and is_ollama:
+            await asyncio.gather(*(client.pull(model_name) for client in clients))
+        evaluators = [
+            SmartHomeEvaluator(provider=model['provider'], model_name=model_name, host=host, **(agent_options or {}))
+            for host in model_hosts
+        ]
+        await evaluate_csv(
+            csv_path, report_path(output_dir, model_name, report_format, tag), model['concurrency'], evaluator=evaluators, rows=rows,
+            shard_size=shard_size, memo=memo, sampling=sampling, subset=subset_info, resume=resume
+        )
+        if remove_after and is_ollama:
+            await asyncio.gather(*(client.delete(model_name) for client in clients))
+
+def parse_args(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["rescore"]:
+        parser = argparse.ArgumentParser(
+            prog="evaluator.py rescore", description="Recompute scores of stored reports without calling any LLM."
+        )
+        parser.add_argument("reports", nargs="+", help="evaluation_report_<model>.arrow or .json files, rewritten in place")
+        parser.add_argument("--dry-run", action="store_true", help="Print the new averages without writing")
+        args = parser.parse_args(argv[1:])
+        args.command = "rescore"
+        return args
+    if argv[:1] == ["convert"]:
+        parser = argparse.ArgumentParser(
+            prog="evaluator.py convert",
+            description="Convert JSON reports to the columnar .arrow format, or export .arrow reports as JSON."
+        )
+        parser.add_argument("reports", nargs="+", help="evaluation_report_<model>.json or .arrow files")
+        args = parser.parse_args(argv[1:])
+        args.command = "convert"
+        return args
+    if argv[:1] == ["compare"]:
+        parser = argparse.ArgumentParser(
+            prog="evaluator.py compare",
+            description="Paired significance tests of new reports against a baseline report; exits 1 unless all pass."
+        )
+        parser.add_argument("baseline", help="Report of the deployed model or prompt")
+        parser.add_argument("candidates", nargs="+", help="Reports to compare with it")
+        parser.add_argument("--alpha", type=float, default=0.05, help="Significance level")
+        parser.add_argument("--margin", type=float, default=0.0,
+                            help="Score differences smaller than this never count as a regression")
+        parser.add_argument("--resamples", type=int, default=10000, help="Bootstrap and permutation resamples")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the resamples")
+        parser.add_argument("--require-improvement", action="store_true",
+                            help="Also fail candidates that are not significantly better overall")
+        parser.add_argument("--output", default=None, help="Write the full comparison and verdict as JSON here")
+        args = parser.parse_args(argv[1:])
+        args.command = "compare"
+        return args
+    if argv[:1] == ["coreset"]:
+        parser = argparse.ArgumentParser(
+            prog="evaluator.py coreset",
+            description="Pick a small subset of the dataset whose stored scores track the full set, for --subset."
+        )
+        parser.add_argument("--csv", default="dataset_and_results/11_languages_200_points_dataset.csv", help="Dataset CSV")
+        parser.add_argument("--reports", nargs="+", default=None,
+                            help="Stored reports to fit to (default: every report in the CSV's directory)")
+        parser.add_argument("--size", type=int, default=40, help="Rows in the subset")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the random starts")
+        parser.add_argument("--restarts", type=int, default=20, help="Random starts of the local search")
+        parser.add_argument("--output", default=None, help="Coreset file (default: coreset_<size>.json next to the CSV)")
+        args = parser.parse_args(argv[1:])
+        args.command = "coreset"
+        return args
+
+    parser = argparse.ArgumentParser(
+        description="Evaluate one or more models on a HOMA dataset. Use 'evaluator.py rescore REPORT...' to rescore "
+                    "stored reports, 'evaluator.py convert REPORT...' to convert them between .json and .arrow and "
+                    "'evaluator.py coreset' to pick a subset for --subset. 'evaluator.py compare BASELINE REPORT...' "
+                    "tests new reports against a baseline."
+    )
+    parser.add_argument("--csv", default="dataset_and_results/11_languages_200_points_dataset.csv", help="Dataset CSV")
+    parser.add_argument("--models", nargs="+", default=["qwen2.5:32b"],
+                        help="Models as [provider/]model[@concurrency], e.g. phi4 qwen2.5:14b@8 gemini/gemini-2.0-flash@2")
+    parser.add_argument("--provider", default="ollama", help="Provider for models given without one")
+    parser.add_argument("--concurrency", type=int, default=4, help="Queries in flight for models given without @N")
+    parser.add_argument("--output-dir", default=".", help="Where evaluation_report_<model> files are written")
+    parser.add_argument("--report-format", choices=["arrow", "json"], default="arrow",
+                        help="arrow: columnar, memory-mappable report; json: the previous layout")
+    parser.add_argument("--ollama-host", nargs="+", default=None,
+                        help="Ollama URL(s); with several, each model's rows are sharded across them")
+    parser.add_argument("--shard-size", type=int, default=8, help="Rows handed to an endpoint at a time")
+    parser.add_argument("--no-subtask-memo", dest="subtask_memo", action="store_false",
+                        help="Call the device agent for every subtask, e.g. to measure raw latency")
+    parser.add_argument("--subset", default=None,
+                        help="Coreset file from 'evaluator.py coreset': evaluate only its rows, for quick comparisons")
+    parser.add_argument("--pipeline", choices=PIPELINES, default="production",
+                        help="production: serve queries as server.py does; serial: one device agent at a time")
+    parser.add_argument("--skip-unscored", action="store_true",
+                        help=f"Leave out stages that are not scored ({', '.join(UNSCORED_STAGES)}); latency is then not production-faithful")
+    parser.add_argument("--llm-concurrency", type=int, default=4,
+                        help="With --pipeline production: LLM calls in flight per endpoint, as in server.py")
+    parser.add_argument("--sample", action="store_true",
+                        help="Evaluate rows in stratified random order and stop once the estimate is precise enough")
+    parser.add_argument("--ci-width", type=float, default=0.05, help="With --sample: confidence interval width to stop at")
+    parser.add_argument("--confidence", type=float, default=0.95, help="With --sample: confidence level")
+    parser.add_argument("--min-rows", type=int, default=30, help="With --sample: rows evaluated before stopping")
+    parser.add_argument("--baseline", default=None,
+                        help="With --sample: report to compare with; stops once the difference is clear")
+    parser.add_argument("--seed", type=int, default=0, help="With --sample: seed of the row order")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue interrupted runs from their checkpoints (only if model, prompts and options match)")
+    parser.add_argument("--pull", action="store_true", help="ollama pull each model before evaluating it")
+    parser.add_argument("--remove-after", action="store_true", help="ollama rm each model after evaluating it")
+    args = parser.parse_args(argv)
+    args.command = "evaluate"
+    return args
 
 async def main():
-    await evaluate_csv('11_languages_200_points_dataset.csv', 'evaluation_report_qwen2.5:32b.json')
+    args = parse_args()
+    if args.command == "rescore":
+        for report in args.reports:
+            outcome = rescore_report(report, args.dry_run)
+            print(f"{outcome['report']}: overall_average {outcome['old_average']} -> {outcome['new_average']}")
+        return
+    if args.command == "convert":
+        for report in args.reports:
+            print(f"{report} -> {convert_report(report)}")
+        return
+    if args.command == "compare":
+        verdict = compare_reports(
+            args.baseline, args.candidates, args.alpha, args.margin, args.resamples, args.seed, args.require_improvement
+        )
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(verdict, f, indent=2, ensure_ascii=False)
+        for comparison in verdict['comparisons']:
+            line = f"{comparison['verdict'].upper()} {comparison['candidate']}"
+            if 'overall' in comparison:
+                overall = comparison['overall']['query_weighted_total']
+                line += (f": weighted_total {overall['difference']:+.4f} [{overall['ci_low']:+.4f}, "
+                         f"{overall['ci_high']:+.4f}], p={overall['p_value']} over {comparison['paired_queries']} queries")
+            print(line)
+            for reason in comparison['reasons']:
+                print(f"  {reason}")
+        sys.exit(0 if verdict['verdict'] == 'pass' else 1)
+    if args.command == "coreset":
+        directory = os.path.dirname(args.csv)
+        coreset = build_coreset(
+            args.csv, args.reports or report_paths(directory or '.'), args.size, args.seed, args.restarts
+        )
+        output = args.output or os.path.join(directory, f"coreset_{args.size}.json")
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(coreset, f, indent=2, ensure_ascii=False)
+        fit, baseline = coreset['fit'], coreset['random_baseline']
+        print(f"{output}: {coreset['size']}/{coreset['rows_total']} rows fitted to {len(coreset['models'])} models; "
+              f"Kendall tau {fit['kendall_tau']}, max error {fit['max_abs_error']} "
+              f"(random subsets: {baseline['median_kendall_tau']}, {baseline['median_max_abs_error']})")
+        if coreset['held_out']:
+            held_out = coreset['held_out']
+            print(f"Model left out of the fit: mean error {held_out['mean_abs_error']}, "
+                  f"pairs ordered correctly {held_out['pair_agreement']:.0%}")
+        return
+    models = [parse_model_spec(spec, args.provider, args.concurrency) for spec in args.models]
+    sampling = {
+        'target_width': args.ci_width, 'confidence': args.confidence, 'min_rows': args.min_rows,
+        'baseline': args.baseline, 'seed': args.seed,
+    } if args.sample else None
+    agent_options = {
+        'pipeline': args.pipeline,
+        'skip_stages': UNSCORED_STAGES if args.skip_unscored else (),
+        'llm_concurrency': args.llm_concurrency,
+    }
+    await evaluate_models(
+        args.csv, models, args.output_dir, args.ollama_host, args.pull, args.remove_after, args.shard_size,
+        args.subtask_memo, sampling, agent_options, args.report_format, args.subset, args.resume
+    )
 
 if __name__ == "__main__":
+    setup_logging()
     asyncio.run(main())
\ No newline at end of file
@@ -1,17 +1,44 @@
 import asyncio
+import contextvars
 import json
+import os
 import time
 import logging
 import utils.agent_prompts as agent_prompts
 from utils.utils import UTILS
+from utils.language_detector import detect_language
+from utils.logging_pipeline import setup_logging
+from utils.device_predictor import DEVICE_PREDICTOR
+from utils.devices import COALESCING_DISPATCHER, DEVICE_STATE_STORE, SIMULATED_ACTUATOR, extract_device_command
+from utils.scheduler import DeadlineExceeded, current_home_id, set_command_context, time_remaining
+from utils.session_context import SESSION_STORE
+from utils.tracing import configure_tracing, span
+
+# Speculative device-agent calls started by task_by_user, resolved by run_command of the same command
+current_speculation = contextvars.ContextVar("current_speculation", default=None)
+# Role ("classification", "device_agent", "completion") of the LLM call being made, for wrappers of UTILS.chat
+current_llm_role = contextvars.ContextVar("current_llm_role", default="llm")
 
 
 class ASYNC_HOME_AGENT:
-    def __init__(self, max_retries=3, backoff_factor=2, max_concurrency=4):
+    def __init__(self, max_retries=3, backoff_factor=2, max_concurrency=4, utils_obj=None, dispatcher=None,
+                 sessions=None, command_timeout=None, call_timeout=None, speculate=False, skip_stages=None):
         # Configuration
         self.max_retries = max_retries
         self.backoff_factor = backoff_factor
         self.max_concurrency = max_concurrency
+        # Seconds an interactive command may take end to end; server commands carry their own deadline
+        self.command_timeout = command_timeout
+        # Seconds a single LLM attempt may take before it is cancelled and retried
+        self.call_timeout = call_timeout
+        
+        # Per-role LLM step counts and how many of them ran into the command deadline
+        self.deadline_stats = {}
+        
+        # Pipeline stages left out, e.g. {"completion"} when only the device commands matter
+        # (evaluation), and how many LLM calls that saved per stage
+        self.skip_stages = set(skip_stages or ())
+        self.skipped_calls = {}
         
         # Device mapping
         self.dict_devices = {
@@ -27,33 +54,152 @@ class ASYNC_HOME_AGENT:
         
         # Setup logging
         self.logger = logging.getLogger(__name__)
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
         
         # Initialize utilities
-        self.utils_obj = UTILS()
+        self.utils_obj = utils_obj or UTILS()
+        
+        # Device actuation; None keeps device-agent output log-only
+        self.dispatcher = dispatcher
+        
+        # Per-home conversational context (SESSION_STORE); None classifies every command from scratch
+        self.sessions = sessions
+        
+        # Speculative execution: start device agents for locally predicted devices during classification
+        self.predictor = DEVICE_PREDICTOR(self.dict_devices) if speculate else None
+        self.speculation_stats = {
+            "commands": 0, "skipped": 0, "hits": 0, "misses": 0, "cancelled_calls": 0, "latency_saved": 0.0
+        }
+
+    def create_simulated_dispatcher(self, latency=0.05, window=0.1, max_homes=10000):
+        """Attach an in-memory device simulator so commands are actuated and timed."""
+        store = DEVICE_STATE_STORE(self.dict_devices, max_homes)
+        self.dispatcher = COALESCING_DISPATCHER(SIMULATED_ACTUATOR(store, latency), store=store, window=window)
+        return self.dispatcher
+
+    def start_speculation(self, user_query):
+        """Start device-agent calls on the raw query for the devices the local predictor guesses."""
+        if self.predictor is None:
+            return
+        self.speculation_stats["commands"] += 1
+        predicted = self.predictor.predict(user_query)
+        if predicted is None:
+            self.speculation_stats["skipped"] += 1
+            return
+        speculation = {"started_at": time.time(), "tasks": {}, "finished_at": {}}
+        for device_name, device in predicted.items():
+            task = asyncio.create_task(self.get_agent_response(
+                user_query, {"device": device, "device_name": device_name, "Input": user_query}
+            ))
+            task.add_done_callback(lambda _, name=device_name: speculation["finished_at"].__setitem__(name, time.time()))
+            speculation["tasks"][device_name] = task
+        self.logger.info(f"Speculatively started device agents for {sorted(predicted)}")
+        current_speculation.set(speculation)
 
-    async def retry_with_backoff(self, coroutine_func, *args, **kwargs):
-        """Execute a coroutine with exponential backoff retry logic."""
+    def cancel_speculation(self, speculation):
+        if not speculation:
+            return
+        for task in speculation["tasks"].values():
+            if not task.done():
+                task.cancel()
+                self.speculation_stats["cancelled_calls"] += 1
+
+    def resolve_speculation(self, tasks):
+        """
+        Commit the command's speculative calls when the classifier picked exactly the predicted
+        devices; otherwise cancel them. Returns (speculation or None, "hit"/"miss"/None).
+        """
+        speculation = current_speculation.get()
+        current_speculation.set(None)
+        if not speculation:
+            return None, None
+        device_names = [task_data.get("device_name") for task_data in tasks]
+        if len(device_names) == len(set(device_names)) and set(device_names) == set(speculation["tasks"]):
+            self.speculation_stats["hits"] += 1
+            speculation["committed_at"] = time.time()
+            return speculation, "hit"
+        self.speculation_stats["misses"] += 1
+        self.logger.info(f"Speculation missed: predicted {sorted(speculation['tasks'])}, classified {device_names}")
+        self.cancel_speculation(speculation)
+        return None, "miss"
+
+    def speculation_metrics(self):
+        """Speculation hit rate and the classification latency hidden by committed speculation."""
+        stats = self.speculation_stats
+        attempted = stats["hits"] + stats["misses"]
+        return {
+            **stats,
+            "hit_rate": stats["hits"] / attempted if attempted else 0.0,
+            "avg_latency_saved": stats["latency_saved"] / stats["hits"] if stats["hits"] else 0.0,
+        }
+
+    def record_deadline(self, role, missed):
+        stats = self.deadline_stats.setdefault(role, {"calls": 0, "missed": 0})
+        stats["calls"] += 1
+        stats["missed"] += int(missed)
+
+    def deadline_metrics(self):
+        """Deadline-miss rate of each LLM role (classification, device_agent, completion)."""
+        return {
+            role: {**stats, "miss_rate": stats["missed"] / stats["calls"] if stats["calls"] else 0.0}
+            for role, stats in self.deadline_stats.items()
+        }
+
+    async def retry_with_backoff(self, coroutine_func, *args, role="llm", **kwargs):
+        """
+        Execute a coroutine with exponential backoff retry logic, bounded by the command deadline.
+
+        Each attempt is cancelled when the deadline (or call_timeout) passes, and no backoff sleep
+        runs past the deadline. Raises DeadlineExceeded once the deadline is reached.
+        """
         retries = 0
         last_exception = None
         
         while retries <= self.max_retries:
+            remaining = time_remaining()
+            if remaining is not None and remaining <= 0:
+                self.record_deadline(role, missed=True)
+                raise DeadlineExceeded(f"Deadline passed before {role} attempt {retries + 1}")
+            timeouts = [t for t in (remaining, self.call_timeout) if t is not None]
             try:
-                return await coroutine_func(*args, **kwargs)
+                coroutine = coroutine_func(*args, **kwargs)
+                role_token = current_llm_role.set(role)
+                try:
+                    with span("llm.attempt", role=role, attempt=retries + 1):
+                        result = await (asyncio.wait_for(coroutine, min(timeouts)) if timeouts else coroutine)
+                finally:
+                    current_llm_role.reset(role_token)
+                remaining = time_remaining()
+                if result is None and remaining is not None and remaining <= 0:
+                    # The scheduler sheds calls whose command has expired
+                    self.record_deadline(role, missed=True)
+                    raise DeadlineExceeded(f"Deadline passed during {role} call")
+                self.record_deadline(role, missed=False)
+                return result
+            except DeadlineExceeded:
+                raise
             except Exception as e:
+                remaining = time_remaining()
+                if remaining is not None and remaining <= 0:
+                    self.record_deadline(role, missed=True)
+                    raise DeadlineExceeded(f"Deadline passed during {role} call") from e
+                if isinstance(e, asyncio.TimeoutError):
+                    e = TimeoutError(f"{role} call exceeded {self.call_timeout} seconds")
                 last_exception = e
                 wait_time = self.backoff_factor ** retries
                 retries += 1
                 
+                if retries <= self.max_retries and remaining is not None and wait_time >= remaining:
+                    self.record_deadline(role, missed=True)
+                    raise DeadlineExceeded(
+                        f"Retry {retries} of {role} call would start after the deadline. Last error: {str(e)}"
+                    ) from e
                 if retries <= self.max_retries:
                     self.logger.warning(
                         f"Attempt {retries} failed with error: {str(e)}. "
                         f"Retrying in {wait_time} seconds..."
                     )
-                    await asyncio.sleep(wait_time)
+                    with span("backoff.sleep", role=role, seconds=wait_time):
+                        await asyncio.sleep(wait_time)
                 else:
                     self.logger.error(
                         f"All {self.max_retries} retry attempts failed. "
@@ -61,37 +207,49 @@ class ASYNC_HOME_AGENT:
                     )
         
         # If we've exhausted all retries, raise the last exception
+        self.record_deadline(role, missed=False)
         raise last_exception
 
-    async def task_by_user(self, eval=False, user_query=None):
-        """Process user input and classify the task."""
+    async def task_by_user(self, user_query):
+        """Classify a user query; the one place the Language:/Context: prompt is built."""
         try:
-            if not eval:
-                user_query = input()
-            if user_query.strip().lower() == "/bye":
-                return user_query, "STOP", time.time()
-            
             system_message = self.utils_obj.create_message(
                 "system", agent_prompts.CLASSIFICATION_PROMPT
             )
             
+            # Route the query's language to the classifier so it can translate subtasks
+            # without first guessing the script.
+            language = detect_language(user_query)
+            context = self.sessions.render(current_home_id()) if self.sessions else ""
             user_query_formatted = (
                 f"Input: {user_query}\n"
-                f"List of Available Devices: {self.dict_devices}\n"
+                f"Language: {language}\n"
+                + (f"Context: {context}\n" if context else "")
+                + f"List of Available Devices: {self.dict_devices}\n"
                 f"Output: "
             )
             
             user_message = self.utils_obj.create_message("user", user_query_formatted)
             start_time = time.time()
+            self.start_speculation(user_query)
             
             try:
-                classification_response = await self.retry_with_backoff(
-                    self.utils_obj.chat, [system_message, user_message]
+                with span("classification", language=language, has_context=bool(context)):
+                    classification_response = await self.retry_with_backoff(
+                        self.utils_obj.chat, [system_message, user_message], role="classification"
+                    )
+                self.logger.info(
+                    "Classification response received",
+                    extra={"role": "classification", "payload": classification_response.message.content}
                 )
-                self.logger.info(f"Classification response: {classification_response.message.content}")
                 return user_query, classification_response, start_time
+            except DeadlineExceeded as e:
+                self.logger.error(f"Classification missed the command deadline: {str(e)}")
+                self.resolve_speculation([])
+                return user_query, "TIMEOUT", start_time
             except Exception as e:
                 self.logger.error(f"Classification failed after retries: {str(e)}")
+                self.resolve_speculation([])
                 return user_query, "ERROR", start_time
                 
         except Exception as e:
@@ -128,7 +286,7 @@ class ASYNC_HOME_AGENT:
                         return {"device": "", "function": "", "args": {}}
             except json.JSONDecodeError as e:
                 self.logger.error(f"Failed to parse JSON after cleaning: {str(e)}")
-                self.logger.debug(f"Raw response: {response_text}")
+                self.logger.debug("Raw response", extra={"payload": response_text})
                 # Instead of raising an exception, return a default structure
                 return {"device": "", "function": "", "args": {}}
             except Exception as e:
@@ -153,11 +311,15 @@ class ASYNC_HOME_AGENT:
                 "user", f"Input: {decomposed_query}\nDevice Name: {device_name}\nOutput: "
             )
             
-            self.logger.info(f"Sending query to {device_name} agent: {decomposed_query}")
-            
-            agent_response = await self.retry_with_backoff(
-                self.utils_obj.chat, [system_message, user_message]
+            self.logger.info(
+                f"Sending query to {device_name} agent",
+                extra={"role": "device_agent", "device_name": device_name, "payload": decomposed_query}
             )
+            
+            with span("device_agent", device=device, device_name=device_name):
+                agent_response = await self.retry_with_backoff(
+                    self.utils_obj.chat, [system_message, user_message], role="device_agent"
+                )
 
             if agent_response is None:
                 self.logger.error(f"Agent chat failed for {device_name} after retries.")
@@ -165,30 +327,48 @@ class ASYNC_HOME_AGENT:
             
             self.logger.info(f"Response from {device_name} agent received")
             if agent_response.get('message') and agent_response['message'].get('content'):
-                self.logger.debug(f"Response content: {agent_response['message']['content']}")
+                self.logger.debug(
+                    "Response content",
+                    extra={"role": "device_agent", "device_name": device_name, "payload": agent_response['message']['content']}
+                )
             else:
                 self.logger.warning(f"Agent response for {device_name} missing expected message content.")
                 return None
 
+            if "completion" in self.skip_stages:
+                self.skipped_calls["completion"] = self.skipped_calls.get("completion", 0) + 1
+                return agent_response
+
             completion_prompt = agent_prompts.COMPLETION_PROMPT.format(
                 orignal_Input=user_query, task=decomposed_query
             )
             
-            completion_response = await self.retry_with_backoff(
-                self.utils_obj.chat,
-                [self.utils_obj.create_message("user", completion_prompt)]
-            )
+            try:
+                with span("completion", device=device, device_name=device_name):
+                    completion_response = await self.retry_with_backoff(
+                        self.utils_obj.chat,
+                        [self.utils_obj.create_message("user", completion_prompt)],
+                        role="completion"
+                    )
+            except DeadlineExceeded:
+                # The device command is already known; only the confirmation is lost
+                self.logger.warning(f"Completion for {device_name} skipped: command deadline passed")
+                return agent_response
 
             if completion_response is None or not completion_response.get('message') or not completion_response['message'].get('content'):
                 self.logger.error(f"Completion chat failed or returned invalid response for {device_name} after retries.")
                 return agent_response
 
             self.logger.info(
-                f"Task completion for {device_name}: {completion_response['message']['content']}"
+                f"Task completion for {device_name}",
+                extra={"role": "completion", "device_name": device_name,
+                       "payload": completion_response['message']['content']}
             )
             
             return agent_response
             
+        except DeadlineExceeded:
+            raise
         except KeyError as e:
             self.logger.error(f"KeyError in get_agent_response for {device_name}: Missing key {e}")
             return None
@@ -196,73 +376,225 @@ class ASYNC_HOME_AGENT:
             self.logger.error(f"Unexpected error in get_agent_response for {device_name}: {str(e)}", exc_info=True)
             return None
 
-    async def execute_tasks(self, tasks, user_query, semaphore=None):
-        """Execute a list of tasks, either concurrently or sequentially."""
-        results = []
+    async def actuate(self, task_data, command):
+        """Send a device command to the dispatcher and wait for it to be actuated."""
+        device_name = task_data.get('device_name', 'Unknown Device in Task')
+        actuation = await self.dispatcher.dispatch(device_name, command)
+        self.logger.info(
+            f"Actuated {device_name}: {actuation['sent']} in {actuation['latency']:.2f} seconds "
+            f"({actuation['coalesced']} coalesced)"
+        )
+        return actuation
+
+    async def execute_tasks(self, tasks, user_query, semaphore=None, progress=None, actuations=None, outcomes=None,
+                            speculative=None):
+        """
+        Execute a list of tasks, either concurrently (when given a semaphore) or sequentially.
+
+        Tasks whose device has a committed speculative call in `speculative` (device name -> asyncio
+        task) await that call instead of querying the device agent again.
+
+        When given an `outcomes` list, appends {"device_name", "status"} per task, where status is
+        "actuated", "responded", "no_command", "failed" or "timed_out".
+        """
         
-        for task_data in tasks:
+        async def run_task(task_data):
+            task_device_name = task_data.get('device_name', 'Unknown Device in Task')
+            actuation = None
+            status = "failed"
             try:
-                if semaphore:
+                if speculative and task_device_name in speculative:
+                    result = await speculative.pop(task_device_name)
+                elif semaphore:
                     async with semaphore:
                         result = await self.get_agent_response(user_query, task_data)
                 else:
                     result = await self.get_agent_response(user_query, task_data)
                 
-                results.append(result)
-                
                 if result is None:
-                    task_device_name = task_data.get('device_name', 'Unknown Device in Task')
                     self.logger.warning(f"Task for {task_device_name} failed completely")
+                elif self.dispatcher or self.sessions:
+                    parsed = await self.parse_json_response(self.response_content(result))
+                    command = extract_device_command(parsed)
+                    status = "responded"
+                    if command is None:
+                        self.logger.warning(f"No device command found in response for {task_device_name}")
+                        status = "no_command"
+                    else:
+                        if self.sessions:
+                            self.sessions.get(current_home_id()).record(
+                                task_device_name, task_data.get('device'), command, task_data.get('Input')
+                            )
+                        remaining = time_remaining()
+                        if self.dispatcher and remaining is not None and remaining <= 0:
+                            # Too late to act on: the caller has already been told the command timed out
+                            self.logger.warning(f"Not actuating {task_device_name}: command deadline passed")
+                            status = "timed_out"
+                        elif self.dispatcher:
+                            actuation = await self.actuate(task_data, command)
+                            status = "actuated" if actuation.get("error") is None else "failed"
+                else:
+                    status = "responded"
                     
+            except DeadlineExceeded as e:
+                self.logger.warning(f"Task for {task_device_name} missed the command deadline: {str(e)}")
+                result = None
+                status = "timed_out"
             except Exception as e:
-                task_device_name = task_data.get('device_name', 'Unknown Device in Task')
                 self.logger.error(f"Task execution error for {task_device_name}: {str(e)}")
-                results.append(None)
-                
-        return results
+                result = None
+
+            if actuations is not None and actuation is not None:
+                actuations.append(actuation)
+            if outcomes is not None:
+                outcomes.append({"device_name": task_device_name, "status": status})
+            if progress:
+                await progress("device_result", {
+                    "device_name": task_device_name,
+                    "task": task_data.get("Input"),
+                    "response": self.response_content(result),
+                    "status": status,
+                    "actuation": actuation,
+                })
+            return result
+        
+        if semaphore:
+            return list(await asyncio.gather(*(run_task(task_data) for task_data in tasks)))
+        return [await run_task(task_data) for task_data in tasks]
+
+    @staticmethod
+    def response_content(response):
+        """Return the message content of an LLM response object or dict, or None."""
+        if response is None:
+            return None
+        try:
+            return response['message']['content']
+        except (KeyError, TypeError):
+            return getattr(getattr(response, 'message', None), 'content', None)
+
+    async def run_command(self, user_query, task_to_perform, start_time, progress=None):
+        """
+        Execute a classified command and summarise the outcome.
+
+        Args:
+            user_query (str): The original user command.
+            task_to_perform: The classification response returned by task_by_user.
+            start_time (float): When classification started, used for the total timing.
+            progress (callable, optional): Async callback awaited as progress(event, payload)
+                after classification and after every device task.
+
+        Returns:
+            A dict with a "status" of "ok", "timeout" or "error" and a user-facing "message".
+            Unless classification failed, it also holds the concurrent/sequential device
+            responses, a per-device "devices" outcome list and the elapsed time; on "timeout"
+            these are the partial results reached before the deadline.
+        """
+        if task_to_perform in ("TIMEOUT", "ERROR"):
+            self.resolve_speculation([])
+        if task_to_perform == "TIMEOUT":
+            return {"status": "timeout", "message": "Sorry, that took too long. Nothing was changed.", "devices": []}
+        if task_to_perform == "ERROR":
+            self.logger.error("Could not classify the user query, please try again")
+            return {"status": "error", "message": "Sorry, I couldn't understand your request. Please try again."}
+        
+        try:
+            if isinstance(task_to_perform.message.content, str):
+                task_content = task_to_perform.message.content
+                task_to_perform = await self.parse_json_response(task_content)
+            else:
+                self.logger.error("Unexpected response format from classification")
+                self.resolve_speculation([])
+                return {"status": "error", "message": "Sorry, there was an issue processing your request. Please try again."}
+        except Exception as e:
+            self.logger.error(f"Failed to parse classification response: {str(e)}")
+            self.resolve_speculation([])
+            return {"status": "error", "message": "Sorry, there was an issue processing your request. Please try again."}
+        
+        concurrent_tasks = task_to_perform.get("tasks", {}).get("concurrent", [])
+        sequential_tasks = task_to_perform.get("tasks", {}).get("sequential", [])
+        speculation, speculation_outcome = self.resolve_speculation(concurrent_tasks + sequential_tasks)
+        speculative = dict(speculation["tasks"]) if speculation else None
+        if progress:
+            await progress("classified", {
+                "concurrent": concurrent_tasks, "sequential": sequential_tasks, "speculation": speculation_outcome
+            })
+        
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        concurrent_results = []
+        sequential_results = []
+        actuations = []
+        outcomes = []
+        
+        if concurrent_tasks:
+            self.logger.info(f"Executing {len(concurrent_tasks)} concurrent tasks")
+            concurrent_results = await self.execute_tasks(
+                concurrent_tasks, user_query, semaphore, progress, actuations, outcomes, speculative
+            )
+        
+        if sequential_tasks:
+            self.logger.info(f"Executing {len(sequential_tasks)} sequential tasks")
+            sequential_results = await self.execute_tasks(
+                sequential_tasks, user_query, progress=progress, actuations=actuations, outcomes=outcomes,
+                speculative=speculative
+            )
+        
+        if speculation:
+            # Device calls would otherwise have started at commit time; count the overlap with classification
+            speculative_time = max(speculation["finished_at"].values(), default=speculation["committed_at"])
+            self.speculation_stats["latency_saved"] += max(0.0, min(
+                speculation["committed_at"], speculative_time
+            ) - speculation["started_at"])
+        
+        # Includes device actuation when a dispatcher is attached
+        elapsed_time = time.time() - start_time
+        actuation_time = sum(a["latency"] for a in actuations)
+        self.logger.info(
+            f"Total execution time: {elapsed_time:.2f} seconds (actuation: {actuation_time:.2f} seconds)"
+        )
+        timed_out = [o["device_name"] for o in outcomes if o["status"] == "timed_out"]
+        if timed_out:
+            done = [o["device_name"] for o in outcomes if o["status"] == "actuated"]
+            message = f"Timed out before finishing {', '.join(timed_out)}." + (
+                f" Completed: {', '.join(done)}." if done else ""
+            )
+        return {
+            "status": "timeout" if timed_out else "ok",
+            "message": message if timed_out else "Done",
+            "devices": outcomes,
+            "speculation": speculation_outcome,
+            "concurrent": [self.response_content(r) for r in concurrent_results],
+            "sequential": [self.response_content(r) for r in sequential_results],
+            "actuations": actuations,
+            "actuation_time": actuation_time,
+            "elapsed": elapsed_time,
+        }
+
+    async def serve_command(self, user_query, progress=None):
+        """Classify and run one command; traced as a single "command" span. Returns run_command's result."""
+        with span("command", home_id=current_home_id(), query_chars=len(user_query)) as command_span:
+            user_query, task_to_perform, start_time = await self.task_by_user(user_query)
+            outcome = await self.run_command(user_query, task_to_perform, start_time, progress)
+            command_span.set_attributes({
+                "status": outcome["status"],
+                "devices": len(outcome.get("devices", [])),
+                "speculation": outcome.get("speculation"),
+            })
+            return outcome
 
     async def orchestrator(self):
         """Main orchestration loop for processing user commands."""
         while True:
             try:
-                user_query, task_to_perform, start_time = await self.task_by_user()
-                
-                if task_to_perform == "STOP":
+                user_query = input()
+                if user_query.strip().lower() == "/bye":
                     self.logger.info("Received exit command, shutting down")
                     break
-                    
-                if task_to_perform == "ERROR":
-                    self.logger.error("Could not classify the user query, please try again")
-                    print("Sorry, I couldn't understand your request. Please try again.")
-                    continue
-                
-                try:
-                    if isinstance(task_to_perform.message.content, str):
-                        task_content = task_to_perform.message.content
-                        task_to_perform = await self.parse_json_response(task_content)
-                    else:
-                        self.logger.error("Unexpected response format from classification")
-                        continue
-                except Exception as e:
-                    self.logger.error(f"Failed to parse classification response: {str(e)}")
-                    print("Sorry, there was an issue processing your request. Please try again.")
-                    continue
-                
-                concurrent_tasks = task_to_perform.get("tasks", {}).get("concurrent", [])
-                sequential_tasks = task_to_perform.get("tasks", {}).get("sequential", [])
-                
-                semaphore = asyncio.Semaphore(self.max_concurrency)
-                
-                if concurrent_tasks:
-                    self.logger.info(f"Executing {len(concurrent_tasks)} concurrent tasks")
-                    await self.execute_tasks(concurrent_tasks, user_query, semaphore)
-                
-                if sequential_tasks:
-                    self.logger.info(f"Executing {len(sequential_tasks)} sequential tasks")
-                    await self.execute_tasks(sequential_tasks, user_query)
+                if self.command_timeout:
+                    set_command_context(current_home_id(), time.time() + self.command_timeout)
                 
-                elapsed_time = time.time() - start_time
-                self.logger.info(f"Total execution time: {elapsed_time:.2f} seconds")
+                outcome = await self.serve_command(user_query)
+                if outcome["status"] != "ok":
+                    print(outcome["message"])
                 
             except Exception as e:
                 self.logger.error(f"Error in orchestrator: {str(e)}")
@@ -270,5 +602,9 @@ class ASYNC_HOME_AGENT:
 
 
 if __name__ == "__main__":
-    agent_obj = ASYNC_HOME_AGENT()
+    # HOMA_TRACE_FILE=traces.jsonl records a span per stage of every command
+    setup_logging()
+    configure_tracing(path=os.getenv("HOMA_TRACE_FILE"))
+    agent_obj = ASYNC_HOME_AGENT(sessions=SESSION_STORE(), command_timeout=30)
+    agent_obj.create_simulated_dispatcher()
     asyncio.run(agent_obj.orchestrator())
\ No newline at end of file
@@ -0,0 +1,349 @@
+import argparse
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict
+
+from aiohttp import web, WSMsgType
+
+from main import ASYNC_HOME_AGENT
+from utils.logging_pipeline import setup_logging
+from utils.scheduler import LLM_SCHEDULER, set_command_context
+from utils.session_context import SESSION_STORE, evict_idle_periodically
+from utils.tracing import configure_tracing
+from utils.utils import UTILS
+
+
+def wants_wait(request):
+    """True for ?wait=1 (or true/yes/on); ?wait=0 and a missing parameter do not block."""
+    return request.query.get("wait", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+class HOME_SESSION:
+    """Per-home command queue served by a single worker so a home's commands run in order."""
+
+    def __init__(self, home_id, queue_size):
+        self.home_id = home_id
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.subscribers = set()
+        self.worker = None
+        # True while the worker is processing a command it has already taken off the queue
+        self.active = False
+        self.last_active = time.time()
+
+    @property
+    def idle(self):
+        return self.queue.empty() and not self.active and not self.subscribers
+
+
+class AGENT_SERVER:
+    def __init__(self, agent, queue_size=8, max_inflight=16, max_sessions=10000, max_results=1000,
+                 max_queued=1000, command_ttl=30.0, session_sweep_interval=60.0):
+        """
+        Serves ASYNC_HOME_AGENT over HTTP and WebSocket on a single event loop.
+
+        Args:
+            agent (ASYNC_HOME_AGENT): The agent whose serve_command handles each command.
+            queue_size (int): Commands a home may have waiting before submissions are rejected.
+            max_inflight (int): Commands processed at once across all homes.
+            max_sessions (int): Homes tracked at once; idle sessions are dropped beyond this.
+            max_results (int): Finished commands kept for polling via GET /commands/{id}.
+            max_queued (int): Commands queued across all homes before new ones are refused.
+            command_ttl (float, optional): Seconds after submission by which a command must finish.
+                                           Queued commands past it are shed, running ones are cut
+                                           short with partial results. None disables the deadline.
+            session_sweep_interval (float): Seconds between sweeps of the agent's idle session contexts.
+        """
+        self.agent = agent
+        self.queue_size = queue_size
+        self.max_sessions = max_sessions
+        self.max_results = max_results
+        self.max_queued = max_queued
+        self.command_ttl = command_ttl
+        self.session_sweep_interval = session_sweep_interval
+        self.sweep_task = None
+        self.queued = 0
+        self.expired = 0
+        self.inflight = asyncio.Semaphore(max_inflight)
+        self.sessions = OrderedDict()
+        self.commands = OrderedDict()
+        self.command_ids = itertools.count(1)
+        self.logger = logging.getLogger(__name__)
+
+    def get_session(self, home_id):
+        session = self.sessions.get(home_id)
+        if session is None:
+            self.evict_idle_sessions()
+            session = HOME_SESSION(home_id, self.queue_size)
+            session.worker = asyncio.create_task(self.session_worker(session))
+            self.sessions[home_id] = session
+        self.sessions.move_to_end(home_id)
+        session.last_active = time.time()
+        return session
+
+    def evict_idle_sessions(self):
+        """Drop least recently used sessions with nothing queued or running and no subscribers."""
+        for home_id in list(self.sessions):
+            if len(self.sessions) < self.max_sessions:
+                break
+            session = self.sessions[home_id]
+            if session.idle:
+                # The worker is waiting on an empty queue, so no command is cut short
+                session.worker.cancel()
+                del self.sessions[home_id]
+
+    def submit(self, home_id, query):
+        """
+        Queue a command for a home without waiting for it to run.
+
+        Returns:
+            The command record, or None when the home's queue or the server is full (backpressure;
+            see rejection_message).
+        """
+        if self.queued >= self.max_queued:
+            self.logger.warning(f"Server queue full, rejecting command for home {home_id}")
+            return None
+        session = self.get_session(home_id)
+        submitted_at = time.time()
+        command = {
+            "id": str(next(self.command_ids)),
+            "home_id": home_id,
+            "query": query,
+            "status": "queued",
+            "result": None,
+            "submitted_at": submitted_at,
+            "deadline": submitted_at + self.command_ttl if self.command_ttl else None,
+            "done": asyncio.Event(),
+        }
+        try:
+            session.queue.put_nowait(command)
+        except asyncio.QueueFull:
+            self.logger.warning(f"Queue full for home {home_id}, rejecting command")
+            return None
+        self.queued += 1
+        self.commands[command["id"]] = command
+        while len(self.commands) > self.max_results:
+            oldest_id, oldest = next(iter(self.commands.items()))
+            if oldest["status"] in ("queued", "running"):
+                break
+            del self.commands[oldest_id]
+        return command
+
+    async def publish(self, session, event, payload):
+        """Send a progress event to every WebSocket subscribed to the home."""
+        message = {"event": event, "home_id": session.home_id, **payload}
+        for ws in list(session.subscribers):
+            try:
+                await ws.send_json(message)
+            except Exception as e:
+                self.logger.warning(f"Dropping WebSocket subscriber for {session.home_id}: {str(e)}")
+                session.subscribers.discard(ws)
+
+    def rejection_message(self):
+        """Why submit() just returned None: the server-wide limit or the home's own queue."""
+        if self.queued >= self.max_queued:
+            return "Server is busy: too many queued commands"
+        return "Too many queued commands for this home"
+
+    async def session_worker(self, session):
+        while True:
+            command = await session.queue.get()
+            session.active = True
+            try:
+                await self.process(session, command)
+            except asyncio.CancelledError:
+                # Only server shutdown cancels a busy worker; never leave a waiting client hanging
+                if not command["done"].is_set():
+                    command["status"] = "error"
+                    command["result"] = {"status": "error", "message": "Server shut down before the command finished."}
+                    command["done"].set()
+                raise
+            finally:
+                session.active = False
+                session.queue.task_done()
+
+    async def process(self, session, command):
+        async def progress(event, payload):
+            await self.publish(session, event, {"command_id": command["id"], **payload})
+
+        self.queued -= 1
+        if command["deadline"] is not None and time.time() >= command["deadline"]:
+            self.expired += 1
+            command["status"] = "expired"
+            command["result"] = {"status": "error", "message": "Command expired before it could run."}
+            command["done"].set()
+            await progress("done", {"status": command["status"], "result": command["result"]})
+            return
+
+        async with self.inflight:
+            command["status"] = "running"
+            # Lets LLM_SCHEDULER attribute every LLM call of this command to its home and deadline
+            set_command_context(command["home_id"], command["deadline"])
+            await progress("started", {"query": command["query"], "queue_wait": time.time() - command["submitted_at"]})
+            try:
+                result = await self.agent.serve_command(command["query"], progress)
+            except Exception as e:
+                self.logger.error(f"Error serving command {command['id']}: {str(e)}", exc_info=True)
+                result = {"status": "error", "message": "Sorry, an error occurred. Please try again."}
+        command["status"] = {"ok": "done", "timeout": "timed_out"}.get(result["status"], "error")
+        command["result"] = result
+        command["done"].set()
+        await progress("done", {"status": command["status"], "result": result})
+
+    @staticmethod
+    def command_view(command):
+        return {k: v for k, v in command.items() if k != "done"}
+
+    async def handle_submit(self, request):
+        """POST /commands {"home_id", "query"}; add ?wait=1 to block until the command finishes."""
+        try:
+            body = await request.json()
+        except Exception:
+            return web.json_response({"error": "Request body must be JSON"}, status=400)
+        home_id = str(body.get("home_id", "default"))
+        query = body.get("query")
+        if not isinstance(query, str) or not query.strip():
+            return web.json_response({"error": "Missing 'query'"}, status=400)
+        command = self.submit(home_id, query)
+        if command is None:
+            return web.json_response({"error": self.rejection_message()}, status=429, headers={"Retry-After": "1"})
+        if wants_wait(request):
+            await command["done"].wait()
+            return web.json_response(self.command_view(command))
+        return web.json_response(self.command_view(command), status=202)
+
+    async def handle_status(self, request):
+        """GET /commands/{command_id}"""
+        command = self.commands.get(request.match_info["command_id"])
+        if command is None:
+            return web.json_response({"error": "Unknown command"}, status=404)
+        return web.json_response(self.command_view(command))
+
+    async def handle_websocket(self, request):
+        """GET /ws/{home_id}: streams the home's progress events; text frames {"query": ...} submit commands."""
+        home_id = request.match_info["home_id"]
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        session = self.get_session(home_id)
+        session.subscribers.add(ws)
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    query = msg.json().get("query")
+                except Exception:
+                    query = None
+                if not isinstance(query, str) or not query.strip():
+                    await ws.send_json({"event": "rejected", "error": "Missing 'query'"})
+                    continue
+                command = self.submit(home_id, query)
+                if command is None:
+                    await ws.send_json({"event": "rejected", "error": self.rejection_message()})
+                else:
+                    await ws.send_json({"event": "queued", "command_id": command["id"]})
+        finally:
+            session.subscribers.discard(ws)
+        return ws
+
+    async def handle_health(self, request):
+        return web.json_response({
+            "sessions": len(self.sessions),
+            "queued": self.queued,
+        })
+
+    async def handle_metrics(self, request):
+        """GET /metrics: command queue depths plus LLM scheduler statistics when one is in use."""
+        metrics = {
+            "sessions": len(self.sessions),
+            "queued": self.queued,
+            "queued_by_home": {
+                home_id: session.queue.qsize() for home_id, session in self.sessions.items() if session.queue.qsize()
+            },
+            "expired": self.expired,
+        }
+        if isinstance(self.agent.utils_obj, LLM_SCHEDULER):
+            metrics["llm"] = self.agent.utils_obj.metrics()
+        if self.agent.dispatcher is not None:
+            metrics["actuation"] = self.agent.dispatcher.metrics()
+        metrics["deadlines"] = self.agent.deadline_metrics()
+        if self.agent.predictor is not None:
+            metrics["speculation"] = self.agent.speculation_metrics()
+        return web.json_response(metrics)
+
+    def create_app(self):
+        app = web.Application()
+        app.add_routes([
+            web.post("/commands", self.handle_submit),
+            web.get("/commands/{command_id}", self.handle_status),
+            web.get("/ws/{home_id}", self.handle_websocket),
+            web.get("/health", self.handle_health),
+            web.get("/metrics", self.handle_metrics),
+        ])
+        app.on_startup.append(self.startup)
+        app.on_shutdown.append(self.shutdown)
+        return app
+
+    async def startup(self, app):
+        if self.agent.sessions is not None:
+            self.sweep_task = asyncio.create_task(
+                evict_idle_periodically(self.agent.sessions, self.session_sweep_interval)
+            )
+
+    async def shutdown(self, app):
+        if self.sweep_task is not None:
+            self.sweep_task.cancel()
+        for session in self.sessions.values():
+            session.worker.cancel()
+            for ws in list(session.subscribers):
+                await ws.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve the HOMA orchestrator over HTTP and WebSocket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--provider", default="ollama")
+    parser.add_argument("--model", default="qwen2.5:32b")
+    parser.add_argument("--ollama-host", default=None, help="Ollama URL, e.g. a local mock LLM server")
+    parser.add_argument("--queue-size", type=int, default=8)
+    parser.add_argument("--max-sessions", type=int, default=10000, help="Homes whose context is kept in memory")
+    parser.add_argument("--max-inflight", type=int, default=16)
+    parser.add_argument("--max-queued", type=int, default=1000)
+    parser.add_argument("--command-ttl", type=float, default=30.0, help="Seconds a command may take from submission")
+    parser.add_argument("--log-file", default=None, help="Also write logs to this file")
+    parser.add_argument("--log-json", action="store_true", help="Write logs as JSON lines")
+    parser.add_argument("--trace-file", default=None, help="Write tracing spans to this JSONL file")
+    parser.add_argument("--trace-endpoint", default=None, help="OTLP/JSON collector URL, e.g. http://localhost:4318/v1/traces")
+    parser.add_argument("--trace-sample-rate", type=float, default=1.0, help="Fraction of commands traced")
+    parser.add_argument("--speculate", action="store_true", help="Start likely device agents during classification")
+    parser.add_argument("--llm-call-timeout", type=float, default=None, help="Seconds before one LLM attempt is retried")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="LLM calls in flight across all homes")
+    parser.add_argument("--actuation-latency", type=float, default=0.05, help="Simulated device round trip (s)")
+    parser.add_argument("--coalesce-window", type=float, default=0.1, help="Seconds to batch commands per device")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    setup_logging(path=args.log_file, structured=args.log_json)
+    configure_tracing(path=args.trace_file, endpoint=args.trace_endpoint, sample_rate=args.trace_sample_rate)
+    utils_obj = UTILS(provider=args.provider, model_name=args.model, host=args.ollama_host)
+    scheduler = LLM_SCHEDULER(utils_obj, max_inflight=args.llm_concurrency)
+    agent_obj = ASYNC_HOME_AGENT(
+        utils_obj=scheduler, sessions=SESSION_STORE(max_sessions=args.max_sessions), call_timeout=args.llm_call_timeout,
+        speculate=args.speculate
+    )
+    agent_obj.create_simulated_dispatcher(
+        latency=args.actuation_latency, window=args.coalesce_window, max_homes=args.max_sessions
+    )
+    server = AGENT_SERVER(
+        agent_obj,
+        max_sessions=args.max_sessions,
+        queue_size=args.queue_size,
+        max_inflight=args.max_inflight,
+        max_queued=args.max_queued,
+        command_ttl=args.command_ttl,
+    )
+    web.run_app(server.create_app(), host=args.host, port=args.port)
@@ -0,0 +1,301 @@
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import sqlite3
+import time
+
+from aiohttp import web
+
+from main import ASYNC_HOME_AGENT
+from server import wants_wait
+from utils.command_queue import DURABLE_COMMAND_QUEUE, FINISHED_STATUSES
+from utils.llm_cache import SQLITE_CACHE
+from utils.logging_pipeline import setup_logging
+from utils.scheduler import LLM_SCHEDULER, set_command_context
+from utils.session_context import SESSION_STORE, evict_idle_periodically
+from utils.tracing import configure_tracing
+from utils.utils import UTILS
+
+
+async def finish_command(queue, command_id, status, result, retry_interval=0.05):
+    """Write a command's result, retrying while another process holds the queue's write lock."""
+    while True:
+        try:
+            queue.finish(command_id, status, result)
+            return
+        except sqlite3.OperationalError as e:
+            queue.logger.warning(f"Queue busy, retrying result of command {command_id}: {str(e)}")
+            await asyncio.sleep(retry_interval)
+
+
+async def run_queued_command(agent, queue, command):
+    """Serve one claimed command with the agent and write its result back to the queue."""
+    if command["deadline"] is not None and time.time() >= command["deadline"]:
+        await finish_command(
+            queue, command["id"], "expired", {"status": "error", "message": "Command expired before it could run."}
+        )
+        return
+    set_command_context(command["home_id"], command["deadline"])
+    try:
+        result = await agent.serve_command(command["query"])
+    except Exception as e:
+        agent.logger.error(f"Error serving command {command['id']}: {str(e)}", exc_info=True)
+        result = {"status": "error", "message": "Sorry, an error occurred. Please try again."}
+    await finish_command(queue, command["id"], {"ok": "done", "timeout": "timed_out"}.get(result["status"], "error"), result)
+
+
+async def serve_slot(slot, config):
+    """Worker loop: claim this slot's commands from the shared queue and run up to max_inflight at once."""
+    queue = DURABLE_COMMAND_QUEUE(config["queue_path"], config["workers"])
+    cache = SQLITE_CACHE(config["cache_path"], ttl=config["cache_ttl"]) if config["cache_path"] else None
+    utils_obj = UTILS(provider=config["provider"], model_name=config["model"], host=config["ollama_host"], cache=cache)
+    scheduler = LLM_SCHEDULER(utils_obj, max_inflight=config["llm_concurrency"])
+    agent = ASYNC_HOME_AGENT(
+        utils_obj=scheduler, sessions=SESSION_STORE(max_sessions=config["max_sessions"]),
+        call_timeout=config["llm_call_timeout"], speculate=config["speculate"]
+    )
+    agent.create_simulated_dispatcher(
+        latency=config["actuation_latency"], window=config["coalesce_window"], max_homes=config["max_sessions"]
+    )
+
+    # Held so the sweep is not garbage-collected; it runs as long as the worker
+    sweep = asyncio.create_task(evict_idle_periodically(agent.sessions))
+    running = set()
+    while True:
+        if len(running) >= config["max_inflight"]:
+            await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            continue
+        command = queue.claim(slot)
+        if command is None:
+            await asyncio.sleep(config["poll_interval"])
+            continue
+        task = asyncio.create_task(run_queued_command(agent, queue, command))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+
+def run_worker(slot, config):
+    """Entry point of a worker process."""
+    setup_logging(
+        path=config["log_file"], structured=config["log_json"],
+        fmt=f'%(asctime)s - worker-{slot} - %(name)s - %(levelname)s - %(message)s'
+    )
+    configure_tracing(
+        path=config["trace_file"], endpoint=config["trace_endpoint"], sample_rate=config["trace_sample_rate"]
+    )
+    try:
+        asyncio.run(serve_slot(slot, config))
+    except KeyboardInterrupt:
+        pass
+
+
+class AGENT_SUPERVISOR:
+    def __init__(self, config, queue_size=8, max_queued=1000, command_ttl=30.0, max_results=1000,
+                 check_interval=0.5):
+        """
+        One HTTP intake in front of N ASYNC_HOME_AGENT worker processes.
+
+        Commands are written to a DURABLE_COMMAND_QUEUE and each home is pinned to one worker
+        slot, so its session context stays in one process. The supervisor restarts any worker
+        that exits and puts the commands it was running back in the queue.
+
+        Args:
+            config (dict): Worker settings (see parse_args); must be picklable for process spawn.
+            queue_size (int): Commands a home may have queued before submissions are rejected.
+            max_queued (int): Commands queued across all homes before new ones are refused.
+            command_ttl (float, optional): Seconds after submission by which a command must finish. None disables the deadline.
+            max_results (int): Finished commands kept for polling via GET /commands/{id}.
+            check_interval (float): Seconds between worker liveness checks.
+        """
+        self.config = config
+        self.queue_size = queue_size
+        self.max_queued = max_queued
+        self.command_ttl = command_ttl
+        self.max_results = max_results
+        self.check_interval = check_interval
+        self.queue = DURABLE_COMMAND_QUEUE(config["queue_path"], config["workers"])
+        self.cache = SQLITE_CACHE(config["cache_path"]) if config["cache_path"] else None
+        self.context = multiprocessing.get_context("spawn")
+        self.processes = {}
+        self.restarts = 0
+        self.monitor_task = None
+        self.logger = logging.getLogger(__name__)
+
+    def start_worker(self, slot):
+        process = self.context.Process(target=run_worker, args=(slot, self.config), name=f"homa-worker-{slot}", daemon=True)
+        process.start()
+        self.processes[slot] = process
+        self.logger.info(f"Started worker {slot} (pid {process.pid})")
+
+    async def monitor(self):
+        """Restart dead workers after requeueing the commands they had claimed."""
+        while True:
+            await asyncio.sleep(self.check_interval)
+            for slot, process in list(self.processes.items()):
+                if process.is_alive():
+                    continue
+                try:
+                    requeued = self.queue.requeue_running(slot)
+                except sqlite3.OperationalError:
+                    # Queue busy; try again on the next check before restarting the worker
+                    continue
+                self.restarts += 1
+                self.logger.error(
+                    f"Worker {slot} exited with code {process.exitcode}; requeued {requeued} command(s), restarting"
+                )
+                self.start_worker(slot)
+            try:
+                self.queue.purge(self.max_results)
+            except sqlite3.OperationalError:
+                pass
+
+    async def startup(self, app):
+        # Commands left running by a previous supervisor have no worker any more
+        requeued = self.queue.requeue_running()
+        if requeued:
+            self.logger.warning(f"Requeued {requeued} command(s) left running by a previous run")
+        moved = self.queue.reassign_slots()
+        if moved:
+            self.logger.warning(f"Moved {moved} queued command(s) to their slot under {self.config['workers']} workers")
+        for slot in range(self.config["workers"]):
+            self.start_worker(slot)
+        self.monitor_task = asyncio.create_task(self.monitor())
+
+    async def shutdown(self, app):
+        if self.monitor_task:
+            self.monitor_task.cancel()
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            process.join(timeout=5)
+
+    async def handle_submit(self, request):
+        """POST /commands {"home_id", "query"}; add ?wait=1 to block until the command finishes."""
+        try:
+            body = await request.json()
+        except Exception:
+            return web.json_response({"error": "Request body must be JSON"}, status=400)
+        home_id = str(body.get("home_id", "default"))
+        query = body.get("query")
+        if not isinstance(query, str) or not query.strip():
+            return web.json_response({"error": "Missing 'query'"}, status=400)
+        if self.queue.queued() >= self.max_queued:
+            self.logger.warning(f"Server queue full, rejecting command for home {home_id}")
+            return web.json_response(
+                {"error": "Server is busy: too many queued commands"}, status=429, headers={"Retry-After": "1"}
+            )
+        if self.queue.queued(home_id) >= self.queue_size:
+            self.logger.warning(f"Queue full for home {home_id}, rejecting command")
+            return web.json_response(
+                {"error": "Too many queued commands for this home"}, status=429, headers={"Retry-After": "1"}
+            )
+        deadline = time.time() + self.command_ttl if self.command_ttl else None
+        try:
+            command = self.queue.submit(home_id, query, deadline)
+        except sqlite3.OperationalError as e:
+            self.logger.warning(f"Queue busy, rejecting command for home {home_id}: {str(e)}")
+            return web.json_response({"error": "Command queue busy"}, status=503, headers={"Retry-After": "1"})
+        if wants_wait(request):
+            while command["status"] not in FINISHED_STATUSES:
+                await asyncio.sleep(self.config["poll_interval"])
+                command = self.queue.get(command["id"])
+            return web.json_response(command)
+        return web.json_response(command, status=202)
+
+    async def handle_status(self, request):
+        """GET /commands/{command_id}"""
+        command = self.queue.get(request.match_info["command_id"])
+        if command is None:
+            return web.json_response({"error": "Unknown command"}, status=404)
+        return web.json_response(command)
+
+    async def handle_health(self, request):
+        return web.json_response({
+            "workers": {slot: process.is_alive() for slot, process in self.processes.items()},
+            "queued": self.queue.queued(),
+        })
+
+    async def handle_metrics(self, request):
+        """GET /metrics: queue state per worker, worker restarts and the shared LLM cache size."""
+        metrics = {"commands": self.queue.metrics(), "restarts": self.restarts}
+        if self.cache is not None:
+            metrics["llm_cache_entries"] = self.cache.connection.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return web.json_response(metrics)
+
+    def create_app(self):
+        app = web.Application()
+        app.add_routes([
+            web.post("/commands", self.handle_submit),
+            web.get("/commands/{command_id}", self.handle_status),
+            web.get("/health", self.handle_health),
+            web.get("/metrics", self.handle_metrics),
+        ])
+        app.on_startup.append(self.startup)
+        app.on_shutdown.append(self.shutdown)
+        return app
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve the HOMA orchestrator from a pool of worker processes.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--provider", default="ollama")
+    parser.add_argument("--model", default="qwen2.5:32b")
+    parser.add_argument("--ollama-host", default=None, help="Ollama URL, e.g. a local mock LLM server")
+    parser.add_argument("--queue-db", default="homa_commands.sqlite", help="Durable command queue shared with workers")
+    parser.add_argument("--cache-db", default="homa_llm_cache.sqlite", help="Shared LLM response cache; '' disables it")
+    parser.add_argument("--cache-ttl", type=float, default=None, help="Seconds a cached LLM response stays valid")
+    parser.add_argument("--queue-size", type=int, default=8)
+    parser.add_argument("--max-queued", type=int, default=1000)
+    parser.add_argument("--max-inflight", type=int, default=16, help="Commands run at once per worker")
+    parser.add_argument("--max-sessions", type=int, default=10000, help="Homes whose context each worker keeps")
+    parser.add_argument("--command-ttl", type=float, default=30.0, help="Seconds a command may take from submission")
+    parser.add_argument("--log-file", default=None, help="Also write logs to this file")
+    parser.add_argument("--log-json", action="store_true", help="Write logs as JSON lines")
+    parser.add_argument("--trace-file", default=None, help="Write tracing spans to this JSONL file")
+    parser.add_argument("--trace-endpoint", default=None, help="OTLP/JSON collector URL, e.g. http://localhost:4318/v1/traces")
+    parser.add_argument("--trace-sample-rate", type=float, default=1.0, help="Fraction of commands traced")
+    parser.add_argument("--speculate", action="store_true", help="Start likely device agents during classification")
+    parser.add_argument("--llm-call-timeout", type=float, default=None, help="Seconds before one LLM attempt is retried")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="LLM calls in flight per worker")
+    parser.add_argument("--actuation-latency", type=float, default=0.05, help="Simulated device round trip (s)")
+    parser.add_argument("--coalesce-window", type=float, default=0.1, help="Seconds to batch commands per device")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="Seconds between queue polls")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    setup_logging(path=args.log_file, structured=args.log_json)
+    config = {
+        "workers": args.workers,
+        "provider": args.provider,
+        "model": args.model,
+        "ollama_host": args.ollama_host,
+        "queue_path": args.queue_db,
+        "cache_path": args.cache_db or None,
+        "cache_ttl": args.cache_ttl,
+        "max_inflight": args.max_inflight,
+        "max_sessions": args.max_sessions,
+        "llm_concurrency": args.llm_concurrency,
+        "llm_call_timeout": args.llm_call_timeout,
+        "speculate": args.speculate,
+        "log_file": args.log_file,
+        "log_json": args.log_json,
+        "trace_file": args.trace_file,
+        "trace_endpoint": args.trace_endpoint,
+        "trace_sample_rate": args.trace_sample_rate,
+        "actuation_latency": args.actuation_latency,
+        "coalesce_window": args.coalesce_window,
+        "poll_interval": args.poll_interval,
+    }
+    supervisor = AGENT_SUPERVISOR(
+        config,
+        queue_size=args.queue_size,
+        max_queued=args.max_queued,
+        command_ttl=args.command_ttl,
+    )
+    web.run_app(supervisor.create_app(), host=args.host, port=args.port)
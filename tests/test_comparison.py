@@ -0,0 +1,80 @@
+import pytest
+
+from utils.comparison import PAIRED_COMPARISON, holm, query_keys
+
+METRICS = ("weighted_total", "device_score", "task_type_score", "mode_score", "args_score")
+
+
+def test_holm_adjusts_in_rank_order():
+    # Sorted: 0.01 x 3, 0.03 x 2, 0.04 x 1; the last is lifted to keep the order
+    assert holm([0.01, 0.04, 0.03]) == pytest.approx([0.03, 0.06, 0.06])
+
+
+def test_holm_passes_none_through_and_caps_at_one():
+    adjusted = holm([None, 0.7, 0.2, None, 0.6])
+    assert adjusted[0] is None and adjusted[3] is None
+    assert adjusted[1:3] + adjusted[4:] == pytest.approx([1.0, 0.6, 1.0])
+
+
+def test_holm_empty_and_all_none():
+    assert holm([]) == []
+    assert holm([None, None]) == [None, None]
+
+
+def test_outcome():
+    comparison = PAIRED_COMPARISON(alpha=0.05, margin=0.01)
+    assert comparison.outcome(0.2, 0.001) == "better"
+    assert comparison.outcome(-0.2, 0.001) == "worse"
+    assert comparison.outcome(0.005, 0.001) == "no_clear_difference"
+    assert comparison.outcome(-0.2, 0.2) == "no_clear_difference"
+    assert comparison.outcome(-0.2, None) == "no_clear_difference"
+
+
+def test_query_keys_number_repeats():
+    keys = query_keys({"query_scores": [{"query": "a"}, {"query": "b"}, {"query": "a"}]})
+    assert keys[0] != keys[1] and keys[2] == f"{keys[0]}-2"
+
+
+def report(totals, language="hindi"):
+    entries = []
+    for idx, total in enumerate(totals):
+        score = dict.fromkeys(METRICS, total)
+        entries.append({
+            "query": f"query {idx}",
+            "language": language,
+            "devices": [{"actual": {"device": "tv"}, "score": score}],
+            "query_score": {f"query_{metric}": total for metric in METRICS},
+        })
+    return {"query_scores": entries}
+
+
+BASELINE = report([1.0, 0.6, 0.9, 0.4, 1.0] * 8)
+
+
+def test_compare_with_itself_passes():
+    result = PAIRED_COMPARISON(resamples=500).compare(BASELINE, [BASELINE], names=["same"])
+    comparison = result["comparisons"][0]
+    assert result["verdict"] == "pass"
+    assert comparison["paired_queries"] == 40
+    assert comparison["overall"]["query_weighted_total"]["outcome"] == "no_clear_difference"
+
+
+def test_clear_regression_fails():
+    worse = report([total - 0.3 for total in [1.0, 0.6, 0.9, 0.4, 1.0] * 8])
+    result = PAIRED_COMPARISON(resamples=500).compare(BASELINE, [worse])
+    comparison = result["comparisons"][0]
+    assert result["verdict"] == "fail"
+    assert comparison["overall"]["query_weighted_total"]["outcome"] == "worse"
+    assert set(comparison["regressions"]) == {"language hindi", "device tv"}
+
+
+def test_no_common_queries_fails():
+    other = {"query_scores": [{**entry, "query": "other " + entry["query"]} for entry in BASELINE["query_scores"]]}
+    result = PAIRED_COMPARISON(resamples=100).compare(BASELINE, [other])
+    assert result["verdict"] == "fail"
+    assert result["comparisons"][0]["unmatched_queries"] == 40
+
+
+def test_require_improvement():
+    result = PAIRED_COMPARISON(resamples=500).compare(BASELINE, [BASELINE], require_improvement=True)
+    assert result["verdict"] == "fail"
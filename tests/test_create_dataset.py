@@ -0,0 +1,106 @@
+import asyncio
+import csv
+import json
+import logging
+
+import pytest
+
+from create_dataset import CREATE_DATASET, DATASET_COLUMNS
+
+
+def row(seed):
+    devices = [{"device": "tv", "mode": "power", "args": {"status": "on"}, "execution_type": "concurrent"}]
+    return {
+        "generated_query": f"turn on the tv, please ({seed})",
+        "device_info": repr(devices),
+        "language": "English",
+        "seed": str(seed),
+        "spec": json.dumps({"language": "English", "devices": devices, "vagueness": False}),
+    }
+
+
+def csv_text(rows, columns=DATASET_COLUMNS):
+    lines = [",".join(columns)]
+    for r in rows:
+        with_quotes = []
+        for column in columns:
+            value = r[column]
+            with_quotes.append('"' + value.replace('"', '""') + '"' if any(c in value for c in ',"\n') else value)
+        lines.append(",".join(with_quotes))
+    return "\n".join(lines) + "\n"
+
+
+@pytest.fixture
+def creator():
+    # __init__ reads utils/config.json and sets up an LLM client, neither of which these tests need
+    creator = CREATE_DATASET.__new__(CREATE_DATASET)
+    creator.logger = logging.getLogger("create_dataset")
+    return creator
+
+
+def read_rows(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def test_intact_file_is_kept(tmp_path, creator):
+    path = tmp_path / "dataset.csv"
+    path.write_text(csv_text([row(0), row(1)]), encoding="utf-8")
+    before = path.read_bytes()
+    assert creator.load_existing_rows(str(path)) == [row(0), row(1)]
+    assert path.read_bytes() == before
+
+
+def test_row_torn_inside_spec_is_dropped(tmp_path, creator):
+    path = tmp_path / "dataset.csv"
+    text = csv_text([row(0), row(1)])
+    # Killed halfway through writing the second row's spec
+    path.write_text(text[: text.rindex('"devices"')], encoding="utf-8")
+    assert creator.load_existing_rows(str(path)) == [row(0)]
+    assert path.read_text(encoding="utf-8") == csv_text([row(0)])
+
+
+def test_row_torn_before_its_seed_is_dropped(tmp_path, creator):
+    path = tmp_path / "dataset.csv"
+    text = csv_text([row(0), row(1)])
+    path.write_text(text[: text.rindex(",English,")], encoding="utf-8")
+    assert creator.load_existing_rows(str(path)) == [row(0)]
+
+
+def test_unterminated_last_line_is_rewritten(tmp_path, creator):
+    path = tmp_path / "dataset.csv"
+    path.write_text(csv_text([row(0), row(1)])[:-1], encoding="utf-8")
+    assert creator.load_existing_rows(str(path)) == [row(0), row(1)]
+    assert path.read_text(encoding="utf-8").endswith("\n")
+
+
+def test_row_torn_inside_seed_is_dropped(tmp_path, creator):
+    path = tmp_path / "dataset.csv"
+    text = csv_text([row(0), row(123)])
+    path.write_text(text[: text.rindex("23,")], encoding="utf-8")
+    assert creator.load_existing_rows(str(path)) == [row(0)]
+
+
+def test_older_columns_are_kept(tmp_path, creator):
+    path = tmp_path / "dataset.csv"
+    old_columns = ["generated_query", "device_info", "language"]
+    legacy = [{**row(seed), "seed": "", "spec": ""} for seed in range(2)]
+    path.write_text(csv_text(legacy, old_columns), encoding="utf-8")
+    # The first load adds the new columns, empty; later loads keep the rows as they are
+    for _ in range(3):
+        assert creator.load_existing_rows(str(path)) == legacy
+    assert path.read_text(encoding="utf-8") == csv_text(legacy)
+
+
+def test_header_only_file_gets_no_second_header(tmp_path, creator):
+    path = tmp_path / "dataset.csv"
+    path.write_text(",".join(DATASET_COLUMNS) + "\n", encoding="utf-8")
+
+    async def create_dataset_row(seed=None):
+        return row(seed)
+
+    creator.create_dataset_row = create_dataset_row
+    stats = asyncio.run(creator.create_dataset(str(path), num_rows=3, max_concurrency=2, seed=5))
+    assert stats["written"] == 3
+    assert path.read_text(encoding="utf-8").count("generated_query") == 1
+    assert sorted(r["seed"] for r in read_rows(path)) == ["5", "6", "7"]
@@ -0,0 +1,83 @@
+from utils.devices import DEVICE_STATE_STORE, coalesce_commands
+
+UP = {"mode": "volume", "args": {"direction": "up"}}
+DOWN_2 = {"mode": "volume", "args": {"direction": "decrease by", "level": 2}}
+SET_10 = {"mode": "volume", "args": {"level": 10}}
+MUTE = {"mode": "volume", "args": {"direction": "mute"}}
+
+
+def power(status):
+    return {"mode": "power", "args": {"status": status}}
+
+
+def test_relative_steps_add_up():
+    assert coalesce_commands([UP, UP, UP]) == [{"mode": "volume", "args": {"direction": "increase by", "level": 3}}]
+    assert coalesce_commands([UP, DOWN_2]) == [{"mode": "volume", "args": {"direction": "down"}}]
+
+
+def test_steps_that_cancel_out_send_nothing():
+    assert coalesce_commands([UP, DOWN_2, UP]) == []
+
+
+def test_last_absolute_value_wins():
+    assert coalesce_commands([UP, SET_10]) == [SET_10]
+
+
+def test_step_after_absolute_value_is_applied_to_it():
+    assert coalesce_commands([SET_10, UP]) == [{"mode": "volume", "args": {"level": 11}}]
+    assert coalesce_commands([SET_10, UP, DOWN_2, DOWN_2]) == [{"mode": "volume", "args": {"level": 7}}]
+
+
+def test_stepped_level_stops_at_zero():
+    assert coalesce_commands([{"mode": "volume", "args": {"level": 1}}, DOWN_2]) == [
+        {"mode": "volume", "args": {"level": 0}}
+    ]
+
+
+def test_step_after_non_numeric_absolute_is_sent_after_it():
+    assert coalesce_commands([MUTE, UP, UP]) == [
+        MUTE, {"mode": "volume", "args": {"direction": "increase by", "level": 2}}
+    ]
+
+
+def test_power_change_back_to_current_state_is_dropped():
+    assert coalesce_commands([power("on"), power("off")], {"power": "off"}) == []
+    assert coalesce_commands([power("off"), power("on")], {"power": "off"}) == [power("on")]
+
+
+def test_up_with_a_level_sets_that_level():
+    # TV_PROMPT: "Increase volume to 25" -> direction up, level 25
+    up_to_25 = {"mode": "volume", "args": {"direction": "up", "level": 25}}
+    assert coalesce_commands([UP, up_to_25]) == [up_to_25]
+    assert coalesce_commands([up_to_25, UP]) == [{"mode": "volume", "args": {"direction": "up", "level": 26}}]
+
+
+def test_ac_power_modes_coalesce_with_each_other():
+    power_on, power_off = {"mode": "PowerOn", "args": {}}, {"mode": "PowerOff", "args": {}}
+    assert coalesce_commands([power_on, power_off], {"power": "off"}) == []
+    assert coalesce_commands([power_off, power_on], {"power": "off"}) == [power_on]
+    assert coalesce_commands([power_on, power("off")], {"power": "on"}) == [power("off")]
+
+
+def test_modes_are_kept_apart():
+    channel = {"mode": "channel", "args": {"number": 5}}
+    assert coalesce_commands([UP, channel, UP]) == [
+        {"mode": "volume", "args": {"direction": "increase by", "level": 2}}, channel
+    ]
+
+
+def test_state_store_forgets_least_recently_used_home():
+    store = DEVICE_STATE_STORE({"hall_tv": "tv"}, max_homes=2)
+    for home_id in ("a", "b", "a", "c"):
+        store.home(home_id)
+    assert list(store.homes) == ["a", "c"]
+
+
+def test_state_store_applies_power_modes_and_levels():
+    store = DEVICE_STATE_STORE({"ac": "ac", "hall_tv": "tv"})
+    assert store.apply("a", "ac", {"mode": "PowerOn", "args": {}})["power"] == "on"
+    assert store.apply("a", "ac", {"mode": "PowerOff", "args": {}})["power"] == "off"
+    store.apply("a", "hall_tv", {"mode": "volume", "args": {"direction": "up", "level": 25}})
+    store.apply("a", "hall_tv", UP)
+    state = store.apply("a", "hall_tv", DOWN_2)
+    assert state["power"] == "on" and state["settings"]["volume"]["level"] == 24
@@ -0,0 +1,132 @@
+import json
+
+import pyarrow as pa
+import pytest
+
+from utils.report_store import (
+    convert_report, device_table, load_report, load_summary, load_table, query_table, read_arrow_report,
+    report_from_table, report_paths, report_table, save_report, table_frames,
+)
+
+
+def device(name, score):
+    return {
+        "actual": {"device": name, "task_type": "concurrent", "mode": "power", "args": {"status": "on"}},
+        "predicted": {"device": name, "task_type": "sequential", "mode": "Power", "args": {"status": "on", "level": 3}},
+        "score": {"weighted_total": score, "device_score": 1, "task_type_score": 0, "mode_score": 1, "args_score": 1},
+    }
+
+
+def query_scores(total):
+    return {
+        "query_weighted_total": total,
+        "query_device_score": 1.0,
+        "query_task_type_score": 0.0,
+        "query_mode_score": 1.0,
+        "query_args_score": 1.0,
+    }
+
+
+REPORT = {
+    "model": "phi4",
+    "overall_average": query_scores(0.9),
+    "query_scores": [
+        {
+            "query": "टीवी चालू करो और पंखा बंद करो",
+            "language": "hindi",
+            "devices": [device("tv", 0.9), device("fan", 0.9)],
+            "query_score": query_scores(0.9),
+            "expected": [{"device": "tv", "mode": "power", "args": {"status": "on"}}],
+            "raw": {"classification": "tv, fan"},
+            "timing": {
+                "wall_time": 1.5,
+                "queue_wait": 0.25,
+                "prompt_tokens": 120,
+                "completion_tokens": 30,
+                "tokens_per_second": 20.0,
+                "llm_calls": 2,
+                "calls": [
+                    {
+                        "role": "classifier", "wall_time": 0.5, "queue_wait": 0.0, "prompt_tokens": 60,
+                        "completion_tokens": 10, "generation_time": 0.5, "tokens_per_second": 20.0, "failed": False,
+                    },
+                    {
+                        "role": "device", "wall_time": 1.0, "queue_wait": 0.25, "prompt_tokens": 60,
+                        "completion_tokens": 20, "generation_time": 1.0, "tokens_per_second": 20.0, "failed": False,
+                        "device_name": "tv",
+                    },
+                ],
+            },
+        },
+        # An older report entry: no devices, timing, expected devices or raw output
+        {"query": "hello", "language": None, "devices": [], "query_score": query_scores(1.0)},
+    ],
+    "latency": {"p50": 1.5},
+}
+
+
+def test_table_round_trip():
+    assert report_from_table(report_table(REPORT)) == REPORT
+
+
+def test_round_trip_keeps_summary_key_order():
+    assert list(report_from_table(report_table(REPORT))) == list(REPORT)
+
+
+@pytest.mark.parametrize("extension", [".arrow", ".json"])
+def test_save_and_load(tmp_path, extension):
+    path = str(tmp_path / f"evaluation_report_phi4{extension}")
+    save_report(path, REPORT)
+    assert load_report(path) == REPORT
+    assert load_summary(path) == {key: value for key, value in REPORT.items() if key != "query_scores"}
+
+
+def test_convert_both_ways(tmp_path):
+    path = str(tmp_path / "evaluation_report_phi4.json")
+    save_report(path, REPORT)
+    arrow_path = convert_report(path)
+    assert arrow_path.endswith(".arrow")
+    json_path = convert_report(arrow_path, str(tmp_path / "exported.json"))
+    with open(json_path, encoding="utf-8") as f:
+        assert json.load(f) == REPORT
+
+
+def test_report_paths_prefers_arrow(tmp_path):
+    for name in ("evaluation_report_a.json", "evaluation_report_a.arrow", "evaluation_report_b.json", "other.json"):
+        (tmp_path / name).write_text("")
+    assert report_paths(str(tmp_path)) == [
+        str(tmp_path / "evaluation_report_a.arrow"), str(tmp_path / "evaluation_report_b.json"),
+    ]
+
+
+def test_query_and_device_tables():
+    table = report_table(REPORT)
+    queries = query_table(table)
+    devices = device_table(table)
+    assert "devices" not in queries.column_names and queries.column("device_count").to_pylist() == [2, 0]
+    assert devices.num_rows == 2
+    assert devices.column("query_index").to_pylist() == [0, 0]
+    assert devices.column("actual_device").to_pylist() == ["tv", "fan"]
+    assert json.loads(devices.column("predicted_args")[0].as_py()) == {"status": "on", "level": 3}
+
+
+def test_device_table_shares_the_report_buffers():
+    table = report_table(REPORT)
+    stored = table.column("devices").chunk(0).values.field("weighted_total").buffers()[1]
+    viewed = device_table(table).column("weighted_total").chunk(0).buffers()[1]
+    assert viewed.address == stored.address
+
+
+def test_table_frames_convert_only_the_given_columns():
+    queries, devices = table_frames(report_table(REPORT), ["query", "device_count"], ["weighted_total"])
+    assert list(queries.columns) == ["query", "device_count"]
+    assert list(devices.columns) == ["query_index", "weighted_total"]
+    assert devices["weighted_total"].tolist() == [0.9, 0.9]
+
+
+def test_read_arrow_report_from_a_buffer(tmp_path):
+    path = str(tmp_path / "evaluation_report_phi4.arrow")
+    save_report(path, REPORT)
+    with open(path, "rb") as f:
+        table = read_arrow_report(pa.py_buffer(f.read()))
+    assert table.equals(read_arrow_report(path)) and table.equals(load_table(path))
@@ -0,0 +1,62 @@
+from collections import Counter
+
+import pytest
+
+from utils.sampling import STRATIFIED_ESTIMATE, collapse_strata, stratified_order
+
+
+def test_collapse_strata_keeps_large_keys():
+    keys = [('hindi', 1)] * 10 + [('tamil', 2)] * 12
+    assert collapse_strata(keys, min_size=10) == keys
+
+
+def test_collapse_strata_falls_back_to_language_then_device_count():
+    keys = (
+        [('hindi', 1)] * 6 + [('hindi', 2)] * 5      # no key is large enough, but hindi is
+        + [('tamil', 3)] * 4 + [('bengali', 3)] * 7  # neither language is, but 3 devices is
+        + [('odia', 4)] * 2                          # nothing is
+    )
+    strata = collapse_strata(keys, min_size=10)
+    assert strata == [('hindi', '*')] * 11 + [('*', 3)] * 11 + [('*', '*')] * 2
+
+
+def test_collapse_strata_empty():
+    assert collapse_strata([]) == []
+
+
+def test_stratified_order_is_a_permutation():
+    strata = ['a'] * 7 + ['b'] * 30 + ['c'] * 3
+    order = stratified_order(strata, seed=1)
+    assert sorted(order) == list(range(len(strata)))
+
+
+def test_stratified_order_prefixes_are_proportional():
+    strata = ['a'] * 50 + ['b'] * 120 + ['c'] * 30
+    sizes = Counter(strata)
+    total = len(strata)
+    for seed in range(5):
+        order = stratified_order(strata, seed=seed)
+        seen = Counter()
+        for k, idx in enumerate(order, start=1):
+            seen[strata[idx]] += 1
+            for stratum, size in sizes.items():
+                # Each stratum is within one row of its share of the scale, so of the prefix
+                assert abs(seen[stratum] - k * size / total) <= 1 + len(sizes) * size / total
+
+
+def test_stratified_order_depends_only_on_seed():
+    strata = ['a', 'b'] * 20
+    assert stratified_order(strata, seed=3) == stratified_order(strata, seed=3)
+    assert stratified_order(strata, seed=3) != stratified_order(strata, seed=4)
+
+
+def test_estimate_is_exact_once_every_row_is_in():
+    values = {'a': [1.0, 0.0, 1.0, 1.0], 'b': [0.5, 0.25]}
+    estimate = STRATIFIED_ESTIMATE({stratum: len(v) for stratum, v in values.items()})
+    assert estimate.interval() is None
+    for stratum, stratum_values in values.items():
+        for value in stratum_values:
+            estimate.add(stratum, value)
+    mean, low, high = estimate.interval()
+    assert mean == pytest.approx(sum(sum(v) for v in values.values()) / 6)
+    assert low == pytest.approx(mean) and high == pytest.approx(mean)
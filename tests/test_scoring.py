@@ -0,0 +1,159 @@
+import random
+
+import pytest
+
+from utils.scoring import score_frame, score_results
+
+DEVICES = ["tv", "ac", "fan", "fridge", "washer", "dryer", "microwave"]
+MODES = ["power", "volume", "Normal", "SetFridgeTemp", "TimeDry"]
+ARG_VALUES = {"status": ["on", "off", "ON"], "level": [1, 10, "10"], "temperature": [4, 22], "duration": [30, 45]}
+
+
+# The per-device scorer evaluator.py used before utils/scoring.py, kept as the reference
+def reference_device_score(expected, predicted):
+    device_match = int(expected['device'].lower() == predicted.get('device_type', '').lower())
+    expected_type = expected.get('execution_type', 'concurrent').lower()
+    predicted_type = predicted.get('task_type', 'concurrent').lower() if 'task_type' in predicted else (
+        'sequential' if predicted.get('from') == 'sequential_results' else 'concurrent')
+    task_type_match = int(expected_type == predicted_type)
+    expected_mode = str(expected.get('mode', '')).lower()
+    actual_mode, actual_args = '', {}
+    parsed = predicted.get('parsed_response', {})
+    if isinstance(parsed, dict):
+        if 'mode' in parsed:
+            actual_mode = str(parsed['mode']).lower()
+            actual_args = {k: v for k, v in parsed.items() if k != 'mode'}
+        else:
+            for v in parsed.values():
+                if isinstance(v, dict) and 'mode' in v:
+                    actual_mode = str(v['mode']).lower()
+                    actual_args = {k: x for k, x in v.items() if k != 'mode'}
+    mode_match = int(expected_mode == actual_mode)
+    expected_args = expected.get('args', {})
+    if not expected_args and not actual_args:
+        args_match = 1
+    elif expected_args and actual_args:
+        args_match = int(all(k in actual_args and str(actual_args[k]).lower() == str(v).lower()
+                             for k, v in expected_args.items()))
+    else:
+        args_match = 0
+    return {
+        'weighted_total': 0.4 * device_match + 0.25 * mode_match + 0.25 * args_match + 0.1 * task_type_match,
+        'device_score': device_match,
+        'task_type_score': task_type_match,
+        'mode_score': mode_match,
+        'args_score': args_match,
+    }
+
+
+def reference_find_predicted_device(expected, agent_results):
+    device = expected['device'].lower()
+    for task_type in ('concurrent', 'sequential'):
+        for r in agent_results[f'{task_type}_results']:
+            if r['device_type'].lower() == device:
+                return {**r, 'task_type': task_type, 'from': f'{task_type}_results'}
+    return {'device_type': '', 'task_type': '', 'parsed_response': {}, 'from': ''}
+
+
+def reference_predicted_fields(predicted):
+    mode, args = '', {}
+    parsed = predicted.get('parsed_response', {})
+    if isinstance(parsed, dict):
+        if 'mode' in parsed:
+            mode = str(parsed['mode'])
+            args = {k: v for k, v in parsed.items() if k != 'mode'}
+        else:
+            for v in parsed.values():
+                if isinstance(v, dict) and 'mode' in v:
+                    mode = str(v['mode'])
+                    args = {k: x for k, x in v.items() if k != 'mode'}
+    return {'device': predicted.get('device_type', ''), 'task_type': predicted.get('task_type', ''), 'mode': mode, 'args': args}
+
+
+def reference_query_score(expected_devices, agent_results):
+    scores = [
+        reference_device_score(expected, reference_find_predicted_device(expected, agent_results))
+        for expected in expected_devices
+    ]
+    if not scores:
+        return dict.fromkeys(
+            ['query_weighted_total', 'query_device_score', 'query_task_type_score', 'query_mode_score', 'query_args_score'],
+            1.0,
+        )
+    def mean(key):
+        return sum(s[key] for s in scores) / len(scores)
+    return {
+        'query_weighted_total': mean('weighted_total'),
+        'query_device_score': mean('device_score'),
+        'query_task_type_score': mean('task_type_score'),
+        'query_mode_score': mean('mode_score'),
+        'query_args_score': mean('args_score'),
+    }
+
+
+def random_args(rng):
+    keys = rng.sample(sorted(ARG_VALUES), rng.randint(0, 2))
+    return {key: rng.choice(ARG_VALUES[key]) for key in keys}
+
+
+def random_query(rng):
+    expected = [
+        {
+            'device': device,
+            'execution_type': rng.choice(['concurrent', 'sequential']),
+            'mode': rng.choice(MODES),
+            'args': random_args(rng),
+        }
+        for device in rng.sample(DEVICES, rng.randint(0, 3))
+    ]
+    results = {'concurrent_results': [], 'sequential_results': []}
+    for _ in range(rng.randint(0, 4)):
+        device = rng.choice(DEVICES + [d['device'].upper() for d in expected])
+        body = {'mode': rng.choice(MODES + [m.lower() for m in MODES]), **random_args(rng)}
+        shape = rng.random()
+        if shape < 0.4:
+            parsed = body
+        elif shape < 0.8:
+            parsed = {'thought': 'x', f'room_{device.lower()}': body}
+        else:
+            parsed = rng.choice([{}, "not a dict", {'thought': 'no mode'}])
+        results[rng.choice(['concurrent_results', 'sequential_results'])].append(
+            {'device_type': device, 'parsed_response': parsed}
+        )
+    return expected, results
+
+
+@pytest.fixture(scope="module")
+def entries():
+    rng = random.Random(0)
+    return [random_query(rng) for _ in range(500)]
+
+
+def test_query_scores_match_reference(entries):
+    scored = score_results(entries)
+    for (expected, results), result in zip(entries, scored):
+        assert result['query_score'] == pytest.approx(reference_query_score(expected, results), abs=1e-12)
+
+
+def test_device_scores_match_reference(entries):
+    scored = score_results(entries)
+    for (expected, results), result in zip(entries, scored):
+        assert len(result['devices']) == len(expected)
+        for device, entry in zip(expected, result['devices']):
+            predicted = reference_find_predicted_device(device, results)
+            assert entry['score'] == pytest.approx(reference_device_score(device, predicted), abs=1e-12)
+            assert entry['predicted'] == reference_predicted_fields(predicted)
+            assert entry['actual'] == {
+                'device': device['device'],
+                'task_type': device['execution_type'],
+                'mode': device['mode'],
+                'args': device['args'],
+            }
+
+
+def test_score_frame_matches_score_results(entries):
+    _, query_scores = score_frame(entries)
+    scored = score_results(entries)
+    assert query_scores['query_weighted_total'].tolist() == pytest.approx(
+        [result['query_score']['query_weighted_total'] for result in scored]
+    )
@@ -0,0 +1,153 @@
+import asyncio
+import json
+
+from aiohttp.test_utils import TestClient, TestServer
+from ollama import ChatResponse, Message
+
+import utils.agent_prompts as agent_prompts
+from main import ASYNC_HOME_AGENT
+from server import AGENT_SERVER
+from utils.session_context import SESSION_STORE
+
+CLASSIFICATION = {
+    "thought": "Turn the TV on.",
+    "tasks": {"concurrent": [{"device": "tv", "device_name": "hall_tv", "Input": "turn on tv"}], "sequential": []},
+}
+DEVICE_RESPONSE = {"thought": "Power on.", "hall_tv": {"mode": "power", "status": "on"}}
+
+
+class STUB_LLM:
+    """Stands in for UTILS: canned classification, device and completion answers, optionally held at a gate."""
+
+    def __init__(self):
+        self.gate = None
+        self.calls = []
+
+    def create_message(self, role, content):
+        return {"role": role, "content": content}
+
+    def query_by_device(self, device):
+        return f"{device} agent"
+
+    async def chat(self, messages):
+        if self.gate is not None:
+            await self.gate.wait()
+        system = messages[0]["content"] if messages[0]["role"] == "system" else None
+        if system == agent_prompts.CLASSIFICATION_PROMPT:
+            role, content = "classification", json.dumps(CLASSIFICATION)
+        elif system is not None:
+            role, content = "device_agent", json.dumps(DEVICE_RESPONSE)
+        else:
+            role, content = "completion", "The TV is on."
+        self.calls.append(role)
+        return ChatResponse(model="stub", message=Message(role="assistant", content=content))
+
+
+def run_with_client(test, **server_options):
+    """Serve a fresh AGENT_SERVER over a stub LLM and run test(client, llm, server) against it."""
+    async def main():
+        llm = STUB_LLM()
+        agent = ASYNC_HOME_AGENT(utils_obj=llm, sessions=SESSION_STORE())
+        agent.create_simulated_dispatcher(latency=0, window=0)
+        server = AGENT_SERVER(agent, **server_options)
+        client = TestClient(TestServer(server.create_app()))
+        await client.start_server()
+        try:
+            await test(client, llm, server)
+        finally:
+            if llm.gate is not None:
+                llm.gate.set()
+            await client.close()
+
+    asyncio.run(main())
+
+
+async def wait_for_status(client, command_id, status):
+    for _ in range(200):
+        body = await (await client.get(f"/commands/{command_id}")).json()
+        if body["status"] == status:
+            return body
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"command {command_id} never reached {status}")
+
+
+def test_post_with_wait_returns_the_result():
+    async def test(client, llm, server):
+        response = await client.post("/commands?wait=1", json={"home_id": "a", "query": "turn on the tv"})
+        assert response.status == 200
+        body = await response.json()
+        assert body["status"] == "done"
+        assert body["result"]["devices"] == [{"device_name": "hall_tv", "status": "actuated"}]
+        assert body["result"]["actuations"][0]["state"]["power"] == "on"
+        assert llm.calls == ["classification", "device_agent", "completion"]
+        assert (await (await client.get(f"/commands/{body['id']}")).json())["status"] == "done"
+        # The resolved command is the home's context for its next command
+        assert server.agent.sessions.render("a").startswith("hall_tv(tv)=power[status:on]")
+
+    run_with_client(test)
+
+
+def test_post_without_wait_is_accepted_and_polled():
+    async def test(client, llm, server):
+        for url in ("/commands", "/commands?wait=0"):
+            response = await client.post(url, json={"home_id": "a", "query": "turn on the tv"})
+            assert response.status == 202
+            command_id = (await response.json())["id"]
+            await wait_for_status(client, command_id, "done")
+
+    run_with_client(test)
+
+
+def test_full_home_queue_is_rejected():
+    async def test(client, llm, server):
+        llm.gate = asyncio.Event()
+        first = await (await client.post("/commands", json={"home_id": "a", "query": "turn on the tv"})).json()
+        await wait_for_status(client, first["id"], "running")
+        second = await client.post("/commands", json={"home_id": "a", "query": "turn on the tv"})
+        assert second.status == 202
+        third = await client.post("/commands", json={"home_id": "a", "query": "turn on the tv"})
+        assert third.status == 429 and third.headers["Retry-After"] == "1"
+        assert (await third.json())["error"] == "Too many queued commands for this home"
+        llm.gate.set()
+        await wait_for_status(client, (await second.json())["id"], "done")
+
+    run_with_client(test, queue_size=1)
+
+
+def test_full_server_is_rejected():
+    async def test(client, llm, server):
+        llm.gate = asyncio.Event()
+        first = await (await client.post("/commands", json={"home_id": "a", "query": "turn on the tv"})).json()
+        await wait_for_status(client, first["id"], "running")
+        # Waiting behind the running command, so it counts against the server-wide limit
+        assert (await client.post("/commands", json={"home_id": "a", "query": "turn on the tv"})).status == 202
+        rejected = await client.post("/commands", json={"home_id": "b", "query": "turn on the tv"})
+        assert rejected.status == 429
+        assert (await rejected.json())["error"] == "Server is busy: too many queued commands"
+
+    run_with_client(test, max_queued=1)
+
+
+def test_websocket_streams_the_result():
+    async def test(client, llm, server):
+        ws = await client.ws_connect("/ws/a")
+        await ws.send_json({"query": "turn on the tv"})
+        events = []
+        while not events or events[-1]["event"] != "done":
+            events.append(await ws.receive_json(timeout=5))
+        await ws.close()
+        assert [event["event"] for event in events] == ["queued", "started", "classified", "device_result", "done"]
+        assert events[-1]["status"] == "done" and events[-1]["result"]["message"] == "Done"
+        assert events[3]["device_name"] == "hall_tv" and events[3]["status"] == "actuated"
+
+    run_with_client(test)
+
+
+def test_websocket_rejects_a_missing_query():
+    async def test(client, llm, server):
+        ws = await client.ws_connect("/ws/a")
+        await ws.send_json({"text": "turn on the tv"})
+        assert await ws.receive_json(timeout=5) == {"event": "rejected", "error": "Missing 'query'"}
+        await ws.close()
+
+    run_with_client(test)
@@ -0,0 +1,63 @@
+import asyncio
+
+from utils.session_context import MAX_TASK_CHARS, SESSION_CONTEXT, SESSION_STORE, evict_idle_periodically
+
+COOL = {"mode": "Cool", "args": {"temperature": 22}}
+TV_ON = {"mode": "power", "args": {"status": "on"}}
+
+
+def test_render_lists_device_states_oldest_first():
+    context = SESSION_CONTEXT()
+    context.record("room_ac", "ac", COOL)
+    context.record("hall_tv", "tv", TV_ON)
+    assert context.render() == "room_ac(ac)=Cool[temperature:22]; hall_tv(tv)=power[status:on]"
+
+
+def test_render_adds_the_last_resolved_tasks():
+    context = SESSION_CONTEXT(max_tasks=2)
+    context.record("hall_tv", "tv", TV_ON, "turn on tv")
+    context.record("room_ac", "ac", COOL, 'set  AC "temperature"\nto 22')
+    context.record("hall_tv", "tv", TV_ON, "turn on tv")
+    assert context.render() == (
+        "room_ac(ac)=Cool[temperature:22]; hall_tv(tv)=power[status:on]"
+        " | recent: room_ac \"set AC 'temperature' to 22\"; hall_tv \"turn on tv\""
+    )
+
+
+def test_context_size_is_bounded():
+    context = SESSION_CONTEXT(max_devices=2, max_tasks=1)
+    for idx in range(5):
+        context.record(f"fan_{idx}", "fan", {"mode": "speed", "args": {"level": "x" * 100}}, "y" * 100)
+    assert list(context.devices) == ["fan_3", "fan_4"]
+    assert len(context.tasks) == 1 and len(context.tasks[0][1]) == MAX_TASK_CHARS
+    assert len(context.devices["fan_4"][2][0][1]) == 24
+
+
+def test_store_evicts_least_recently_used_sessions():
+    store = SESSION_STORE(max_sessions=2)
+    for home_id in ("a", "b", "a", "c"):
+        store.get(home_id)
+    assert list(store.sessions) == ["a", "c"]
+    assert store.render("b") == "" and "b" not in store.sessions
+
+
+def test_evict_idle_drops_only_idle_sessions():
+    store = SESSION_STORE(idle_timeout=60)
+    store.get("old")
+    store.get("new")
+    store.sessions["old"].last_active -= 120
+    assert store.evict_idle() == 1
+    assert list(store.sessions) == ["new"]
+
+
+def test_periodic_eviction():
+    store = SESSION_STORE(idle_timeout=0.05)
+    store.get("a")
+
+    async def run():
+        sweep = asyncio.create_task(evict_idle_periodically(store, interval=0.02))
+        await asyncio.sleep(0.2)
+        sweep.cancel()
+
+    asyncio.run(run())
+    assert not store.sessions
@@ -295,6 +295,8 @@ Rules:
 2. Explain device choices and grouping logic in "thought"
 3. Return only JSON with English
 4. Group sequential/concurrent based on dependencies
+5. If a "Context" line lists recently used devices (and, after "recent:", the last tasks sent to them), use it only to resolve follow-ups that do not name a device (e.g. "now make it colder" refers to the AC in Context)
+6. The "Language" line is the language and script the Input was detected to be written in (e.g. "Tamil (Tamil Script)", "Romanised Hindi/Urdu (Latin)"). Read the Input in that language and write every task "Input" in English. It is a guess: if it does not match the Input, ignore it
 """
 
 FRIDGE_PROMPT = """You are a Samsung refrigerator control parser. Parse user commands and generate valid JSON to control the refrigerator. If the command is unclear, default to AIRefrigeration. Always return valid JSON.
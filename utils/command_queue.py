@@ -0,0 +1,188 @@
+# command_queue.py
+import json
+import logging
+import sqlite3
+import time
+import uuid
+import zlib
+
+FINISHED_STATUSES = ("done", "error", "expired", "timed_out")
+
+
+def home_slot(home_id, workers):
+    """Worker slot that serves a home; stable across restarts so a home keeps its session context."""
+    return zlib.crc32(home_id.encode("utf-8")) % workers
+
+
+class DURABLE_COMMAND_QUEUE:
+    def __init__(self, path, workers=1, max_attempts=3, busy_timeout=0.25):
+        """
+        Command queue kept in an SQLite file (WAL mode) shared by the intake and worker processes.
+
+        A command stays in the table from submission until it finishes, so a worker that
+        crashes mid-command loses nothing: its running commands are put back in the queue.
+
+        Args:
+            path (str): SQLite database file. Created if missing.
+            workers (int): Number of worker slots homes are spread over.
+            max_attempts (int): Claims allowed per command; one that keeps crashing workers is failed.
+            busy_timeout (float): Seconds a write waits for another process's lock before raising
+                                  sqlite3.OperationalError. Calls run on the event loop, so this
+                                  bounds how long a locked database can stall it.
+        """
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.logger = logging.getLogger(__name__)
+        self.connection = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(
+            "CREATE TABLE IF NOT EXISTS commands ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " id TEXT UNIQUE NOT NULL,"
+            " home_id TEXT NOT NULL,"
+            " query TEXT NOT NULL,"
+            " slot INTEGER NOT NULL,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " result TEXT,"
+            " submitted_at REAL NOT NULL,"
+            " deadline REAL,"
+            " claimed_at REAL,"
+            " finished_at REAL);"
+            "CREATE INDEX IF NOT EXISTS commands_slot_status ON commands (slot, status, seq);"
+            "CREATE INDEX IF NOT EXISTS commands_home_status ON commands (home_id, status);"
+        )
+
+    def submit(self, home_id, query, deadline=None):
+        command_id = uuid.uuid4().hex
+        self.connection.execute(
+            "INSERT INTO commands (id, home_id, query, slot, status, submitted_at, deadline)"
+            " VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+            (command_id, home_id, query, home_slot(home_id, self.workers), time.time(), deadline),
+        )
+        return self.get(command_id)
+
+    def claim(self, slot):
+        """
+        Mark the oldest runnable command of a slot as running and return it, or None.
+
+        A home with a command already running is skipped, so each home's commands run one
+        at a time and in submission order. Also returns None while another process holds the
+        write lock, so the caller polls again instead of waiting on it.
+        """
+        try:
+            self.connection.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError:
+            return None
+        try:
+            row = self.connection.execute(
+                "SELECT id FROM commands WHERE slot = ? AND status = 'queued' AND home_id NOT IN"
+                " (SELECT home_id FROM commands WHERE slot = ? AND status = 'running')"
+                " ORDER BY seq LIMIT 1",
+                (slot, slot),
+            ).fetchone()
+            if row is not None:
+                self.connection.execute(
+                    "UPDATE commands SET status = 'running', claimed_at = ?, attempts = attempts + 1 WHERE id = ?",
+                    (time.time(), row["id"]),
+                )
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+        return self.get(row["id"]) if row is not None else None
+
+    def reassign_slots(self):
+        """
+        Move queued commands to the slot of their home under the current worker count; returns
+        how many moved. Run at startup, so commands queued before a restart with a different
+        --workers are neither stranded on a slot that no longer exists nor split from their home.
+        """
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            homes = self.connection.execute(
+                "SELECT DISTINCT home_id, slot FROM commands WHERE status = 'queued'"
+            ).fetchall()
+            moved = 0
+            for row in homes:
+                slot = home_slot(row["home_id"], self.workers)
+                if slot != row["slot"]:
+                    moved += self.connection.execute(
+                        "UPDATE commands SET slot = ? WHERE home_id = ? AND status = 'queued'", (slot, row["home_id"])
+                    ).rowcount
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+        return moved
+
+    def finish(self, command_id, status, result):
+        self.connection.execute(
+            "UPDATE commands SET status = ?, result = ?, finished_at = ? WHERE id = ?",
+            (status, json.dumps(result, ensure_ascii=False, default=str), time.time(), command_id),
+        )
+
+    def requeue_running(self, slot=None):
+        """
+        Put running commands back in the queue after their worker died; returns how many.
+
+        Commands that have already used max_attempts claims are failed instead.
+        """
+        where, params = ("status = 'running'", ()) if slot is None else ("status = 'running' AND slot = ?", (slot,))
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            failed = self.connection.execute(
+                f"UPDATE commands SET status = 'error', result = ?, finished_at = ? WHERE {where} AND attempts >= ?",
+                (json.dumps({"status": "error", "message": "Command failed repeatedly and was abandoned."}),
+                 time.time(), *params, self.max_attempts),
+            ).rowcount
+            requeued = self.connection.execute(
+                f"UPDATE commands SET status = 'queued', claimed_at = NULL WHERE {where}", params
+            ).rowcount
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+        if failed:
+            self.logger.error(f"Abandoned {failed} command(s) after {self.max_attempts} attempts")
+        return requeued
+
+    def get(self, command_id):
+        row = self.connection.execute("SELECT * FROM commands WHERE id = ?", (command_id,)).fetchone()
+        if row is None:
+            return None
+        command = dict(row)
+        command.pop("seq")
+        command["result"] = json.loads(command["result"]) if command["result"] else None
+        return command
+
+    def queued(self, home_id=None):
+        if home_id is None:
+            return self.connection.execute("SELECT COUNT(*) FROM commands WHERE status = 'queued'").fetchone()[0]
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM commands WHERE status = 'queued' AND home_id = ?", (home_id,)
+        ).fetchone()[0]
+
+    def purge(self, keep=1000):
+        """Delete all but the `keep` most recent finished commands."""
+        placeholders = ",".join("?" for _ in FINISHED_STATUSES)
+        self.connection.execute(
+            f"DELETE FROM commands WHERE status IN ({placeholders}) AND seq NOT IN"
+            f" (SELECT seq FROM commands WHERE status IN ({placeholders}) ORDER BY seq DESC LIMIT ?)",
+            (*FINISHED_STATUSES, *FINISHED_STATUSES, keep),
+        )
+
+    def metrics(self):
+        rows = self.connection.execute(
+            "SELECT slot, status, COUNT(*) AS n FROM commands GROUP BY slot, status"
+        ).fetchall()
+        by_status = {}
+        by_slot = {}
+        for row in rows:
+            by_status[row["status"]] = by_status.get(row["status"], 0) + row["n"]
+            if row["status"] in ("queued", "running"):
+                by_slot.setdefault(row["slot"], {})[row["status"]] = row["n"]
+        return {"by_status": by_status, "active_by_worker": by_slot}
@@ -0,0 +1,272 @@
+# comparison.py
+import hashlib
+
+import numpy as np
+
+QUERY_METRICS = (
+    "query_weighted_total", "query_device_score", "query_task_type_score", "query_mode_score", "query_args_score"
+)
+DEVICE_METRICS = ("weighted_total", "device_score", "task_type_score", "mode_score", "args_score")
+# Metric the gate decides on; the components are reported alongside
+GATE_METRIC = 0
+
+
+def query_keys(report):
+    """Join key per query of a report: a hash of its text, numbered when the text repeats."""
+    seen, keys = {}, []
+    for entry in report["query_scores"]:
+        digest = hashlib.sha1(entry["query"].encode("utf-8")).hexdigest()[:16]
+        seen[digest] = seen.get(digest, 0) + 1
+        keys.append(digest if seen[digest] == 1 else f"{digest}-{seen[digest]}")
+    return keys
+
+
+def paired_arrays(baseline, candidates):
+    """
+    Scores of the baseline and every candidate aligned on the baseline's queries and devices.
+
+    Returns:
+        dict with query-level 'base' (n x metrics), 'candidate' (runs x n x metrics), 'mask'
+        (runs x n, True where the candidate has the query) and 'language' per query; the same
+        at device level under 'device_*', with 'device_query' (the query of each device row)
+        and 'device_name'; and 'unmatched', the candidate queries not in the baseline.
+    """
+    base_entries = baseline["query_scores"]
+    position = {key: idx for idx, key in enumerate(query_keys(baseline))}
+    n, runs = len(base_entries), len(candidates)
+    arrays = {
+        "base": np.array([[e["query_score"][m] for m in QUERY_METRICS] for e in base_entries], dtype=np.float64)
+        .reshape(n, len(QUERY_METRICS)),
+        "candidate": np.zeros((runs, n, len(QUERY_METRICS))),
+        "mask": np.zeros((runs, n), dtype=bool),
+        "language": np.array([e.get("language") or "Unknown" for e in base_entries], dtype=object),
+        "unmatched": [0] * runs,
+    }
+    device_rows, device_position = [], {}
+    for idx, entry in enumerate(base_entries):
+        for slot, device in enumerate(entry["devices"]):
+            device_position[(idx, slot)] = len(device_rows)
+            device_rows.append((idx, str(device["actual"]["device"]).lower(), device["score"]))
+    n_devices = len(device_rows)
+    arrays["device_query"] = np.array([row[0] for row in device_rows], dtype=np.int64)
+    arrays["device_name"] = np.array([row[1] for row in device_rows], dtype=object)
+    arrays["device_base"] = np.array(
+        [[row[2][m] for m in DEVICE_METRICS] for row in device_rows], dtype=np.float64
+    ).reshape(n_devices, len(DEVICE_METRICS))
+    arrays["device_candidate"] = np.zeros((runs, n_devices, len(DEVICE_METRICS)))
+    arrays["device_mask"] = np.zeros((runs, n_devices), dtype=bool)
+
+    for run, candidate in enumerate(candidates):
+        for key, entry in zip(query_keys(candidate), candidate["query_scores"]):
+            idx = position.get(key)
+            if idx is None:
+                arrays["unmatched"][run] += 1
+                continue
+            arrays["mask"][run, idx] = True
+            arrays["candidate"][run, idx] = [entry["query_score"][m] for m in QUERY_METRICS]
+            for slot, device in enumerate(entry["devices"]):
+                row = device_position.get((idx, slot))
+                # Same query, so the same expected devices in the same order
+                if row is not None and str(device["actual"]["device"]).lower() == arrays["device_name"][row]:
+                    arrays["device_mask"][run, row] = True
+                    arrays["device_candidate"][run, row] = [device["score"][m] for m in DEVICE_METRICS]
+    return arrays
+
+
+def weighted_totals(weights, values, mask):
+    """
+    Weighted sums of every run and metric at once, as one matrix product.
+
+    Args:
+        weights (np.ndarray): resamples x rows.
+        values (np.ndarray): runs x rows x metrics.
+        mask (np.ndarray): runs x rows; rows outside it do not count.
+
+    Returns:
+        runs x resamples x metrics.
+    """
+    runs, rows, metrics = values.shape
+    flat = np.where(mask[..., None], values, 0.0).transpose(1, 0, 2).reshape(rows, runs * metrics)
+    return (weights @ flat).reshape(len(weights), runs, metrics).transpose(1, 0, 2)
+
+
+def holm(p_values):
+    """Holm-adjusted p-values (None stays None)."""
+    indexed = sorted((p, idx) for idx, p in enumerate(p_values) if p is not None)
+    adjusted, running = list(p_values), 0.0
+    for rank, (p, idx) in enumerate(indexed):
+        running = max(running, min(1.0, (len(indexed) - rank) * p))
+        adjusted[idx] = running
+    return adjusted
+
+
+class PAIRED_COMPARISON:
+    def __init__(self, resamples=10000, alpha=0.05, margin=0.0, seed=0):
+        """
+        Paired bootstrap and sign-flip permutation tests of candidate reports against a baseline.
+
+        Differences are candidate minus baseline per paired query (or device). The bootstrap
+        gives a confidence interval of the mean difference; randomly flipping the sign of each
+        query's difference gives the two-sided permutation p-value. Devices are resampled and
+        flipped together with their query. The same resamples serve every candidate, metric
+        and group, so they are evaluated as a few matrix products.
+
+        Args:
+            resamples (int): Bootstrap and permutation resamples.
+            alpha (float): Significance level; intervals are 1 - alpha.
+            margin (float): Differences smaller than this are not called better or worse.
+            seed (int): Seed of the resamples.
+        """
+        self.resamples = resamples
+        self.alpha = alpha
+        self.margin = margin
+        self.seed = seed
+
+    def resampling_weights(self, clusters, n_clusters):
+        """Bootstrap counts and random signs per row (resamples x rows), shared by the rows of a cluster."""
+        rng = np.random.default_rng(self.seed)
+        boot = rng.multinomial(n_clusters, np.full(n_clusters, 1.0 / n_clusters), size=self.resamples)
+        flips = rng.choice(np.array([-1.0, 1.0]), size=(self.resamples, n_clusters))
+        return boot[:, clusters].astype(np.float64), flips[:, clusters]
+
+    def tests(self, differences, mask, boot, flips):
+        """Observed mean differences, bootstrap intervals and permutation p-values: runs x metrics each."""
+        counts = mask.sum(axis=1).astype(np.float64)[:, None]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            observed = np.where(mask[..., None], differences, 0.0).sum(axis=1) / counts
+            boot_counts = (boot @ mask.T.astype(np.float64)).T
+            boot_means = weighted_totals(boot, differences, mask) / boot_counts[..., None]
+            flipped = weighted_totals(flips, differences, mask) / counts[:, None, :]
+            low, high = np.nanpercentile(boot_means, [100 * self.alpha / 2, 100 * (1 - self.alpha / 2)], axis=1)
+        extreme = (np.abs(flipped) >= np.abs(observed)[:, None, :] - 1e-12).sum(axis=1)
+        p_values = (extreme + 1) / (self.resamples + 1)
+        return observed, low, high, p_values
+
+    def outcome(self, difference, p_value):
+        if p_value is None or p_value >= self.alpha:
+            return "no_clear_difference"
+        if difference > self.margin:
+            return "better"
+        if difference < -self.margin:
+            return "worse"
+        return "no_clear_difference"
+
+    def describe(self, base_mean, candidate_mean, difference, low, high, p_value, count):
+        tested = count > 1
+        return {
+            "baseline": round(float(base_mean), 6),
+            "candidate": round(float(candidate_mean), 6),
+            "difference": round(float(difference), 6),
+            "ci_low": round(float(low), 6) if tested else None,
+            "ci_high": round(float(high), 6) if tested else None,
+            "p_value": round(float(p_value), 6) if tested else None,
+        }
+
+    def scope(self, base, candidate, mask, clusters, n_clusters, groups, metrics):
+        """
+        Tests over all rows and per group; returns runs x {group: {metric: result}}, with
+        group None for all rows. Each result also carries 'rows' (paired rows).
+        """
+        runs = candidate.shape[0]
+        results = [{} for _ in range(runs)]
+        boot, flips = self.resampling_weights(clusters, n_clusters)
+        differences = candidate - base[None, :, :]
+        for label in [None] + sorted(set(groups)):
+            # Only the group's rows enter the products
+            rows = np.arange(len(groups)) if label is None else np.flatnonzero(groups == label)
+            group_mask = mask[:, rows]
+            observed, low, high, p_values = self.tests(
+                differences[:, rows], group_mask, boot[:, rows], flips[:, rows]
+            )
+            counts = group_mask.sum(axis=1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                base_means = (group_mask[..., None] * base[None, rows]).sum(axis=1) / counts[:, None]
+                candidate_means = np.where(group_mask[..., None], candidate[:, rows], 0.0).sum(axis=1) / counts[:, None]
+            for run in range(runs):
+                if not counts[run]:
+                    continue
+                results[run][label] = {
+                    metric: self.describe(
+                        base_means[run, m], candidate_means[run, m], observed[run, m], low[run, m], high[run, m],
+                        p_values[run, m], counts[run]
+                    )
+                    for m, metric in enumerate(metrics)
+                }
+                results[run][label]["rows"] = int(counts[run])
+        return results
+
+    def compare(self, baseline, candidates, names=None, require_improvement=False):
+        """
+        Compare candidate reports with a baseline report and decide whether each may replace it.
+
+        A candidate fails when its weighted_total is significantly worse than the baseline's
+        overall, or in any language or device after Holm correction over those groups. With
+        `require_improvement` it must also be significantly better overall. Component scores
+        are reported but do not decide.
+
+        Returns:
+            A JSON-serialisable dict with the settings, one entry per candidate (overall,
+            by_language and by_device results, regressions and verdict) and an overall 'verdict'
+            that is 'pass' only if every candidate passes.
+        """
+        names = names or [f"candidate_{idx}" for idx in range(len(candidates))]
+        arrays = paired_arrays(baseline, candidates)
+        n_queries = len(arrays["base"])
+        query_results = self.scope(
+            arrays["base"], arrays["candidate"], arrays["mask"], np.arange(n_queries), n_queries,
+            arrays["language"], QUERY_METRICS
+        )
+        device_results = self.scope(
+            arrays["device_base"], arrays["device_candidate"], arrays["device_mask"], arrays["device_query"],
+            n_queries, arrays["device_name"], DEVICE_METRICS
+        )
+        comparisons = []
+        for run, name in enumerate(names):
+            overall = query_results[run].get(None)
+            if overall is None:
+                comparisons.append({
+                    "candidate": name, "paired_queries": 0, "unmatched_queries": arrays["unmatched"][run],
+                    "verdict": "fail", "reasons": ["no query in common with the baseline"],
+                })
+                continue
+            by_language = {label: result for label, result in query_results[run].items() if label is not None}
+            by_device = {label: result for label, result in device_results[run].items() if label is not None}
+            comparison = {
+                "candidate": name,
+                "paired_queries": overall["rows"],
+                "unmatched_queries": arrays["unmatched"][run],
+                "overall": {metric: overall[metric] for metric in QUERY_METRICS},
+            }
+            # Per-group calls on the gate metric, corrected for testing every group
+            gated = [("language", label, result[QUERY_METRICS[GATE_METRIC]]) for label, result in by_language.items()]
+            gated += [("device", label, result[DEVICE_METRICS[GATE_METRIC]]) for label, result in by_device.items()]
+            adjusted = holm([result["p_value"] for _, _, result in gated])
+            for (_, _, result), p_value in zip(gated, adjusted):
+                result["p_adjusted"] = round(p_value, 6) if p_value is not None else None
+                result["outcome"] = self.outcome(result["difference"], p_value)
+            for metric, result in comparison["overall"].items():
+                result["outcome"] = self.outcome(result["difference"], result["p_value"])
+            comparison["by_language"] = by_language
+            comparison["by_device"] = by_device
+
+            headline = comparison["overall"][QUERY_METRICS[GATE_METRIC]]
+            regressions = [f"{kind} {label}" for kind, label, result in gated if result["outcome"] == "worse"]
+            reasons = []
+            if headline["outcome"] == "worse":
+                reasons.append(f"weighted_total is worse overall ({headline['difference']:+.4f}, p={headline['p_value']})")
+            if regressions:
+                reasons.append(f"weighted_total is worse for {', '.join(regressions)}")
+            if require_improvement and headline["outcome"] != "better":
+                reasons.append("weighted_total is not clearly better overall")
+            comparison["regressions"] = regressions
+            comparison["verdict"] = "fail" if reasons else "pass"
+            comparison["reasons"] = reasons
+            comparisons.append(comparison)
+        return {
+            "settings": {
+                "resamples": self.resamples, "alpha": self.alpha, "margin": self.margin, "seed": self.seed,
+                "require_improvement": require_improvement,
+            },
+            "comparisons": comparisons,
+            "verdict": "pass" if all(c["verdict"] == "pass" for c in comparisons) else "fail",
+        }
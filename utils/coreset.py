@@ -0,0 +1,214 @@
+# coreset.py
+import random
+
+import numpy as np
+
+
+def language_script(label):
+    """'Romanised Kannada (Latin)' -> ('Romanised Kannada', 'Latin')"""
+    name, _, script = str(label).partition(' (')
+    return name, script.rstrip(')') or 'Unknown'
+
+
+def row_features(rows):
+    """
+    Categories of each dataset row a coreset should keep in proportion.
+
+    Args:
+        rows (list): Dataset rows with 'language' and parsed 'expected_devices'.
+
+    Returns:
+        dict of feature -> one set of labels per row (devices and modes can take several).
+    """
+    features = {'script': [], 'device_count': [], 'task_type': [], 'device': [], 'mode': []}
+    for row in rows:
+        devices = row['expected_devices']
+        features['script'].append({language_script(row['language'])[1]})
+        features['device_count'].append({str(len(devices))})
+        features['task_type'].append({'/'.join(sorted({str(d.get('task_type')) for d in devices}))})
+        features['device'].append({d.get('device', '') for d in devices})
+        features['mode'].append({f"{d.get('device', '')}:{str(d.get('mode', '')).lower()}" for d in devices})
+    return features
+
+
+def indicator_columns(features):
+    """0/1 matrix with a column per (feature, label) and the feature of each column."""
+    columns, groups = [], []
+    for feature, labels in features.items():
+        for label in sorted(set().union(*labels)):
+            columns.append([label in row_labels for row_labels in labels])
+            groups.append(feature)
+    rows = len(next(iter(features.values())))
+    matrix = np.asarray(columns, dtype=np.float64).T if columns else np.zeros((rows, 0))
+    return matrix, groups
+
+
+def allocate(strata, size):
+    """Rows per stratum for a sample of `size`, proportional to stratum size (largest remainder)."""
+    counts = {}
+    for stratum in strata:
+        counts[stratum] = counts.get(stratum, 0) + 1
+    total = len(strata)
+    exact = {stratum: size * n / total for stratum, n in counts.items()}
+    quotas = {stratum: int(share) for stratum, share in exact.items()}
+    by_remainder = sorted(exact, key=lambda stratum: (exact[stratum] - quotas[stratum], counts[stratum]), reverse=True)
+    for stratum in by_remainder[:size - sum(quotas.values())]:
+        quotas[stratum] += 1
+    return quotas
+
+
+def kendall_tau(a, b):
+    """Kendall rank correlation of two equally long sequences (tau-a; ties count as neither)."""
+    n, concordant = len(a), 0
+    for i in range(n):
+        for j in range(i + 1, n):
+            concordant += np.sign(a[i] - a[j]) * np.sign(b[i] - b[j])
+    return float(concordant / (n * (n - 1) / 2)) if n > 1 else 1.0
+
+
+class CORESET_SELECTOR:
+    def __init__(self, strata, features, scores, balance_weight=1.0):
+        """
+        Picks a fixed-size subset of rows whose per-model mean scores and category shares
+        match those of the whole dataset.
+
+        Rows are drawn per stratum in proportion to its size. Within that, a local search swaps
+        rows for others of the same stratum while it lowers the mismatch: the squared error of
+        every model's mean score and of every category's share, each divided by the error a
+        random subset of that size would have, so both kinds of column weigh alike.
+
+        Args:
+            strata (list): Stratum per row (e.g. language); kept exactly proportional.
+            features (dict): Per-row label sets to keep in proportion (see row_features).
+            scores (np.ndarray): rows x models historical scores.
+            balance_weight (float): Weight of the category shares relative to the scores.
+        """
+        self.strata = list(strata)
+        indicators, _ = indicator_columns(features)
+        scores = np.asarray(scores, dtype=np.float64)
+        self.n_models = scores.shape[1]
+        matrix = np.hstack([scores, indicators])
+        target = matrix.mean(axis=0)
+        variance = matrix.var(axis=0)
+        # Columns every row (or none) shares carry no information
+        keep = variance > 1e-12
+        weights = np.where(np.arange(matrix.shape[1]) < self.n_models, 1.0 / max(self.n_models, 1), 0.0)
+        n_indicators = int(keep[self.n_models:].sum())
+        weights[self.n_models:] = balance_weight / max(n_indicators, 1)
+        self.matrix = matrix[:, keep]
+        self.target = target[keep]
+        self.weights = (weights / np.where(variance > 0, variance, 1.0))[keep]
+        self.members = {}
+        for idx, stratum in enumerate(self.strata):
+            self.members.setdefault(stratum, []).append(idx)
+
+    def loss(self, sums, size):
+        """Mismatch of a subset from its column sums, in units of a random subset's expected mismatch."""
+        return float(size * (self.weights * (sums / size - self.target) ** 2).sum())
+
+    def local_search(self, chosen, max_passes=50):
+        chosen = list(chosen)
+        size = len(chosen)
+        sums = self.matrix[chosen].sum(axis=0)
+        current = self.loss(sums, size)
+        for _ in range(max_passes):
+            improved = False
+            for position, idx in enumerate(chosen):
+                in_set = set(chosen)
+                candidates = [j for j in self.members[self.strata[idx]] if j not in in_set]
+                if not candidates:
+                    continue
+                swapped = sums - self.matrix[idx] + self.matrix[candidates]
+                losses = size * ((swapped / size - self.target) ** 2 * self.weights).sum(axis=1)
+                best = int(np.argmin(losses))
+                if losses[best] < current - 1e-12:
+                    sums, current = swapped[best], float(losses[best])
+                    chosen[position] = candidates[best]
+                    improved = True
+            if not improved:
+                break
+        return chosen, current
+
+    def random_subset(self, quotas, rng):
+        chosen = []
+        for stratum, quota in quotas.items():
+            chosen.extend(rng.sample(self.members[stratum], quota))
+        return chosen
+
+    def select(self, size, seed=0, restarts=20):
+        """
+        Row indices of the best subset found over `restarts` random stratified starts.
+
+        Returns:
+            (indices sorted by row, loss)
+        """
+        quotas = allocate(self.strata, size)
+        rng = random.Random(seed)
+        best, best_loss = None, None
+        for _ in range(restarts):
+            chosen, loss = self.local_search(self.random_subset(quotas, rng))
+            if best_loss is None or loss < best_loss:
+                best, best_loss = chosen, loss
+        return sorted(best), best_loss
+
+
+def subset_fit(scores, chosen, models):
+    """How well a subset's per-model means track the full dataset's: errors and rank agreement."""
+    scores = np.asarray(scores, dtype=np.float64)
+    full, subset = scores.mean(axis=0), scores[chosen].mean(axis=0)
+    errors = np.abs(subset - full)
+    return {
+        'models': {
+            model: {'full': round(float(f), 6), 'subset': round(float(s), 6)}
+            for model, f, s in zip(models, full, subset)
+        },
+        'kendall_tau': round(kendall_tau(full, subset), 4),
+        'mean_abs_error': round(float(errors.mean()), 6),
+        'max_abs_error': round(float(errors.max()), 6),
+    }
+
+
+def held_out_fit(strata, features, scores, size, seed=0, restarts=20, balance_weight=1.0):
+    """
+    Leave-one-model-out check of how a coreset generalises to a model it was not fitted to.
+
+    For each model, a coreset is selected from the other models' scores; the held-out model's
+    error, and how often its order against each other model matches the full dataset, are
+    measured on that coreset.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    n_models = scores.shape[1]
+    full = scores.mean(axis=0)
+    errors, agreements = [], []
+    for held_out in range(n_models):
+        others = [m for m in range(n_models) if m != held_out]
+        selector = CORESET_SELECTOR(strata, features, scores[:, others], balance_weight)
+        chosen, _ = selector.select(size, seed, restarts)
+        subset = scores[chosen].mean(axis=0)
+        errors.append(abs(subset[held_out] - full[held_out]))
+        agreements.extend(
+            np.sign(subset[held_out] - subset[m]) == np.sign(full[held_out] - full[m]) for m in others
+        )
+    return {
+        'mean_abs_error': round(float(np.mean(errors)), 6),
+        'max_abs_error': round(float(np.max(errors)), 6),
+        'pair_agreement': round(float(np.mean(agreements)), 4),
+    }
+
+
+def random_baseline(strata, scores, size, models, samples=200, seed=0):
+    """Median fit of plain stratified random subsets of the same size, for comparison."""
+    selector_members = {}
+    for idx, stratum in enumerate(strata):
+        selector_members.setdefault(stratum, []).append(idx)
+    quotas = allocate(strata, size)
+    rng = random.Random(seed)
+    fits = []
+    for _ in range(samples):
+        chosen = [idx for stratum, quota in quotas.items() for idx in rng.sample(selector_members[stratum], quota)]
+        fits.append(subset_fit(scores, chosen, models))
+    return {
+        'samples': samples,
+        'median_kendall_tau': round(float(np.median([fit['kendall_tau'] for fit in fits])), 4),
+        'median_max_abs_error': round(float(np.median([fit['max_abs_error'] for fit in fits])), 6),
+    }
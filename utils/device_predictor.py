@@ -0,0 +1,108 @@
+# device_predictor.py
+import json
+import os
+import re
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+
+# Names users give each device type, in English, romanised and native scripts. Words shared
+# by two device types (e.g. "laundry" for washer and dryer) are left out on purpose: a
+# wrong guess only costs a cancelled speculative call, a missing one costs nothing.
+DEVICE_ALIASES = {
+    "tv": ["tv", "television", "entertainment", "टीवी", "टेलीविजन", "ਟੀਵੀ", "টিভি", "ટીવી", "டிவி", "టీవీ",
+           "ಟಿವಿ", "ടിവി", "ٹی وی", "ٹیوی"],
+    "ac": ["ac", "a/c", "air conditioner", "aircon", "cooling", "एसी", "ਏਸੀ", "এসি", "એસી", "ஏசி", "ఏసీ",
+           "ಎಸಿ", "എസി", "اے سی"],
+    "fan": ["fan", "pankha", "pankhe", "pankho", "पंखा", "पंखे", "ਪੱਖਾ", "ਪੱਖੇ", "পাখা", "ফ্যান", "પંખો",
+            "પંખા", "ફેન", "விசிறி", "ఫ్యాన్", "ಫ್ಯಾನ್", "ഫാൻ", "پنکھا", "فین"],
+    "fridge": ["fridge", "refrigerator", "फ्रिज", "फ़्रिज", "ਫਰਿੱਜ", "ফ্রিজ", "ફ્રીજ", "ફ્રિજ", "ஃப்ரிட்ஜ்",
+               "ఫ్రిడ్జ్", "ಫ್ರಿಜ್", "ഫ്രിഡ്ജ്", "فریج"],
+    "washer": ["washer", "washing machine", "वॉशर", "वाशिंग मशीन", "ਵਾਸ਼ਰ", "ওয়াশার", "વોશર", "வாஷர்",
+               "వాషర్", "ವಾಷರ್", "വാഷർ", "واشر"],
+    "dryer": ["dryer", "drier", "ड्रायर", "ਡਰਾਇਰ", "ড্রায়ার", "ડ્રાયર", "ட்ரையர்", "డ్రైయర్", "ಡ್ರೈಯರ್", "ഡ്രയർ",
+              "ڈرائر"],
+    "microwave": ["microwave", "oven", "माइक्रोवेव", "ਮਾਈਕ੍ਰੋਵੇਵ", "মাইক্রোওয়েভ", "માઇક્રોવેવ", "மைக்ரோவேவ்",
+                  "మైక్రోవేవ్", "ಮೈಕ್ರೋವೇವ್", "മൈക്രോവേവ്", "مائیکروویو"],
+}
+
+MIN_MODE_KEYWORD = 6
+
+
+def split_camel_case(name):
+    """'IceMaker' -> 'ice maker', 'AIRefrigeration' -> 'ai refrigeration'."""
+    return re.sub(r"(?<=[a-z])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])", " ", name).lower()
+
+
+def alias_pattern(alias):
+    """Latin aliases match at a word start (short ones as whole words); other scripts match anywhere."""
+    if not alias.isascii():
+        return re.escape(alias)
+    if len(alias) <= 3:
+        return r"(?<![a-z0-9])" + re.escape(alias) + r"(?![a-z0-9])"
+    return r"(?<![a-z0-9])" + re.escape(alias)
+
+
+class DEVICE_PREDICTOR:
+    def __init__(self, dict_devices, device_functions_dict=None):
+        """
+        Cheap local guess of the devices a command addresses, used to start device agents early.
+
+        Matches device aliases plus mode names that belong to a single device type in
+        device_functions_dict (e.g. "IceMaker" -> fridge).
+
+        Args:
+            dict_devices (dict): Device instance name -> device type, as in ASYNC_HOME_AGENT.
+            device_functions_dict (dict, optional): Device type -> list of modes. Defaults to
+                                                    the one in utils/config.json.
+        """
+        if device_functions_dict is None:
+            with open(CONFIG_PATH, encoding="utf-8") as f:
+                device_functions_dict = json.load(f)["device_functions_dict"]
+        self.dict_devices = dict(dict_devices)
+
+        keywords = {device: set(aliases) for device, aliases in DEVICE_ALIASES.items()}
+        all_aliases = {alias for aliases in DEVICE_ALIASES.values() for alias in aliases if alias.isascii()}
+        mode_owners = {}
+        for device, modes in device_functions_dict.items():
+            for mode in modes:
+                for keyword in {mode["mode"].lower(), split_camel_case(mode["mode"])}:
+                    mode_owners.setdefault(keyword, set()).add(device)
+        for keyword, owners in mode_owners.items():
+            # Skip short, shared and alias-bearing modes ("FanSpeed" is an AC mode, not the fan)
+            if len(owners) == 1 and len(keyword) >= MIN_MODE_KEYWORD and not any(
+                re.search(alias_pattern(alias), keyword) for alias in all_aliases
+            ):
+                keywords.setdefault(next(iter(owners)), set()).add(keyword)
+
+        self.patterns = {
+            device: re.compile("|".join(sorted((alias_pattern(k) for k in words), key=len, reverse=True)))
+            for device, words in keywords.items()
+        }
+        self.instances = {}
+        for device_name, device in self.dict_devices.items():
+            self.instances.setdefault(device, []).append(device_name)
+
+    def predict_types(self, query):
+        """Device types mentioned in the query."""
+        text = query.lower()
+        return {device for device, pattern in self.patterns.items() if pattern.search(text)}
+
+    def predict(self, query):
+        """
+        Guess the device instances a query addresses.
+
+        Returns:
+            A dict of device instance name -> device type, or None when nothing matched or a
+            matched type has several instances and the query does not say which one.
+        """
+        text = query.lower()
+        predicted = {}
+        for device in self.predict_types(query):
+            candidates = self.instances.get(device, [])
+            if len(candidates) > 1:
+                # Pick the instance whose location (e.g. "dining" in "dining_fan") is named
+                candidates = [name for name in candidates if name.rsplit("_", 1)[0] in text]
+            if len(candidates) != 1:
+                return None
+            predicted[candidates[0]] = device
+        return predicted or None
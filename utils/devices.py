@@ -0,0 +1,307 @@
+# devices.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from utils.scheduler import current_home_id
+
+POWER_MODES = ("power",)
+POWER_ARGS = ("status", "state")
+# Modes that switch power by themselves, as the AC's PowerOn/PowerOff in config.json
+POWER_SWITCH_MODES = {"poweron": "on", "poweroff": "off"}
+# "up"/"down" step by one; with a level they set it, as in TV_PROMPT's "Increase volume to 25"
+STEP_DIRECTIONS = {"up": 1, "down": -1}
+BY_DIRECTIONS = {"increase by": 1, "decrease by": -1}
+
+
+def extract_device_command(parsed_response):
+    """
+    Pull the {"mode": ..., "args": {...}} command out of a parsed device-agent response.
+
+    Device agents answer {"thought": ..., "<device_name>": {"mode": "X", "arg": val}}; the
+    mode may also sit at the top level. Returns None when no mode is present.
+    """
+    if not isinstance(parsed_response, dict):
+        return None
+    body = parsed_response if "mode" in parsed_response else None
+    if body is None:
+        for value in parsed_response.values():
+            if isinstance(value, dict) and "mode" in value:
+                body = value
+                break
+    if body is None:
+        return None
+    return {"mode": str(body["mode"]), "args": {k: v for k, v in body.items() if k != "mode"}}
+
+
+def power_target(command):
+    """Return the power state ("on"/"off") a command switches the device to, or None."""
+    mode = command["mode"].lower()
+    if mode in POWER_SWITCH_MODES:
+        return POWER_SWITCH_MODES[mode]
+    if mode in POWER_MODES:
+        args = command.get("args") or {}
+        target = next((args[k] for k in POWER_ARGS if k in args), None)
+        return str(target).lower() if target is not None else None
+    return None
+
+
+def relative_step(command):
+    """
+    Return the signed step of a relative command, or None for an absolute one.
+
+    "increase by"/"decrease by" step by their level (volume decrease by 2 -> -2) and a bare
+    "up"/"down" by one; "up"/"down" with a level set that level, so they are absolute.
+    """
+    args = command.get("args") or {}
+    for key in ("direction", "action"):
+        direction = str(args.get(key, "")).lower()
+        if direction in STEP_DIRECTIONS and "level" not in args:
+            return STEP_DIRECTIONS[direction]
+        if direction in BY_DIRECTIONS:
+            try:
+                level = float(args.get("level", 1))
+            except (TypeError, ValueError):
+                level = 1
+            if float(level).is_integer():
+                level = int(level)
+            return BY_DIRECTIONS[direction] * level
+    return None
+
+
+def step_absolute(args, step):
+    """
+    Apply a relative step to an absolute setting's single numeric value ("volume 10" + up 1 ->
+    "volume 11"). Returns the new args, or None when there is no single numeric value to step.
+    """
+    numeric = [k for k, v in args.items() if isinstance(v, (int, float)) and not isinstance(v, bool)]
+    if len(numeric) != 1:
+        return None
+    key = numeric[0]
+    value = args[key] + step
+    if key == "level":
+        # Levels stop at zero, as in DEVICE_STATE_STORE.apply
+        value = max(0, value)
+    return {**args, key: value}
+
+
+def coalesce_commands(commands, current_state=None):
+    """
+    Fold a burst of commands for one device into the fewest equivalent commands.
+
+    Absolute commands keep the last value per mode, relative steps of the same mode add up
+    (three "volume up" become one "volume increase by 3", up then down cancels out), a step
+    after an absolute value of the same mode is applied to that value ("volume 10" then
+    "volume up" become "volume 11"), and power commands (power on/off, PowerOn, PowerOff)
+    keep only the last one, dropped entirely if it ends where the device already is.
+    """
+    merged = {}
+    for command in commands:
+        mode = command["mode"]
+        args = dict(command.get("args") or {})
+        step = relative_step(command)
+        # Every power command of a device overrides the previous one, whatever its mode
+        key = None if power_target(command) is not None else mode
+        previous = merged.get(key)
+        if step is None:
+            merged.pop(key, None)
+            merged[key] = {"mode": mode, "absolute": args, "step": 0, "step_args": None}
+            continue
+        if previous is None:
+            merged[key] = {"mode": mode, "absolute": None, "step": step, "step_args": args}
+            continue
+        stepped = step_absolute(previous["absolute"], step) if previous["absolute"] and not previous["step"] else None
+        if stepped is not None:
+            previous["absolute"] = stepped
+        else:
+            # No value to fold the step into: it is sent after the absolute command
+            previous["step"] += step
+            previous["step_args"] = previous["step_args"] or args
+
+    result = []
+    for entry in merged.values():
+        mode = entry["mode"]
+        if entry["absolute"] is not None:
+            command = {"mode": mode, "args": entry["absolute"]}
+            target = power_target(command)
+            if not (target is not None and current_state is not None and target == current_state.get("power")):
+                result.append(command)
+        if entry["step"]:
+            args = dict(entry["step_args"])
+            key = "direction" if "direction" in args else "action"
+            if abs(entry["step"]) == 1:
+                args[key] = "up" if entry["step"] > 0 else "down"
+                args.pop("level", None)
+            else:
+                args[key] = "increase by" if entry["step"] > 0 else "decrease by"
+                args["level"] = abs(entry["step"])
+            result.append({"mode": mode, "args": args})
+    return result
+
+
+class DEVICE_STATE_STORE:
+    def __init__(self, dict_devices, max_homes=10000):
+        """
+        In-memory state of every device instance, kept separately for each home.
+
+        Args:
+            dict_devices (dict): Device instance name -> device type, as in ASYNC_HOME_AGENT.
+            max_homes (int): Homes kept at once; the least recently used is forgotten beyond this.
+        """
+        self.dict_devices = dict(dict_devices)
+        self.max_homes = max_homes
+        self.homes = OrderedDict()
+
+    def home(self, home_id):
+        if home_id not in self.homes:
+            self.homes[home_id] = {
+                name: {"device": device, "power": "off", "mode": None, "settings": {}, "updated_at": None}
+                for name, device in self.dict_devices.items()
+            }
+            while len(self.homes) > self.max_homes:
+                self.homes.popitem(last=False)
+        self.homes.move_to_end(home_id)
+        return self.homes[home_id]
+
+    def get(self, home_id, device_name):
+        return self.home(home_id).get(device_name)
+
+    def apply(self, home_id, device_name, command):
+        """Apply one command to a device's state and return the new state."""
+        devices = self.home(home_id)
+        state = devices.setdefault(
+            device_name,
+            {"device": device_name, "power": "off", "mode": None, "settings": {}, "updated_at": None},
+        )
+        mode = command["mode"]
+        args = command.get("args") or {}
+        target = power_target(command)
+        if target is not None:
+            state["power"] = target
+        elif mode.lower() not in POWER_MODES:
+            step = relative_step(command)
+            settings = state["settings"].setdefault(mode, {})
+            if step is not None:
+                settings["level"] = max(0, settings.get("level", 0) + step)
+            else:
+                settings.update(args)
+            state["mode"] = mode
+            state["power"] = "on"
+        state["updated_at"] = time.time()
+        return dict(state)
+
+    def snapshot(self, home_id):
+        return {name: dict(state) for name, state in self.home(home_id).items()}
+
+
+class SIMULATED_ACTUATOR:
+    def __init__(self, store, latency=0.05):
+        """
+        Actuator backend that applies commands to a DEVICE_STATE_STORE after a simulated delay.
+
+        Args:
+            store (DEVICE_STATE_STORE): The state store updated by each actuation.
+            latency (float): Seconds each actuate() call takes, standing in for the device round trip.
+        """
+        self.store = store
+        self.latency = latency
+
+    async def actuate(self, home_id, device_name, commands):
+        """Send a batch of commands to one device; returns the device state afterwards."""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        state = self.store.get(home_id, device_name)
+        for command in commands:
+            state = self.store.apply(home_id, device_name, command)
+        return state
+
+
+class COALESCING_DISPATCHER:
+    def __init__(self, actuator, store=None, window=0.1):
+        """
+        Batches commands per (home, device) and sends each batch to the actuator once.
+
+        The first command for an idle device waits `window` seconds for company; commands
+        that arrive while a batch is being actuated join the next batch. Each batch is folded
+        with coalesce_commands before it reaches the actuator.
+
+        Args:
+            actuator: Any object with an async actuate(home_id, device_name, commands) method.
+            store (DEVICE_STATE_STORE, optional): Current states, used to drop no-op power changes.
+            window (float): Seconds to collect commands before actuating.
+        """
+        self.actuator = actuator
+        self.store = store
+        self.window = window
+        self.pending = {}
+        self.flushers = {}
+        self.logger = logging.getLogger(__name__)
+
+        self.received = 0
+        self.actuated = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.total_latency = 0.0
+
+    async def dispatch(self, device_name, command, home_id=None):
+        """
+        Queue a command for a device and wait until it has been actuated.
+
+        Returns:
+            A dict with the device state after the batch, the commands actually sent, how many
+            commands were coalesced away and the actuation latency of the batch.
+        """
+        if home_id is None:
+            home_id = current_home_id()
+        key = (home_id, device_name)
+        future = asyncio.get_running_loop().create_future()
+        self.pending.setdefault(key, []).append((command, future))
+        self.received += 1
+        if key not in self.flushers:
+            self.flushers[key] = asyncio.create_task(self.flush(key))
+        return await future
+
+    async def flush(self, key):
+        home_id, device_name = key
+        try:
+            if self.window:
+                await asyncio.sleep(self.window)
+            while self.pending.get(key):
+                batch = self.pending.pop(key)
+                commands = [command for command, _ in batch]
+                current_state = self.store.get(home_id, device_name) if self.store else None
+                to_send = coalesce_commands(commands, current_state)
+                start = time.time()
+                try:
+                    state = await self.actuator.actuate(home_id, device_name, to_send) if to_send else current_state
+                    error = None
+                except Exception as e:
+                    self.logger.error(f"Actuation failed for {device_name} in home {home_id}: {str(e)}")
+                    state, error = None, str(e)
+                latency = time.time() - start
+                self.actuated += len(to_send)
+                self.coalesced += len(commands) - len(to_send)
+                self.batches += 1
+                self.total_latency += latency
+                result = {
+                    "device_name": device_name,
+                    "sent": to_send,
+                    "coalesced": len(commands) - len(to_send),
+                    "latency": latency,
+                    "state": state,
+                    "error": error,
+                }
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            del self.flushers[key]
+
+    def metrics(self):
+        return {
+            "received": self.received,
+            "actuated": self.actuated,
+            "coalesced": self.coalesced,
+            "avg_batch_latency": self.total_latency / self.batches if self.batches else 0.0,
+        }
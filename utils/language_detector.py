@@ -0,0 +1,269 @@
+# language_detector.py
+import re
+
+import numpy as np
+import pandas as pd
+
+# Script ids index into SCRIPTS; id 0 is used for digits, punctuation and anything unmapped.
+SCRIPTS = (
+    "Other",
+    "Latin",
+    "Devanagari",
+    "Bengali",
+    "Gurmukhi",
+    "Gujarati",
+    "Tamil",
+    "Telugu",
+    "Kannada",
+    "Malayalam",
+    "Arabic",
+)
+_LATIN_ID = SCRIPTS.index("Latin")
+_FIRST_NATIVE_ID = SCRIPTS.index("Devanagari")
+# Minimum share of native-script letters for a text to count as written in that script.
+_MIN_NATIVE_SHARE = 0.1
+
+_SCRIPT_RANGES = {
+    "Latin": [(0x0041, 0x005A), (0x0061, 0x007A), (0x00C0, 0x024F)],
+    "Devanagari": [(0x0900, 0x0963), (0x0966, 0x097F)],
+    "Bengali": [(0x0980, 0x09FF)],
+    "Gurmukhi": [(0x0A00, 0x0A7F)],
+    "Gujarati": [(0x0A80, 0x0AFF)],
+    "Tamil": [(0x0B80, 0x0BFF)],
+    "Telugu": [(0x0C00, 0x0C7F)],
+    "Kannada": [(0x0C80, 0x0CFF)],
+    "Malayalam": [(0x0D00, 0x0D7F)],
+    "Arabic": [(0x0600, 0x06FF), (0x0750, 0x077F), (0xFB50, 0xFDFF), (0xFE70, 0xFEFF)],
+}
+
+# Precomputed code point -> script id table covering the Basic Multilingual Plane.
+_TABLE_SIZE = 0x10000
+_SCRIPT_TABLE = np.zeros(_TABLE_SIZE, dtype=np.uint8)
+for _script, _ranges in _SCRIPT_RANGES.items():
+    for _start, _end in _ranges:
+        _SCRIPT_TABLE[_start:_end + 1] = SCRIPTS.index(_script)
+
+# Language labels follow the "Language (Script)" format used by the dataset.
+ENGLISH = "English (Latin)"
+ROMANISED_HINDI_URDU = "Romanised Hindi/Urdu (Latin)"
+NATIVE_SCRIPT_LANGUAGES = {
+    "Bengali": "Bengali (Bangla)",
+    "Gurmukhi": "Punjabi (Gurmukhi)",
+    "Gujarati": "Gujarati (Gujarati Script)",
+    "Tamil": "Tamil (Tamil Script)",
+    "Telugu": "Telugu (Telugu Script)",
+    "Kannada": "Kannada (Kannada Script)",
+    "Malayalam": "Malayalam (Malayalam Script)",
+    "Arabic": "Urdu (Nastaliq)",
+}
+DEVANAGARI_LANGUAGES = {
+    "Hindi": "Hindi (Devanagari)",
+    "Marathi": "Marathi (Devanagari)",
+}
+
+# Function words and verb endings that are distinctive for each language. A token that
+# appears in several lexicons is shared out evenly between them.
+DEVANAGARI_MARKERS = {
+    "Hindi": ["और", "फिर", "करो", "को", "की", "के", "में", "लिए", "साथ", "चलाओ", "उसके", "बाद", "दो", "डालो"],
+    "Marathi": ["आणि", "करा", "कर", "नंतर", "मग", "सुरू", "चालू", "वेळी", "त्याच", "ठेव", "चालव", "मध्ये", "वर"],
+}
+# Romanised Hindi and Romanised Urdu use the same everyday words (aur, phir, ko, chalao, kardo...),
+# so they share one label; the native scripts (Devanagari, Nastaliq) still tell them apart.
+ROMANISED_MARKERS = {
+    "Hindi/Urdu": [
+        "aur", "phir", "ko", "ka", "ke", "mein", "uske", "saath", "pehle", "kardo", "chalao", "liye", "baad",
+        "kijiye", "dijiye", "karein", "dikhao",
+    ],
+    "Bengali": ["koro", "dao", "tarpor", "ebong", "kholo", "jonno", "choluk", "ekshathe", "porer", "abar", "taatati"],
+    "Marathi": ["kara", "ani", "aani", "cha", "mag", "madhe", "nantar", "nantarr", "tyach", "tevha", "takun", "chalu"],
+    "Gujarati": ["ane", "pachi", "pachhi", "sathe", "bandh", "mate", "nu", "ni", "ghatao", "pankho"],
+    "Punjabi": ["te", "nu", "naal", "nal", "pehlan", "di", "da", "layi", "vich", "fer", "fir"],
+    "Telugu": ["lo", "cheyyi", "pettu", "tarvata", "mariyu", "tho", "ventane", "pettandi", "chesi", "nimishalu"],
+    "Tamil": ["pannu", "podu", "appuram", "apparam", "aprom", "aduthu", "vechu", "athuku", "kooda", "nimisham"],
+    "Kannada": ["alli", "maadi", "madu", "mele", "haaki", "matte", "aadmele", "aamele", "annu", "ge", "nantara"],
+    "Malayalam": ["il", "thanne", "athu", "cheyyu", "cheyyuka", "kazhinju", "appo", "appol", "pinne", "ile", "shesham"],
+}
+
+_LATIN_TOKEN_PATTERN = r"[a-z]+"
+_DEVANAGARI_TOKEN_PATTERN = r"[\u0900-\u0963\u0966-\u097f]+"
+
+
+def _marker_weights(lexicons):
+    """Build a token -> {language: weight} map, splitting shared tokens between languages."""
+    owners = {}
+    for language, tokens in lexicons.items():
+        for token in tokens:
+            owners.setdefault(token, []).append(language)
+    return {token: {lang: 1.0 / len(langs) for lang in langs} for token, langs in owners.items()}
+
+
+_DEVANAGARI_WEIGHTS = _marker_weights(DEVANAGARI_MARKERS)
+_ROMANISED_WEIGHTS = _marker_weights(ROMANISED_MARKERS)
+
+
+def _weights_frame(weights, languages):
+    frame = pd.DataFrame.from_dict(weights, orient="index").reindex(columns=list(languages))
+    return frame.fillna(0.0)
+
+
+_DEVANAGARI_FRAME = _weights_frame(_DEVANAGARI_WEIGHTS, DEVANAGARI_MARKERS)
+_ROMANISED_FRAME = _weights_frame(_ROMANISED_WEIGHTS, ROMANISED_MARKERS)
+
+
+def _codepoints(text):
+    """Return the code points of a string as a uint32 array."""
+    return np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+
+
+def _script_ids(codepoints):
+    return _SCRIPT_TABLE[np.minimum(codepoints, _TABLE_SIZE - 1)]
+
+
+def _dominant_script_ids(counts):
+    """Pick the dominant script for each row of a (rows x scripts) count matrix.
+
+    Native Indic/Arabic letters win over Latin ones once they make up a small share
+    of the text, since code-mixed queries routinely embed English device names in an
+    otherwise native-script sentence.
+    """
+    native = counts[:, _FIRST_NATIVE_ID:]
+    native_total = native.sum(axis=1)
+    has_latin = counts[:, _LATIN_ID] > 0
+    has_native = (native_total > 0) & (native_total >= _MIN_NATIVE_SHARE * (native_total + counts[:, _LATIN_ID]))
+    return np.where(
+        has_native,
+        native.argmax(axis=1) + _FIRST_NATIVE_ID,
+        np.where(has_latin, _LATIN_ID, 0),
+    )
+
+
+def script_counts(text):
+    """Count the letters of each script in a string, indexed like SCRIPTS."""
+    if not isinstance(text, str) or not text:
+        return np.zeros(len(SCRIPTS), dtype=np.int64)
+    return np.bincount(_script_ids(_codepoints(text)), minlength=len(SCRIPTS))
+
+
+def detect_script(text):
+    """Return the dominant script of a string, e.g. 'Devanagari' or 'Latin'."""
+    counts = script_counts(text)
+    return SCRIPTS[int(_dominant_script_ids(counts[np.newaxis, :])[0])]
+
+
+def _best_marker_language(tokens, weights, languages):
+    scores = {}
+    for token in tokens:
+        for language, weight in weights.get(token, {}).items():
+            scores[language] = scores.get(language, 0.0) + weight
+    if not scores:
+        return None
+    # Ties go to the language listed first, matching DataFrame.idxmax in the batch path.
+    return max(languages, key=lambda language: scores.get(language, 0.0))
+
+
+def romanised_language(text):
+    """
+    Guess which Indic language a Latin-script string is written in.
+
+    Returns:
+        The language name (e.g. 'Tamil', or 'Hindi/Urdu' for either of those) when any marker
+        word matches, otherwise None, which callers should treat as English.
+    """
+    if not isinstance(text, str):
+        return None
+    return _best_marker_language(
+        re.findall(_LATIN_TOKEN_PATTERN, text.lower()), _ROMANISED_WEIGHTS, ROMANISED_MARKERS
+    )
+
+
+def _language_for_script(script, text):
+    if script in NATIVE_SCRIPT_LANGUAGES:
+        return NATIVE_SCRIPT_LANGUAGES[script]
+    if script == "Devanagari":
+        language = _best_marker_language(
+            re.findall(_DEVANAGARI_TOKEN_PATTERN, text), _DEVANAGARI_WEIGHTS, DEVANAGARI_MARKERS
+        )
+        return DEVANAGARI_LANGUAGES[language or "Hindi"]
+    language = romanised_language(text)
+    return f"Romanised {language} (Latin)" if language else ENGLISH
+
+
+def detect_language(text):
+    """
+    Return the dataset-style language label of a string, e.g. 'Romanised Tamil (Latin)'.
+
+    Romanised Hindi and Romanised Urdu are both labelled 'Romanised Hindi/Urdu (Latin)'.
+    """
+    if not isinstance(text, str):
+        return ENGLISH
+    return _language_for_script(detect_script(text), text)
+
+
+def _as_series(texts):
+    if isinstance(texts, pd.Series):
+        return texts.where(texts.map(lambda t: isinstance(t, str)), "")
+    return pd.Series([t if isinstance(t, str) else "" for t in texts], dtype=object)
+
+
+def batch_script_counts(texts):
+    """
+    Count the letters of each script for many strings in one vectorised pass.
+
+    Args:
+        texts (pd.Series | list): The strings to scan. Non-string entries count as empty.
+
+    Returns:
+        An int64 array of shape (len(texts), len(SCRIPTS)).
+    """
+    texts = _as_series(texts)
+    n_rows = len(texts)
+    lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=n_rows)
+    script_ids = _script_ids(_codepoints("".join(texts))).astype(np.int64)
+    row_ids = np.repeat(np.arange(n_rows, dtype=np.int64), lengths)
+    flat = np.bincount(row_ids * len(SCRIPTS) + script_ids, minlength=n_rows * len(SCRIPTS))
+    return flat.reshape(n_rows, len(SCRIPTS))
+
+
+def detect_scripts(texts):
+    """Vectorised detect_script; returns a Series aligned with the input."""
+    series = _as_series(texts)
+    script_ids = _dominant_script_ids(batch_script_counts(series))
+    return pd.Series(np.asarray(SCRIPTS, dtype=object)[script_ids], index=series.index)
+
+
+def _batch_marker_language(texts, pattern, frame):
+    """Score every row against a marker frame and return the best language per row (or None)."""
+    tokens = texts.str.lower().str.findall(pattern).explode().dropna()
+    result = pd.Series(None, index=texts.index, dtype=object)
+    if tokens.empty:
+        return result
+    hits = frame.reindex(tokens.to_numpy()).set_axis(tokens.index).dropna()
+    if hits.empty:
+        return result
+    scores = hits.groupby(level=0).sum()
+    scores = scores[scores.sum(axis=1) > 0]
+    result.loc[scores.index] = scores.idxmax(axis=1)
+    return result
+
+
+def detect_languages(texts):
+    """
+    Vectorised detect_language for a pandas Series (or any list) of queries.
+
+    Returns:
+        A Series of dataset-style language labels aligned with the input index.
+    """
+    series = _as_series(texts)
+    scripts = detect_scripts(series)
+    languages = scripts.map(NATIVE_SCRIPT_LANGUAGES)
+
+    devanagari = scripts == "Devanagari"
+    if devanagari.any():
+        marker = _batch_marker_language(series[devanagari], _DEVANAGARI_TOKEN_PATTERN, _DEVANAGARI_FRAME)
+        languages.loc[devanagari] = marker.fillna("Hindi").map(DEVANAGARI_LANGUAGES)
+
+    latin = languages.isna()
+    if latin.any():
+        marker = _batch_marker_language(series[latin], _LATIN_TOKEN_PATTERN, _ROMANISED_FRAME)
+        languages.loc[latin] = ("Romanised " + marker + " (Latin)").fillna(ENGLISH)
+    return languages
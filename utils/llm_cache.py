@@ -0,0 +1,69 @@
+# llm_cache.py
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+
+
+class SQLITE_CACHE:
+    def __init__(self, path, ttl=None, busy_timeout=0.05):
+        """
+        LLM response cache in an SQLite file opened in WAL mode.
+
+        Several processes can open the same file: readers never block each other or the
+        writer, so a response cached by one orchestrator worker is served to every worker.
+
+        Args:
+            path (str): SQLite database file. Created if missing.
+            ttl (float, optional): Seconds a cached response stays valid. None keeps entries forever.
+            busy_timeout (float): Seconds to wait for another process's write lock. Lookups run on
+                                  the event loop, so a locked database counts as a miss (or a
+                                  skipped write) instead of stalling every coroutine.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.logger = logging.getLogger(__name__)
+        self.connection = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, content TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(provider, model_name, messages):
+        """Stable cache key for a chat request."""
+        payload = json.dumps([provider, model_name, messages], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached response content, or None on a miss or an expired entry."""
+        try:
+            row = self.connection.execute(
+                "SELECT content, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            self.logger.warning(f"LLM cache read failed: {str(e)}")
+            row = None
+        if row is None or (self.ttl is not None and time.time() - row[1] > self.ttl):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, key, content):
+        try:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, content, created_at) VALUES (?, ?, ?)",
+                (key, content, time.time()),
+            )
+        except sqlite3.Error as e:
+            self.logger.warning(f"LLM cache write failed: {str(e)}")
+
+    def metrics(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
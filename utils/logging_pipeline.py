@@ -0,0 +1,142 @@
+# logging_pipeline.py
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+
+DEFAULT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# How much of a logged LLM payload (extra={"role": ..., "payload": ...}) is kept, per role.
+# sample_rate is the fraction of records that keep their payload at all; the others log just
+# the message, marked payload_sampled_out.
+PAYLOAD_POLICIES = {
+    "classification": {"max_chars": 500, "sample_rate": 1.0},
+    "device_agent": {"max_chars": 300, "sample_rate": 1.0},
+    "completion": {"max_chars": 200, "sample_rate": 0.1},
+    "dataset": {"max_chars": 500, "sample_rate": 1.0},
+}
+DEFAULT_PAYLOAD_POLICY = {"max_chars": 300, "sample_rate": 1.0}
+
+# Attributes every LogRecord has; anything else was passed through `extra` and is structured data
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class PAYLOAD_FILTER(logging.Filter):
+    def __init__(self, policies=None):
+        """Samples and truncates record payloads before they are queued, so big responses never pile up."""
+        super().__init__()
+        self.policies = {**PAYLOAD_POLICIES, **(policies or {})}
+
+    def filter(self, record):
+        payload = getattr(record, "payload", None)
+        if payload is None:
+            return True
+        policy = self.policies.get(getattr(record, "role", None), DEFAULT_PAYLOAD_POLICY)
+        if policy["sample_rate"] < 1.0 and random.random() >= policy["sample_rate"]:
+            record.payload = None
+            record.payload_sampled_out = True
+            return True
+        text = payload if isinstance(payload, str) else str(payload)
+        if len(text) > policy["max_chars"]:
+            text = f"{text[:policy['max_chars']]}...(+{len(text) - policy['max_chars']} chars)"
+        record.payload = text
+        return True
+
+
+class TEXT_FORMATTER(logging.Formatter):
+    """The usual one-line format, with the payload (if any) appended after the message."""
+
+    def format(self, record):
+        line = super().format(record)
+        payload = getattr(record, "payload", None)
+        return f"{line} | {payload}" if payload is not None else line
+
+
+class JSON_FORMATTER(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and every `extra` field."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in STANDARD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DROPPING_QUEUE_HANDLER(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks the caller: records are dropped (and counted) when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener = None
+
+
+def stop_logging():
+    """Flush queued records and stop the background thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logging(level=logging.INFO, path=None, structured=False, payload_policies=None, fmt=DEFAULT_FORMAT,
+                  queue_size=10000):
+    """
+    Route all logging through a bounded queue drained by a background thread.
+
+    Callers only pay for building the record; formatting and I/O happen off the event loop.
+    Replaces any handlers already on the root logger, so it is safe to call more than once.
+
+    Args:
+        level (int): Root log level.
+        path (str, optional): Also write logs to this file.
+        structured (bool): Emit JSON lines instead of the plain text format.
+        payload_policies (dict, optional): Per-role overrides of PAYLOAD_POLICIES.
+        fmt (str): Text format when not structured.
+        queue_size (int): Records buffered before new ones are dropped.
+
+    Returns:
+        The DROPPING_QUEUE_HANDLER installed on the root logger.
+    """
+    global _listener
+    if _listener is None:
+        atexit.register(stop_logging)
+    stop_logging()
+
+    formatter = JSON_FORMATTER() if structured else TEXT_FORMATTER(fmt)
+    handlers = [logging.StreamHandler()]
+    if path:
+        handlers.append(logging.FileHandler(path, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = DROPPING_QUEUE_HANDLER(queue.Queue(maxsize=queue_size))
+    queue_handler.addFilter(PAYLOAD_FILTER(payload_policies))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return queue_handler
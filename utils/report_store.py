@@ -0,0 +1,283 @@
+# report_store.py
+import json
+import os
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Schema metadata key holding every report entry except query_scores (averages, latency, ...)
+SUMMARY_KEY = b"homa.report"
+FORMAT_KEY = b"homa.format"
+FORMAT_VERSION = b"1"
+
+SCORE_COLUMNS = (
+    "query_weighted_total", "query_device_score", "query_task_type_score", "query_mode_score", "query_args_score"
+)
+DEVICE_SCORES = ("device_score", "task_type_score", "mode_score", "args_score")
+FIELDS = ("device", "task_type", "mode")
+TIMING_COLUMNS = (
+    ("wall_time", pa.float64()),
+    ("queue_wait", pa.float64()),
+    ("prompt_tokens", pa.int64()),
+    ("completion_tokens", pa.int64()),
+    ("tokens_per_second", pa.float64()),
+    ("llm_calls", pa.int64()),
+)
+CALL_FIELDS = (
+    ("role", pa.string()),
+    ("wall_time", pa.float64()),
+    ("queue_wait", pa.float64()),
+    ("prompt_tokens", pa.int64()),
+    ("completion_tokens", pa.int64()),
+    ("generation_time", pa.float64()),
+    ("tokens_per_second", pa.float64()),
+    ("failed", pa.bool_()),
+    ("device_name", pa.string()),
+)
+
+DEVICE_TYPE = pa.struct(
+    [(f"{side}_{field}", pa.string()) for side in ("actual", "predicted") for field in FIELDS]
+    # Args are free-form dicts, stored as JSON text
+    + [("actual_args", pa.string()), ("predicted_args", pa.string()), ("weighted_total", pa.float64())]
+    + [(name, pa.int64()) for name in DEVICE_SCORES]
+)
+CALL_TYPE = pa.struct(list(CALL_FIELDS))
+
+SCHEMA = pa.schema(
+    [("query", pa.string()), ("language", pa.string())]
+    + [(name, pa.float64()) for name in SCORE_COLUMNS]
+    + [("devices", pa.list_(DEVICE_TYPE))]
+    + list(TIMING_COLUMNS)
+    + [("calls", pa.list_(CALL_TYPE))]
+    # What the evaluator stored to rescore later: expected devices and raw model output, as JSON text
+    + [("expected", pa.string()), ("raw", pa.string())]
+)
+
+
+def to_json(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+def report_table(report):
+    """
+    Columnar form of a report: one row per query, its devices as a nested list column and
+    the rest of the report (overall_average, latency, ...) in the schema metadata.
+    """
+    results = report.get("query_scores", [])
+    timings = [result.get("timing") or {} for result in results]
+    columns = {
+        "query": [result["query"] for result in results],
+        "language": [result.get("language") for result in results],
+    }
+    for name in SCORE_COLUMNS:
+        columns[name] = [result["query_score"][name] for result in results]
+    columns["devices"] = [
+        [
+            {
+                **{f"{side}_{field}": device[side][field] for side in ("actual", "predicted") for field in FIELDS},
+                "actual_args": to_json(device["actual"]["args"]),
+                "predicted_args": to_json(device["predicted"]["args"]),
+                "weighted_total": device["score"]["weighted_total"],
+                **{name: device["score"][name] for name in DEVICE_SCORES},
+            }
+            for device in result["devices"]
+        ]
+        for result in results
+    ]
+    for name, _ in TIMING_COLUMNS:
+        columns[name] = [timing.get(name) for timing in timings]
+    columns["calls"] = [timing.get("calls") if timing else None for timing in timings]
+    columns["expected"] = [to_json(result["expected"]) if "expected" in result else None for result in results]
+    columns["raw"] = [to_json(result["raw"]) if "raw" in result else None for result in results]
+
+    # Keep the summary's key order, with a placeholder where the query scores go
+    summary = {key: (None if key == "query_scores" else value) for key, value in report.items()}
+    summary.setdefault("query_scores", None)
+    schema = SCHEMA.with_metadata({SUMMARY_KEY: to_json(summary), FORMAT_KEY: FORMAT_VERSION})
+    return pa.Table.from_pydict(columns, schema=schema)
+
+
+def report_from_table(table):
+    """The JSON layout (as written before the columnar format) of a report table."""
+    summary = table_summary(table)
+    results = []
+    for row in table.to_pylist():
+        result = {
+            "query": row["query"],
+            "language": row["language"],
+            "devices": [
+                {
+                    "actual": {
+                        **{field: device[f"actual_{field}"] for field in FIELDS},
+                        "args": json.loads(device["actual_args"]),
+                    },
+                    "predicted": {
+                        **{field: device[f"predicted_{field}"] for field in FIELDS},
+                        "args": json.loads(device["predicted_args"]),
+                    },
+                    "score": {"weighted_total": device["weighted_total"], **{name: device[name] for name in DEVICE_SCORES}},
+                }
+                for device in row["devices"]
+            ],
+            "query_score": {name: row[name] for name in SCORE_COLUMNS},
+        }
+        if row["expected"] is not None:
+            result["expected"] = json.loads(row["expected"])
+        if row["raw"] is not None:
+            result["raw"] = json.loads(row["raw"])
+        if row["wall_time"] is not None:
+            result["timing"] = {name: row[name] for name, _ in TIMING_COLUMNS}
+            # Calls of the classifier carry no device name
+            result["timing"]["calls"] = [
+                {key: value for key, value in call.items() if key != "device_name" or value is not None}
+                for call in row["calls"] or []
+            ]
+        results.append(result)
+    return {**summary, "query_scores": results}
+
+
+def table_summary(table):
+    return json.loads(table.schema.metadata[SUMMARY_KEY])
+
+
+def query_table(table):
+    """
+    One row per query of a report table with its device count, without the nested columns.
+
+    The columns are the report's buffers, not a copy.
+    """
+    table = table.append_column("device_count", pc.list_value_length(table.column("devices")))
+    return table.drop_columns(["devices", "calls"])
+
+
+def device_table(table):
+    """
+    One row per (query, expected device) of a report table, with the query's row index.
+
+    The device columns are a view of the report's buffers, not a copy.
+    """
+    column = table.column("devices")
+    chunks = column.chunks or [pa.array([], column.type)]
+    parts, offset = [], 0
+    # Chunk by chunk: combining the chunks first would copy them
+    for chunk in chunks:
+        flat = pa.Table.from_struct_array(chunk.flatten())
+        parts.append(flat.append_column("query_index", pc.add(pc.list_parent_indices(chunk), offset)))
+        offset += len(chunk)
+    return pa.concat_tables(parts)
+
+
+def table_frames(table, query_columns=None, device_columns=None):
+    """
+    The query and device tables of a report as DataFrames, converting only the given columns.
+
+    Args:
+        table (pa.Table): Report table, e.g. from read_arrow_report.
+        query_columns (list, optional): Columns of query_table to convert; all if None.
+        device_columns (list, optional): Columns of device_table to convert; all if None.
+
+    Returns:
+        (queries, devices): queries indexed by query row, devices with a query_index column.
+    """
+    queries = query_table(table)
+    devices = device_table(table)
+    if query_columns is not None:
+        queries = queries.select(query_columns)
+    if device_columns is not None:
+        devices = devices.select(list(dict.fromkeys(["query_index", *device_columns])))
+    return queries.to_pandas(), devices.to_pandas()
+
+
+def write_arrow_report(path, report):
+    """Write a report as an uncompressed Arrow IPC file, so readers can memory-map it."""
+    table = report_table(report)
+    # Write under a temporary name first so a crash never leaves half a report
+    with pa.OSFile(path + ".tmp", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(path + ".tmp", path)
+
+
+def read_arrow_report(source):
+    """
+    Report table of an Arrow report. A path is memory-mapped, so columns are read from disk as
+    they are used; a pa.Buffer (an uploaded file) is read in place.
+    """
+    if isinstance(source, pa.Buffer):
+        return pa.ipc.open_file(pa.BufferReader(source)).read_all()
+    with pa.memory_map(source, "r") as f:
+        return pa.ipc.open_file(f).read_all()
+
+
+def write_json_report(path, report):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def is_arrow(path):
+    return path.endswith(".arrow")
+
+
+def save_report(path, report):
+    """Write a report in the format of the path's extension: .arrow (columnar) or .json."""
+    if is_arrow(path):
+        write_arrow_report(path, report)
+    else:
+        write_json_report(path, report)
+
+
+def load_report(path):
+    """A report in the JSON layout, from either format."""
+    if is_arrow(path):
+        return report_from_table(read_arrow_report(path))
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_table(path):
+    """Report table of either format; an Arrow report is memory-mapped, a JSON report converted."""
+    if is_arrow(path):
+        return read_arrow_report(path)
+    return report_table(load_report(path))
+
+
+def load_summary(path):
+    """
+    A report without its query_scores. For an Arrow report only the file footer is read.
+    """
+    if is_arrow(path):
+        with pa.memory_map(path, "r") as source:
+            summary = json.loads(pa.ipc.open_file(source).schema.metadata[SUMMARY_KEY])
+    else:
+        summary = load_report(path)
+    summary.pop("query_scores", None)
+    return summary
+
+
+def convert_report(path, output_path=None):
+    """
+    Convert a JSON report to Arrow or an Arrow report back to the JSON layout.
+
+    Args:
+        path (str): evaluation_report_<model>.json or .arrow file.
+        output_path (str, optional): Where to write; defaults to the same name with the other extension.
+
+    Returns:
+        The path written.
+    """
+    if output_path is None:
+        output_path = os.path.splitext(path)[0] + (".json" if is_arrow(path) else ".arrow")
+    save_report(output_path, load_report(path))
+    return output_path
+
+
+def report_paths(directory):
+    """evaluation_report_<model> files in a directory, one per model, preferring .arrow over .json."""
+    paths = {}
+    for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+        stem, ext = os.path.splitext(name)
+        if name.startswith("evaluation_report_") and ext in (".arrow", ".json"):
+            if ext == ".arrow" or stem not in paths:
+                paths[stem] = os.path.join(directory, name)
+    return [paths[stem] for stem in sorted(paths)]
@@ -0,0 +1,192 @@
+# sampling.py
+import random
+from statistics import NormalDist
+
+
+def collapse_strata(keys, min_size=10):
+    """
+    Stratum of each row from its (language, device count) key.
+
+    A key with fewer than `min_size` rows falls back to its language, then to its device
+    count, then to one stratum for whatever is left, so no stratum is too small to estimate.
+
+    Args:
+        keys (list): (language, device count) per row.
+        min_size (int): Rows a stratum should have.
+
+    Returns:
+        A stratum label per row.
+    """
+    strata = [None] * len(keys)
+    levels = (lambda key: key, lambda key: (key[0], '*'), lambda key: ('*', key[1]))
+    for level in levels:
+        groups = {}
+        for idx, key in enumerate(keys):
+            if strata[idx] is None:
+                groups.setdefault(level(key), []).append(idx)
+        for label, members in groups.items():
+            if len(members) >= min_size:
+                for idx in members:
+                    strata[idx] = label
+    return [stratum if stratum is not None else ('*', '*') for stratum in strata]
+
+
+def stratified_order(strata, seed=0):
+    """
+    Row indices in an order where every prefix holds each stratum in proportion to its size.
+
+    Rows are shuffled within their stratum and the i-th of a stratum of n rows is placed at
+    (i + u) / n on a shared 0-1 scale, u uniform per row.
+    """
+    rng = random.Random(seed)
+    members = {}
+    for idx, stratum in enumerate(strata):
+        members.setdefault(stratum, []).append(idx)
+    keyed = []
+    for stratum, indices in members.items():
+        rng.shuffle(indices)
+        keyed.extend(((rank + rng.random()) / len(indices), idx) for rank, idx in enumerate(indices))
+    return [idx for _, idx in sorted(keyed)]
+
+
+class STRATIFIED_ESTIMATE:
+    def __init__(self, stratum_sizes, confidence=0.95):
+        """
+        Running stratified mean of values sampled without replacement, with a normal confidence interval.
+
+        Args:
+            stratum_sizes (dict): Stratum -> number of rows in the population.
+            confidence (float): Two-sided confidence level of the interval.
+        """
+        self.sizes = stratum_sizes
+        self.total = sum(stratum_sizes.values())
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self.sums = {stratum: [0, 0.0, 0.0] for stratum in stratum_sizes}
+
+    def add(self, stratum, value):
+        sums = self.sums[stratum]
+        sums[0] += 1
+        sums[1] += value
+        sums[2] += value * value
+
+    @property
+    def count(self):
+        return sum(n for n, _, _ in self.sums.values())
+
+    @property
+    def covered(self):
+        """True once every stratum has at least one value."""
+        return all(n for n, _, _ in self.sums.values())
+
+    def interval(self):
+        """
+        (mean, low, high) over the strata sampled so far, or None before any value.
+
+        Strata with a single value borrow the variance pooled over all values; the finite
+        population correction shrinks the interval to the mean once every row is in.
+        """
+        n_all = self.count
+        if not n_all:
+            return None
+        total_sum = sum(s for _, s, _ in self.sums.values())
+        total_sq = sum(q for _, _, q in self.sums.values())
+        pooled = (total_sq - total_sum * total_sum / n_all) / (n_all - 1) if n_all > 1 else 0.0
+        covered_rows = sum(self.sizes[stratum] for stratum, (n, _, _) in self.sums.items() if n)
+        mean = variance = 0.0
+        for stratum, (n, s, q) in self.sums.items():
+            if not n:
+                continue
+            weight = self.sizes[stratum] / covered_rows
+            stratum_variance = (q - s * s / n) / (n - 1) if n > 1 else pooled
+            mean += weight * s / n
+            variance += weight * weight * max(stratum_variance, 0.0) / n * (1 - n / self.sizes[stratum])
+        half_width = self.z * variance ** 0.5
+        return mean, mean - half_width, mean + half_width
+
+
+class SEQUENTIAL_SAMPLER:
+    def __init__(self, strata, target_width=0.05, confidence=0.95, min_rows=30, baseline=None, seed=0):
+        """
+        Decides when enough rows of a dataset have been evaluated.
+
+        Rows are visited in stratified_order. Each finished row updates a stratified estimate
+        of its score; evaluation can stop once the confidence interval is narrower than
+        `target_width`, or, with a baseline, once the interval of the paired difference
+        excludes zero or is narrower than `target_width`. Checking after every row makes the
+        nominal confidence somewhat optimistic, so prefer a higher level for close calls.
+
+        Args:
+            strata (list): Stratum label per row (see collapse_strata).
+            target_width (float): Full width of the interval at which sampling stops.
+            confidence (float): Two-sided confidence level of the intervals.
+            min_rows (int): Rows evaluated before stopping is considered.
+            baseline (list, optional): Baseline score per row, None where it has none.
+            seed (int): Seed of the row order.
+        """
+        self.strata = strata
+        self.target_width = target_width
+        self.confidence = confidence
+        self.min_rows = min_rows
+        self.baseline = baseline
+        self.order = stratified_order(strata, seed)
+        sizes = {}
+        for stratum in strata:
+            sizes[stratum] = sizes.get(stratum, 0) + 1
+        self.estimate = STRATIFIED_ESTIMATE(sizes, confidence)
+        self.difference = None
+        if baseline is not None:
+            paired_sizes = {}
+            for stratum, value in zip(strata, baseline):
+                if value is not None:
+                    paired_sizes[stratum] = paired_sizes.get(stratum, 0) + 1
+            self.difference = STRATIFIED_ESTIMATE(paired_sizes, confidence)
+        self.stop_reason = None
+
+    def add(self, idx, value):
+        """Record the score of row `idx`."""
+        self.estimate.add(self.strata[idx], value)
+        if self.difference is not None and self.baseline[idx] is not None:
+            self.difference.add(self.strata[idx], value - self.baseline[idx])
+
+    def should_stop(self):
+        if self.stop_reason is not None:
+            return True
+        if self.estimate.count < self.min_rows:
+            return False
+        if self.difference is not None:
+            if self.difference.count < self.min_rows or not self.difference.covered:
+                return False
+            _, low, high = self.difference.interval()
+            if low > 0:
+                self.stop_reason = "better_than_baseline"
+            elif high < 0:
+                self.stop_reason = "worse_than_baseline"
+            elif high - low <= self.target_width:
+                self.stop_reason = "no_clear_difference"
+        elif self.estimate.covered:
+            _, low, high = self.estimate.interval()
+            if high - low <= self.target_width:
+                self.stop_reason = "ci_width"
+        return self.stop_reason is not None
+
+    @staticmethod
+    def describe(estimate):
+        interval = estimate.interval()
+        if interval is None:
+            return None
+        mean, low, high = interval
+        return {'mean': round(mean, 6), 'ci_low': round(low, 6), 'ci_high': round(high, 6), 'rows': estimate.count}
+
+    def summary(self):
+        summary = {
+            'rows_evaluated': self.estimate.count,
+            'rows_total': len(self.strata),
+            'strata': len(self.estimate.sizes),
+            'confidence': self.confidence,
+            'target_width': self.target_width,
+            'stopped': self.stop_reason or 'all_rows',
+            'weighted_total': self.describe(self.estimate),
+        }
+        if self.difference is not None:
+            summary['difference_to_baseline'] = self.describe(self.difference)
+        return summary
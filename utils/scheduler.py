@@ -0,0 +1,189 @@
+# scheduler.py
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+
+# Home and deadline of the command currently being served. Set by the command intake
+# (see server.py) and read by LLM_SCHEDULER.chat, so the agent code does not need to pass
+# them through every call.
+current_command = contextvars.ContextVar("current_command", default=None)
+
+DEFAULT_HOME = "default"
+
+
+def set_command_context(home_id, deadline=None):
+    """Attach a home id and an absolute deadline (time.time() based) to the running task."""
+    return current_command.set({"home_id": home_id, "deadline": deadline})
+
+
+def current_home_id():
+    """Home of the command being served, or DEFAULT_HOME outside a server request."""
+    return (current_command.get() or {}).get("home_id", DEFAULT_HOME)
+
+
+def command_deadline():
+    """Absolute deadline of the command being served, or None when it has none."""
+    return (current_command.get() or {}).get("deadline")
+
+
+def time_remaining():
+    """Seconds left before the current command's deadline (may be negative), or None without a deadline."""
+    deadline = command_deadline()
+    return None if deadline is None else deadline - time.time()
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a command's deadline passes while one of its steps is still running."""
+
+
+class LLM_SCHEDULER:
+    def __init__(self, utils_obj, max_inflight=4, weights=None, default_weight=1.0, max_queued_per_home=None):
+        """
+        Weighted fair queuing of LLM calls in front of UTILS.chat.
+
+        Each home gets its own FIFO queue. Calls are dispatched in start-time fair queuing
+        order, so a home with weight w receives roughly w shares of the LLM slots while it
+        has work queued, no matter how many calls it submits. Calls whose command deadline
+        has passed are shed instead of being sent to the LLM.
+
+        Args:
+            utils_obj (UTILS): The wrapped LLM client. Other attributes are delegated to it,
+                               so the scheduler can replace UTILS in ASYNC_HOME_AGENT.
+            max_inflight (int): LLM calls allowed to run at once.
+            weights (dict, optional): Per-home scheduling weights.
+            default_weight (float): Weight of homes missing from `weights`.
+            max_queued_per_home (int, optional): Calls a home may have waiting; more are rejected.
+        """
+        self.utils_obj = utils_obj
+        self.max_inflight = max_inflight
+        self.weights = dict(weights or {})
+        self.default_weight = default_weight
+        self.max_queued_per_home = max_queued_per_home
+        self.logger = logging.getLogger(__name__)
+
+        self.queues = {}
+        self.heads = []
+        self.finish_tags = {}
+        self.virtual_time = 0.0
+        self.inflight = 0
+        self.sequence = itertools.count()
+
+        self.dispatched = 0
+        self.shed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def __getattr__(self, name):
+        return getattr(self.utils_obj, name)
+
+    @staticmethod
+    def expired(deadline):
+        return deadline is not None and time.time() >= deadline
+
+    def enqueue(self, home_id, deadline):
+        weight = self.weights.get(home_id, self.default_weight)
+        start_tag = max(self.virtual_time, self.finish_tags.get(home_id, 0.0))
+        self.finish_tags[home_id] = start_tag + 1.0 / weight
+        request = {
+            "home_id": home_id,
+            "start_tag": start_tag,
+            "deadline": deadline,
+            "enqueued_at": time.time(),
+            "ready": asyncio.get_running_loop().create_future(),
+        }
+        queue = self.queues.setdefault(home_id, deque())
+        queue.append(request)
+        if len(queue) == 1:
+            heapq.heappush(self.heads, (start_tag, next(self.sequence), home_id))
+        return request
+
+    def dispatch(self):
+        """Grant free LLM slots to queued calls in fair order, shedding expired ones."""
+        while self.inflight < self.max_inflight and self.heads:
+            _, _, home_id = heapq.heappop(self.heads)
+            queue = self.queues[home_id]
+            request = queue.popleft()
+            if queue:
+                heapq.heappush(self.heads, (queue[0]["start_tag"], next(self.sequence), home_id))
+            else:
+                del self.queues[home_id]
+            if request["ready"].done():
+                continue
+            if self.expired(request["deadline"]):
+                self.shed += 1
+                request["ready"].set_result(False)
+                continue
+            self.virtual_time = max(self.virtual_time, request["start_tag"])
+            wait = time.time() - request["enqueued_at"]
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.dispatched += 1
+            self.inflight += 1
+            request["ready"].set_result(True)
+        self.prune_finish_tags()
+
+    def prune_finish_tags(self):
+        """Forget idle homes whose fair share has caught up with virtual time."""
+        if len(self.finish_tags) <= 2 * len(self.queues) + 1000:
+            return
+        self.finish_tags = {
+            home_id: tag for home_id, tag in self.finish_tags.items()
+            if home_id in self.queues or tag > self.virtual_time
+        }
+
+    async def chat(self, messages):
+        """Same contract as UTILS.chat: returns the response, or None if the call was shed or rejected."""
+        home_id = current_home_id()
+        deadline = command_deadline()
+
+        if self.expired(deadline):
+            self.shed += 1
+            self.logger.warning(f"Shedding LLM call for home {home_id}: command deadline passed")
+            return None
+        if self.max_queued_per_home is not None and len(self.queues.get(home_id, ())) >= self.max_queued_per_home:
+            self.rejected += 1
+            self.logger.warning(f"Rejecting LLM call for home {home_id}: queue full")
+            return None
+
+        request = self.enqueue(home_id, deadline)
+        self.dispatch()
+        try:
+            granted = await request["ready"]
+        except asyncio.CancelledError:
+            ready = request["ready"]
+            if ready.done() and not ready.cancelled() and ready.result():
+                # Cancelled after being granted a slot: hand the slot on
+                self.inflight -= 1
+                self.dispatch()
+            else:
+                # Still queued: dispatch() skips requests whose future is already done
+                ready.cancel()
+            raise
+        if not granted:
+            self.logger.warning(f"Shed LLM call for home {home_id}: command expired while queued")
+            return None
+
+        try:
+            return await self.utils_obj.chat(messages)
+        finally:
+            self.inflight -= 1
+            self.dispatch()
+
+    def metrics(self):
+        """Queue depth and dispatch statistics for monitoring."""
+        queued_by_home = {home_id: len(queue) for home_id, queue in self.queues.items()}
+        return {
+            "inflight": self.inflight,
+            "queued": sum(queued_by_home.values()),
+            "queued_by_home": queued_by_home,
+            "dispatched": self.dispatched,
+            "shed": self.shed,
+            "rejected": self.rejected,
+            "avg_wait": self.total_wait / self.dispatched if self.dispatched else 0.0,
+            "max_wait": self.max_wait,
+        }
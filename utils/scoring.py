@@ -0,0 +1,218 @@
+# scoring.py
+import contextlib
+import gc
+
+import numpy as np
+import pandas as pd
+
+# Component matches of one expected device and the weight of each in its weighted_total
+COMPONENTS = ("device_score", "task_type_score", "mode_score", "args_score")
+QUERY_COMPONENTS = {
+    "weighted_total": "query_weighted_total",
+    "device_score": "query_device_score",
+    "task_type_score": "query_task_type_score",
+    "mode_score": "query_mode_score",
+    "args_score": "query_args_score",
+}
+
+PAIR_COLUMNS = (
+    ("query", np.int64),
+    ("expected_device", object),
+    ("expected_type", object),
+    ("expected_mode", object),
+    ("predicted_device", object),
+    ("predicted_type", object),
+    ("predicted_mode", object),
+    ("has_expected_args", bool),
+    ("has_predicted_args", bool),
+)
+
+
+@contextlib.contextmanager
+def paused_gc():
+    """
+    Pause the cyclic garbage collector while building millions of small dicts and tuples;
+    none of them form cycles, and the collections it would trigger cost more than the scoring.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def split_parsed_response(parsed):
+    """
+    Mode and args of a device agent's parsed response, walking it once.
+
+    The mode is read from the top level, or else from the last nested dict that has one;
+    ('', {}) when there is none.
+    """
+    mode, args = '', {}
+    if isinstance(parsed, dict):
+        if 'mode' in parsed:
+            return str(parsed['mode']), {k: v for k, v in parsed.items() if k != 'mode'}
+        for v in parsed.values():
+            if isinstance(v, dict) and 'mode' in v:
+                mode, args = str(v['mode']), {k: x for k, x in v.items() if k != 'mode'}
+    return mode, args
+
+
+def extract_actual_fields(expected):
+    return {
+        'device': expected.get('device', ''),
+        'task_type': expected.get('execution_type', 'concurrent'),
+        'mode': expected.get('mode', ''),
+        'args': expected.get('args', {})
+    }
+
+
+def flatten_pairs(entries, fields=True):
+    """
+    Flatten queries into columns with one row per (query, expected device, predicted device) pair.
+
+    Args:
+        entries (iterable): (expected_devices, agent_results) per query.
+        fields (bool): Also collect the actual/predicted field dicts reports store per device.
+
+    Returns:
+        dict with 'pairs' (DataFrame of the compared strings), 'expected_args' and
+        'predicted_args' (DataFrames of pair, key, value), 'queries' (number of queries) and
+        'fields' (one (actual, predicted) tuple per pair, empty unless requested).
+    """
+    with paused_gc():
+        return _flatten_pairs(entries, fields)
+
+
+def _flatten_pairs(entries, fields):
+    rows, pair_fields = [], []
+    expected_args, predicted_args = [[], [], []], [[], [], []]
+    queries = 0
+    for queries, (expected_devices, agent_results) in enumerate(entries, start=1):
+        if not expected_devices:
+            continue
+        # The prediction for a device is the first result of its type, concurrent before sequential
+        predictions = {}
+        for task_type in ('concurrent', 'sequential'):
+            for r in agent_results[f'{task_type}_results']:
+                predictions.setdefault(r['device_type'].lower(), (r, task_type))
+        for expected in expected_devices:
+            match = predictions.get(expected['device'].lower())
+            if match is None:
+                predicted_device, task_type, mode, args = '', '', '', {}
+            else:
+                predicted_device, task_type = match[0]['device_type'], match[1]
+                mode, args = split_parsed_response(match[0].get('parsed_response', {}))
+            exp_args = expected.get('args', {})
+            if exp_args and args:
+                pair = len(rows)
+                for columns, values in ((expected_args, exp_args), (predicted_args, args)):
+                    columns[0].extend([pair] * len(values))
+                    columns[1].extend(values.keys())
+                    columns[2].extend(map(str, values.values()))
+            rows.append((
+                queries - 1, expected['device'], expected.get('execution_type', 'concurrent'),
+                str(expected.get('mode', '')), predicted_device, task_type, mode, bool(exp_args), bool(args),
+            ))
+            if fields:
+                pair_fields.append((
+                    extract_actual_fields(expected),
+                    {'device': predicted_device, 'task_type': task_type, 'mode': mode, 'args': args},
+                ))
+    columns = list(zip(*rows)) or [()] * len(PAIR_COLUMNS)
+    pairs = pd.DataFrame({
+        name: np.asarray(column, dtype=dtype) for (name, dtype), column in zip(PAIR_COLUMNS, columns)
+    })
+    def args_frame(columns):
+        return pd.DataFrame({
+            'pair': np.asarray(columns[0], dtype=np.int64),
+            'key': pd.Series(columns[1], dtype=object),
+            'value': pd.Series(columns[2], dtype=object).str.lower(),
+        })
+    return {
+        'pairs': pairs,
+        'expected_args': args_frame(expected_args),
+        'predicted_args': args_frame(predicted_args),
+        'queries': queries,
+        'fields': pair_fields,
+    }
+
+
+def score_pairs(flat):
+    """
+    Component matches and weighted_total of every pair, as columns added to flat['pairs'].
+
+    Args match when neither side has args, or when both do and every expected arg is in
+    the prediction with the same value (case-insensitive).
+    """
+    pairs = flat['pairs']
+    def same(left, right):
+        return (pairs[left].str.lower().to_numpy() == pairs[right].str.lower().to_numpy()).astype(np.int64)
+    pairs['device_score'] = same('expected_device', 'predicted_device')
+    pairs['task_type_score'] = same('expected_type', 'predicted_type')
+    pairs['mode_score'] = same('expected_mode', 'predicted_mode')
+
+    merged = flat['expected_args'].merge(flat['predicted_args'], on=['pair', 'key'], how='left')
+    mismatched = merged.loc[merged['value_x'] != merged['value_y'], 'pair'].unique()
+    all_args_match = ~np.isin(np.arange(len(pairs)), mismatched)
+    has_expected, has_predicted = pairs['has_expected_args'].to_numpy(), pairs['has_predicted_args'].to_numpy()
+    pairs['args_score'] = np.where(
+        ~has_expected & ~has_predicted, 1, np.where(has_expected & has_predicted & all_args_match, 1, 0)
+    )
+    pairs['weighted_total'] = (
+        0.4 * pairs['device_score'] + 0.25 * pairs['mode_score'] + 0.25 * pairs['args_score']
+        + 0.1 * pairs['task_type_score']
+    )
+    return pairs
+
+
+def aggregate_queries(pairs, queries):
+    """
+    Per-query averages of the pair scores; a query with no expected devices scores 1.0 throughout.
+
+    Sums run in pair order (np.bincount), so they equal summing each query's devices one by one.
+    """
+    query_ids = pairs['query'].to_numpy()
+    counts = np.bincount(query_ids, minlength=queries)
+    aggregates = {}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for column, name in QUERY_COMPONENTS.items():
+            sums = np.bincount(query_ids, weights=pairs[column].to_numpy(dtype=np.float64), minlength=queries)
+            aggregates[name] = np.where(counts > 0, sums / counts, 1.0)
+    return pd.DataFrame(aggregates)
+
+
+def score_frame(entries):
+    """Pair scores and per-query aggregates as DataFrames, skipping the per-device report dicts."""
+    flat = flatten_pairs(entries, fields=False)
+    pairs = score_pairs(flat)
+    return pairs, aggregate_queries(pairs, flat['queries'])
+
+
+def score_results(entries):
+    """
+    Score many queries at once.
+
+    Args:
+        entries (iterable): (expected_devices, agent_results) per query.
+
+    Returns:
+        One {'devices', 'query_score'} dict per query, in the report format.
+    """
+    flat = flatten_pairs(entries)
+    pairs = score_pairs(flat)
+    query_scores = aggregate_queries(pairs, flat['queries'])
+
+    columns = ('weighted_total',) + COMPONENTS
+    with paused_gc():
+        results = [{'devices': [], 'query_score': score} for score in query_scores.to_dict('records')]
+        scores = zip(*(pairs[column].tolist() for column in columns))
+        for query, (actual, predicted), score in zip(pairs['query'].tolist(), flat['fields'], scores):
+            results[query]['devices'].append({
+                'actual': actual,
+                'predicted': predicted,
+                'score': dict(zip(columns, score)),
+            })
+    return results
@@ -0,0 +1,133 @@
+# session_context.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+
+# Per-session limits keep every context a fixed, small size regardless of traffic.
+MAX_VALUE_CHARS = 24
+MAX_ARGS = 3
+MAX_TASK_CHARS = 48
+
+
+def compact_value(value):
+    text = str(value)
+    return text if len(text) <= MAX_VALUE_CHARS else text[:MAX_VALUE_CHARS - 1] + "~"
+
+
+class SESSION_CONTEXT:
+    def __init__(self, max_devices=4, max_tasks=2):
+        """
+        Compact memory of a home's recent commands: the last state set on each device and the
+        last tasks resolved to a device.
+
+        Args:
+            max_devices (int): Devices remembered; the least recently commanded one is dropped first.
+            max_tasks (int): Resolved tasks remembered, newest last.
+        """
+        self.max_devices = max_devices
+        self.devices = OrderedDict()
+        self.tasks = deque(maxlen=max_tasks)
+        self.last_active = time.time()
+
+    def record(self, device_name, device, command, task=None):
+        """
+        Remember the command last resolved for a device instance.
+
+        Args:
+            device_name (str): Device instance, e.g. room_ac.
+            device (str): Device type, e.g. ac.
+            command (dict): {"mode": ..., "args": {...}} sent to the device.
+            task (str, optional): The classifier's task for the device, e.g. "set AC temperature to 22".
+        """
+        args = list((command.get("args") or {}).items())[:MAX_ARGS]
+        self.devices.pop(device_name, None)
+        self.devices[device_name] = (
+            device,
+            compact_value(command.get("mode", "")),
+            tuple((key, compact_value(value)) for key, value in args),
+        )
+        while len(self.devices) > self.max_devices:
+            self.devices.popitem(last=False)
+        if task:
+            text = " ".join(str(task).split()).replace('"', "'")
+            if len(text) > MAX_TASK_CHARS:
+                text = text[:MAX_TASK_CHARS - 1] + "~"
+            self.tasks.append((device_name, text))
+        self.last_active = time.time()
+
+    def render(self):
+        """
+        Render the context as a single structured line for the classification prompt, oldest
+        first, with the last resolved tasks after "recent:", e.g.
+        'room_ac(ac)=Cool[temperature:22]; hall_tv(tv)=power[status:on] | recent: room_ac "set AC temperature to 22"'.
+        """
+        parts = []
+        for device_name, (device, mode, args) in self.devices.items():
+            arg_text = ",".join(f"{key}:{value}" for key, value in args)
+            parts.append(f"{device_name}({device})={mode}" + (f"[{arg_text}]" if arg_text else ""))
+        line = "; ".join(parts)
+        if self.tasks:
+            line += " | recent: " + "; ".join(f'{device_name} "{task}"' for device_name, task in self.tasks)
+        return line
+
+
+class SESSION_STORE:
+    def __init__(self, max_sessions=10000, max_devices=4, idle_timeout=3600.0):
+        """
+        LRU store of SESSION_CONTEXT objects with a fixed memory cap.
+
+        Args:
+            max_sessions (int): Sessions kept at once; the least recently used is evicted beyond this.
+            max_devices (int): Devices remembered per session.
+            idle_timeout (float, optional): Seconds after which an unused session is forgotten.
+        """
+        self.max_sessions = max_sessions
+        self.max_devices = max_devices
+        self.idle_timeout = idle_timeout
+        self.sessions = OrderedDict()
+
+    def get(self, home_id, create=True):
+        session = self.sessions.get(home_id)
+        if session is not None and self.idle_timeout and time.time() - session.last_active > self.idle_timeout:
+            del self.sessions[home_id]
+            session = None
+        if session is None:
+            if not create:
+                return None
+            session = SESSION_CONTEXT(self.max_devices)
+            self.sessions[home_id] = session
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        self.sessions.move_to_end(home_id)
+        session.last_active = time.time()
+        return session
+
+    def render(self, home_id):
+        """Context line for a home, or an empty string when nothing is remembered."""
+        session = self.get(home_id, create=False)
+        return session.render() if session else ""
+
+    def evict_idle(self):
+        """Drop sessions idle for longer than idle_timeout; returns how many were removed."""
+        if not self.idle_timeout:
+            return 0
+        cutoff = time.time() - self.idle_timeout
+        removed = 0
+        while self.sessions:
+            home_id, session = next(iter(self.sessions.items()))
+            if session.last_active > cutoff:
+                break
+            del self.sessions[home_id]
+            removed += 1
+        return removed
+
+
+async def evict_idle_periodically(store, interval=60.0):
+    """Run store.evict_idle every `interval` seconds until cancelled, so idle homes free their memory."""
+    logger = logging.getLogger(__name__)
+    while True:
+        await asyncio.sleep(interval)
+        removed = store.evict_idle()
+        if removed:
+            logger.info(f"Evicted {removed} idle session contexts")
@@ -0,0 +1,259 @@
+# tracing.py
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+
+# Span of the stage currently running; asyncio tasks inherit it, so spans nest across gather()
+current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class NOOP_SPAN:
+    """Returned when tracing is off or the trace was not sampled; every method does nothing."""
+
+    sampled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+
+NOOP = NOOP_SPAN()
+
+
+class UNSAMPLED_ROOT(NOOP_SPAN):
+    """Marks a trace as unsampled so its child spans are skipped as cheaply as possible."""
+
+    def __enter__(self):
+        self.token = current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        current_span.reset(self.token)
+        return False
+
+
+class SPAN:
+    sampled = True
+
+    def __init__(self, tracer, name, parent, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.status = "ok"
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.token = current_span.set(self)
+        self.start = time.time()
+        self.perf_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.perf_start
+        current_span.reset(self.token)
+        if exc_type is not None:
+            self.status = "cancelled" if exc_type.__name__ == "CancelledError" else "error"
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.tracer.export({
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration": duration,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        })
+        return False
+
+
+class JSONL_EXPORTER:
+    def __init__(self, path):
+        """Appends finished spans to a JSONL file, one span per line."""
+        self.path = path
+
+    def write(self, spans):
+        data = "".join(json.dumps(span, ensure_ascii=False, default=str) + "\n" for span in spans)
+        # One O_APPEND write per batch, so worker processes can share the file
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data.encode("utf-8"))
+        finally:
+            os.close(fd)
+
+
+class OTLP_HTTP_EXPORTER:
+    def __init__(self, endpoint, service_name="homa", timeout=5.0):
+        """
+        Posts spans as OTLP/JSON to a collector, e.g. 'http://localhost:4318/v1/traces'.
+
+        Any HTTP endpoint accepting the same body works as a local collector stand-in.
+        """
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    @staticmethod
+    def otlp_value(value):
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def otlp_span(self, span):
+        start_ns = int(span["start"] * 1e9)
+        otlp = {
+            "traceId": span["trace_id"],
+            "spanId": span["span_id"],
+            "name": span["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(start_ns + int(span["duration"] * 1e9)),
+            "attributes": [
+                {"key": key, "value": self.otlp_value(value)} for key, value in span["attributes"].items()
+                if value is not None
+            ],
+            "status": {"code": 2, "message": span["error"]} if span["error"] else {"code": 1},
+        }
+        if span["parent_id"]:
+            otlp["parentSpanId"] = span["parent_id"]
+        return otlp
+
+    def write(self, spans):
+        body = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "homa"}, "spans": [self.otlp_span(span) for span in spans]}],
+        }]}
+        request = urllib.request.Request(
+            self.endpoint, data=json.dumps(body).encode("utf-8"), headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+class TRACER:
+    def __init__(self, exporter=None, sample_rate=1.0, batch_size=256, flush_interval=1.0):
+        """
+        Minimal span tracer. Finished spans are handed to a background thread that writes them
+        in batches, so the event loop only pays for building a small dict per span.
+
+        Args:
+            exporter: JSONL_EXPORTER, OTLP_HTTP_EXPORTER or any object with write(spans). None disables tracing.
+            sample_rate (float): Fraction of traces (root spans) recorded; children follow their root.
+            batch_size (int): Spans written per exporter call at most.
+            flush_interval (float): Seconds a finished span may wait before being written.
+        """
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.logger = logging.getLogger(__name__)
+        self.queue = queue.SimpleQueue()
+        self.dropped = 0
+        self.thread = None
+        if exporter is not None:
+            self.thread = threading.Thread(target=self.run_exporter, name="span-exporter", daemon=True)
+            self.thread.start()
+            atexit.register(self.shutdown)
+
+    @property
+    def enabled(self):
+        return self.exporter is not None
+
+    def span(self, name, **attributes):
+        """Context manager for a span named `name`, nested under the current span."""
+        if self.exporter is None:
+            return NOOP
+        parent = current_span.get()
+        if parent is None:
+            if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+                return UNSAMPLED_ROOT()
+        elif not parent.sampled:
+            return NOOP
+        return SPAN(self, name, parent, attributes)
+
+    def export(self, span):
+        self.queue.put(span)
+
+    def run_exporter(self):
+        while True:
+            batch = [self.queue.get()]
+            if batch[0] is None:
+                return
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    span = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if span is None:
+                    stop = True
+                    break
+                batch.append(span)
+            try:
+                self.exporter.write(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                self.logger.warning(f"Dropped {len(batch)} span(s): {str(e)}")
+            if stop:
+                return
+
+    def shutdown(self):
+        """Write out queued spans and stop the exporter thread."""
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout=5)
+
+
+tracer = TRACER()
+
+
+def configure_tracing(path=None, endpoint=None, sample_rate=1.0):
+    """
+    Replace the process-wide tracer. Spans go to a JSONL file at `path`, or to an OTLP/JSON
+    collector at `endpoint`; with neither, tracing is off.
+    """
+    global tracer
+    tracer.shutdown()
+    if endpoint:
+        exporter = OTLP_HTTP_EXPORTER(endpoint)
+    elif path:
+        exporter = JSONL_EXPORTER(path)
+    else:
+        exporter = None
+    tracer = TRACER(exporter, sample_rate=sample_rate)
+    return tracer
+
+
+def span(name, **attributes):
+    """Shortcut for tracer.span() on the process-wide tracer."""
+    return tracer.span(name, **attributes)
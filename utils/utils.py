@@ -2,7 +2,8 @@
 import logging
 import os 
 import utils.agent_prompts as agent_prompts
-from ollama import AsyncClient
+from utils.tracing import span
+from ollama import AsyncClient, ChatResponse, Message
 import google.generativeai as genai # Added for Gemini
 
 from dotenv import load_dotenv
@@ -10,7 +11,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 class UTILS:
-    def __init__(self, provider='ollama', model_name='qwen2.5:32b', api_key=None):
+    def __init__(self, provider='ollama', model_name='qwen2.5:32b', api_key=None, host=None, cache=None):
         """
         Initializes the UTILS class with a specified LLM provider and model.
 
@@ -20,12 +21,18 @@ class UTILS:
                                 For Gemini, examples include 'gemini-pro'.
             api_key (str, optional): The API key required for the provider (e.g., Gemini).
                                      Defaults to None. It's recommended to use environment variables.
+            host (str, optional): Ollama server URL, e.g. 'http://localhost:11434'. Defaults to None,
+                                  which lets the Ollama client use OLLAMA_HOST or its default.
+            cache (SQLITE_CACHE, optional): Response cache consulted before calling the provider.
+                                            Defaults to None (no caching).
         """
         self.logger = logging.getLogger(__name__)
-        logging.basicConfig(level=logging.INFO)
         self.provider = provider.lower()
         self.model_name = model_name
         self.api_key = api_key
+        self.host = host
+        self.ollama_client = None
+        self.cache = cache
         self.is_gemini_configured = False
         
         gemini_api_key = os.getenv("GEMINI_API_KEY")
@@ -58,9 +65,45 @@ class UTILS:
         Returns:
             The response object from the LLM provider, or None if an error occurs.
         """
+        with span("llm.chat", provider=self.provider, model=self.model_name,
+                  prompt_chars=sum(len(msg['content']) for msg in messages)) as chat_span:
+            if self.cache is None:
+                response = await self.chat_provider(messages)
+            else:
+                key = self.cache.key(self.provider, self.model_name, messages)
+                content = self.cache.get(key)
+                chat_span.set_attribute("cache_hit", content is not None)
+                if content is not None:
+                    # Rebuild the provider's response shape so callers cannot tell a hit from a call
+                    if self.provider == 'ollama':
+                        return ChatResponse(model=self.model_name, message=Message(role='assistant', content=content))
+                    return {'message': {'content': content, 'role': 'assistant'}}
+
+                response = await self.chat_provider(messages)
+                if response is not None:
+                    try:
+                        content = response['message']['content']
+                    except (KeyError, TypeError):
+                        content = None
+                    if content:
+                        self.cache.put(key, content)
+            if response is None:
+                chat_span.set_attribute("failed", True)
+            else:
+                chat_span.set_attributes({
+                    "prompt_tokens": response.get('prompt_eval_count'),
+                    "completion_tokens": response.get('eval_count'),
+                })
+            return response
+
+    async def chat_provider(self, messages):
+        """Sends the messages to the provider without consulting the cache; same contract as chat()."""
         try:
             if self.provider == 'ollama':
-                response = await AsyncClient().chat(model=self.model_name, messages=messages)
+                # Reuse one client (and its connection pool) across calls
+                if self.ollama_client is None:
+                    self.ollama_client = AsyncClient(host=self.host)
+                response = await self.ollama_client.chat(model=self.model_name, messages=messages)
                 return response
             elif self.provider == 'gemini':
                 if not self.is_gemini_configured:
@@ -86,7 +129,12 @@ class UTILS:
                 chat_session = model.start_chat(history=history)
                 response = await chat_session.send_message_async(last_message_content, generation_config=generation_config)
 
-                return {'message': {'content': response.text, 'role': 'assistant'}}
+                usage = getattr(response, 'usage_metadata', None)
+                return {
+                    'message': {'content': response.text, 'role': 'assistant'},
+                    'prompt_eval_count': getattr(usage, 'prompt_token_count', None),
+                    'eval_count': getattr(usage, 'candidates_token_count', None),
+                }
             else:
                 self.logger.error(f"Unsupported LLM provider: {self.provider}")
                 return None